@@ -106,3 +106,44 @@ class AppUtilsCommand(Command):
       except Exception as e:
         print("FAIL")
         raise e
+
+
+class AppUtilsManifestCommand(Command):
+  """
+  Pre-generates commands manifest of the discovery framework, so installed application does not need to import
+  every command on startup. The manifest is shipped as package data, run the command before bdist_wheel.
+
+  python3 setup.py apputils_manifest --commands=app.commands [--path=src]
+  """
+  description = "Generate commands manifest for the lazy commands discovery"
+  user_options = [
+    ("commands=", None, "Import path of the package holding CommandsDiscovery instance, like 'app.commands'"),
+    ("path=", None, "Directory to import the package from, project root by default")
+  ]
+
+  def initialize_options(self) -> None:
+    self.commands = None
+    self.path = None
+
+  def finalize_options(self) -> None:
+    if not self.commands:
+      raise ValueError("--commands option is required")
+
+  def run(self):
+    import importlib
+    import os
+    import sys
+
+    sys.path.insert(0, os.path.abspath(self.path or os.path.dirname(__file__)))
+    from modules.apputils.discovery import CommandsDiscovery
+
+    m = importlib.import_module(self.commands)
+    discoveries = [item for item in m.__dict__.values() if isinstance(item, CommandsDiscovery)]
+    if not discoveries:
+      print(f"Error!!! No CommandsDiscovery instance found in {self.commands}")
+      return
+
+    for discovery in discoveries:
+      discovery.write_manifest()
+      print(f"Commands manifest written to {discovery.manifest_path}")
+
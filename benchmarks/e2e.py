@@ -0,0 +1,192 @@
+"""
+End-to-end benchmark of the resolution pipeline against local stand-ins of the upstream sources.
+
+Usage (from the repository root):
+  python -m benchmarks.e2e [--sizes=10,100,1000,10000] [--latency=0.001] [--prefixes=20] [--method=whois|ripe]
+                           [--out=results.json] [--compare=previous.json]
+
+Each size runs in a separate interpreter, so wall time includes startup and imports, and peak RSS is
+measured per run.
+"""
+import argparse
+import io
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from typing import List
+
+from benchmarks.standins import DnsStandIn, RipeStandIn, SyntheticData, WhoisStandIn
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def generate_networks(items: int, items_per_network: int = 5, seed: int = 0) -> dict:
+  """
+  Synthetic networks definition with ~70% ASN, ~20% hostname and ~10% literal network items
+  """
+  rnd = random.Random(seed)
+  networks = []
+  for index in range(0, items, items_per_network):
+    net_items = []
+    for item_index in range(index, min(index + items_per_network, items)):
+      kind = rnd.random()
+      if kind < 0.7:
+        net_items.append(f"AS{64512 + item_index}")
+      elif kind < 0.9:
+        net_items.append(f"host{item_index}.bench.test")
+      else:
+        net_items.append(f"203.0.{item_index >> 8 & 255}.{item_index & 255}")
+
+    networks.append({"name": f"net{index // items_per_network}", "items": net_items, "optional": rnd.random() < 0.3})
+
+  return {"items": networks}
+
+
+def run_worker(root_path: str, method: str) -> dict:
+  """
+  Run the pipeline phases in the current interpreter, stand-in endpoints are taken from the environment
+  """
+  phases = {}
+
+  started = time.perf_counter()
+  from lookup import QueryMethod
+  from modules.apputils.discovery.eventloop import run
+  from modules.routing import generate_records_async, load_networks, records_printer
+  phases["import"] = time.perf_counter() - started
+
+  started = time.perf_counter()
+  plan = load_networks(root_path)
+  phases["load"] = time.perf_counter() - started
+
+  started = time.perf_counter()
+  # same path as the default command: async resolution on the managed event loop
+  resolved = run(generate_records_async(plan, method=QueryMethod.ripe if method == "ripe" else QueryMethod.radb_whois))
+  phases["resolve"] = time.perf_counter() - started
+
+  started = time.perf_counter()
+  output = io.StringIO()
+  with redirect_stdout(output):
+    records_printer(resolved, "ipv4", "")
+    records_printer(resolved, "ipv6", "")
+  phases["output"] = time.perf_counter() - started
+
+  return {
+    "phases": phases,
+    "records": len(resolved.records),
+    "output_bytes": len(output.getvalue()),
+    "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  }
+
+
+def git_commit() -> str:
+  try:
+    return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT_DIR, stderr=subprocess.DEVNULL).decode().strip()
+  except (OSError, subprocess.CalledProcessError):
+    return "unknown"
+
+
+def run_benchmark(sizes: List[int], data: SyntheticData, latency: float, method: str) -> dict:
+  whois, ripe, dns = WhoisStandIn(data, latency).start(), RipeStandIn(data, latency).start(), DnsStandIn(data, latency).start()
+  # stand-ins don't throttle, so the upstream rate limits are off to measure the pipeline itself
+  env = dict(os.environ, RT_WHOIS_SERVER=whois.address, RT_RIPE_URL=ripe.url, RT_DNS_SERVER=dns.address,
+             RT_WHOIS_RATE="0", RT_RIPE_RATE="0")
+  results = []
+
+  try:
+    for size in sizes:
+      for stand_in in (whois, ripe, dns):
+        stand_in.counter.reset()
+
+      with tempfile.TemporaryDirectory() as root_path:
+        os.makedirs(os.path.join(root_path, "conf"))
+        with open(os.path.join(root_path, "conf", "networks.json"), "w") as f:
+          json.dump(generate_networks(size), f)
+
+        started = time.perf_counter()
+        output = subprocess.check_output(
+          [sys.executable, "-m", "benchmarks.e2e", "--worker", root_path, f"--method={method}"],
+          cwd=ROOT_DIR,
+          env=env
+        )
+        wall_time = time.perf_counter() - started
+
+      result = json.loads(output)
+      result.update({
+        "items": size,
+        "wall_time": wall_time,
+        "traffic": {"whois": whois.counter.to_dict(), "ripe": ripe.counter.to_dict(), "dns": dns.counter.to_dict()}
+      })
+      result["bytes_transferred"] = sum(t["bytes_in"] + t["bytes_out"] for t in result["traffic"].values())
+      results.append(result)
+      sys.stderr.write(f"{size:>6} items: {wall_time:.3f}s, {result['peak_rss_kb']} KB peak RSS,"
+                       f" {result['bytes_transferred']} bytes transferred\n")
+  finally:
+    for stand_in in (whois, ripe, dns):
+      stand_in.stop()
+
+  return {
+    "commit": git_commit(),
+    "python": sys.version.split()[0],
+    "params": {
+      "method": method,
+      "latency": latency,
+      "prefixes": data.prefixes,
+      "prefixes6": data.prefixes6,
+      "padding": data.padding,
+      "ripe_peers": data.peers
+    },
+    "results": results
+  }
+
+
+def compare(previous: dict, current: dict):
+  by_size = {result["items"]: result for result in previous["results"]}
+  sys.stderr.write(f"Comparing {previous['commit'][:10]} -> {current['commit'][:10]}\n")
+  for result in current["results"]:
+    old = by_size.get(result["items"])
+    if not old:
+      continue
+    sys.stderr.write(f"{result['items']:>6} items: wall time x{result['wall_time'] / old['wall_time']:.2f},"
+                     f" peak RSS x{result['peak_rss_kb'] / old['peak_rss_kb']:.2f}\n")
+
+
+def main():
+  parser = argparse.ArgumentParser(description="End-to-end benchmark with local whois/RIPE/DNS stand-ins")
+  parser.add_argument("--sizes", default="10,100,1000,10000", help="comma separated numbers of network items")
+  parser.add_argument("--latency", type=float, default=0.001, help="stand-in response latency in seconds")
+  parser.add_argument("--prefixes", type=int, default=20, help="IPv4 prefixes per ASN")
+  parser.add_argument("--prefixes6", type=int, default=2, help="IPv6 prefixes per ASN")
+  parser.add_argument("--padding", type=int, default=0, help="extra bytes per whois route object")
+  parser.add_argument("--ripe-peers", type=int, default=3, help="duplicates of each prefix in RIPE response")
+  parser.add_argument("--method", choices=("whois", "ripe"), default="whois")
+  parser.add_argument("--out", help="write JSON report to the file instead of stdout")
+  parser.add_argument("--compare", help="previous JSON report to compare with")
+  parser.add_argument("--worker", help=argparse.SUPPRESS)
+  args = parser.parse_args()
+
+  if args.worker:
+    json.dump(run_worker(args.worker, args.method), sys.stdout)
+    return
+
+  data = SyntheticData(prefixes=args.prefixes, prefixes6=args.prefixes6, padding=args.padding, peers=args.ripe_peers)
+  report = run_benchmark([int(size) for size in args.sizes.split(",")], data, args.latency, args.method)
+
+  if args.out:
+    with open(args.out, "w") as f:
+      json.dump(report, f, indent=2)
+  else:
+    json.dump(report, sys.stdout, indent=2)
+
+  if args.compare:
+    with open(args.compare, "r") as f:
+      compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+  main()
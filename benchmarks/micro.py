@@ -0,0 +1,306 @@
+"""
+Micro-benchmarks of the modules.apputils hot paths used on every run.
+
+Usage (from the repository root):
+  python -m benchmarks.micro [--filter=NAME] [--threshold=0.25] [--update-baseline] [--json=results.json]
+
+Every benchmark is warmed up, the number of calls per sample is calibrated to the target sample time and
+statistics are collected over a number of samples. Median time per call is checked against stored
+baselines (benchmarks/baselines.json), the run fails if any benchmark regressed past the threshold.
+Baselines are machine specific, refresh them with --update-baseline on the machine used for comparison.
+
+Memory benchmarks report the size of a single object allocated by the registered factory, they are not
+compared against baselines.
+"""
+import argparse
+import gzip
+import io
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+from http.client import HTTPMessage
+from typing import Callable, Dict, List
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+
+__benchmarks: Dict[str, Callable[[], Callable[[], object]]] = {}
+__memory_benchmarks: Dict[str, Callable[[], Callable[[], object]]] = {}
+
+
+def benchmark(name: str):
+  """
+  Register benchmark, decorated function performs setup and returns the callable to be measured
+  """
+  def decorator(f: Callable[[], Callable[[], object]]):
+    __benchmarks[name] = f
+    return f
+  return decorator
+
+
+def memory_benchmark(name: str):
+  """
+  Register memory benchmark, decorated function performs setup and returns the factory of measured objects
+  """
+  def decorator(f: Callable[[], Callable[[], object]]):
+    __memory_benchmarks[name] = f
+    return f
+  return decorator
+
+
+class BenchmarkResult(object):
+  def __init__(self, name: str, number: int, samples: List[float]):
+    self.name = name
+    self.number = number
+    self.samples = sorted(samples)
+
+  @property
+  def median(self) -> float:
+    return statistics.median(self.samples)
+
+  def to_dict(self) -> dict:
+    return {
+      "number": self.number,
+      "min": self.samples[0],
+      "median": self.median,
+      "mean": statistics.mean(self.samples),
+      "stdev": statistics.stdev(self.samples) if len(self.samples) > 1 else 0.0,
+      "p95": self.samples[min(len(self.samples) - 1, int(len(self.samples) * 0.95))],
+      "max": self.samples[-1]
+    }
+
+
+def measure(name: str, op: Callable[[], object], warmup: float = 0.1, sample_time: float = 0.05,
+            samples: int = 15) -> BenchmarkResult:
+  deadline = time.perf_counter() + warmup
+  while time.perf_counter() < deadline:
+    op()
+
+  number = 1
+  while True:  # calibrate number of calls, so single sample takes at least sample_time
+    started = time.perf_counter()
+    for _ in range(number):
+      op()
+    elapsed = time.perf_counter() - started
+    if elapsed >= sample_time:
+      break
+    number *= 2 if elapsed == 0 else max(2, int(sample_time / elapsed * 1.2))
+
+  results = []
+  for _ in range(samples):
+    started = time.perf_counter()
+    for _ in range(number):
+      op()
+    results.append((time.perf_counter() - started) / number)
+
+  return BenchmarkResult(name, number, results)
+
+
+def measure_memory(factory: Callable[[], object], count: int = 5000) -> float:
+  """
+  :return average number of bytes allocated per object and kept alive
+  """
+  factory()  # let the lazily built caches be allocated outside of the measurement
+  tracemalloc.start()
+  try:
+    before, _ = tracemalloc.get_traced_memory()
+    objects = [factory() for _ in range(count)]
+    after, _ = tracemalloc.get_traced_memory()
+  finally:
+    tracemalloc.stop()
+
+  list_size = sys.getsizeof(objects)
+  return (after - before - list_size) / count
+
+
+@benchmark("json2obj.deserialize_networks")
+def bench_deserialize():
+  from models import Networks
+  document = {
+    "items": [
+      {"name": f"net{i}", "items": [f"AS{64512 + i}", f"host{i}.example.com", "192.0.2.0/24"], "optional": i % 2 == 0}
+      for i in range(200)
+    ]
+  }
+  return lambda: Networks(serialized_obj=document)
+
+
+@benchmark("json2obj.stream_networks")
+def bench_stream():
+  from models import NetworkItem
+  from modules.apputils.json2obj import stream_items
+  document = json.dumps({
+    "items": [
+      {"name": f"net{i}", "items": [f"AS{64512 + i}", f"host{i}.example.com", "192.0.2.0/24"], "optional": i % 2 == 0}
+      for i in range(200)
+    ]
+  }).encode()
+  return lambda: sum(1 for _ in stream_items(io.BytesIO(document), "items", NetworkItem))
+
+
+@benchmark("discovery.collect")
+def bench_collect():
+  from modules.apputils.discovery import CommandsDiscovery
+  commands_dir = os.path.join(ROOT_DIR, "commands")
+  return lambda: CommandsDiscovery(commands_dir, "commands").collect()
+
+
+@benchmark("discovery.collect_manifest")
+def bench_collect_manifest():
+  from modules.apputils.discovery import CommandsDiscovery
+  commands_dir = os.path.join(ROOT_DIR, "commands")
+  CommandsDiscovery(commands_dir, "commands", use_manifest=True).collect()  # make sure the manifest is up to date
+  return lambda: CommandsDiscovery(commands_dir, "commands", use_manifest=True).collect()
+
+
+@benchmark("arguments.parse")
+def bench_arguments():
+  from modules.apputils.discovery.arguments import CommandLineOptions
+  argv = ["ipv4", "--nets=vk,yandex,kaspersky", "--formatter", "add {net}/{cidr}", "--incremental", "-x", "1"]
+  return lambda: CommandLineOptions(*argv)
+
+
+@benchmark("curl.response_decode")
+def bench_curl_decode():
+  from modules.apputils.curl import CURLResponse
+
+  payload = json.dumps({"data": {"bgp_state": [
+    {"target_prefix": f"10.{i >> 8 & 255}.{i & 255}.0/24", "path": [3333, 1299, 64512]} for i in range(2000)
+  ]}}).encode()
+  body = gzip.compress(payload)
+
+  class FakeResponse(object):
+    def __init__(self):
+      self.headers = HTTPMessage()
+      self.headers["Content-Type"] = "application/json; charset=utf-8"
+      self.headers["Content-Encoding"] = "gzip"
+
+    def getcode(self):
+      return 200
+
+    def info(self):
+      return self.headers
+
+    def read(self, *args):
+      return body
+
+  return lambda: CURLResponse(FakeResponse()).from_json()
+
+
+@benchmark("routing.networks_printer_formatted")
+def bench_printer():
+  from modules.routing import networks_printer
+  networks = [f"10.{i >> 8 & 255}.{i & 255}.0/24" for i in range(500)]
+
+  def op():
+    with redirect_stdout(io.StringIO()):
+      networks_printer(networks, "add set {net}/{cidr} # {count}")
+  return op
+
+
+def _record_models():
+  from typing import List
+  from modules.apputils.json2obj import SerializableObject, compact
+
+  class RouteRecord(SerializableObject):
+    prefix: str = None
+    network: str = None
+    source: str = None
+    kinds: List[str] = []
+
+  @compact
+  class CompactRouteRecord(SerializableObject):
+    prefix: str = None
+    network: str = None
+    source: str = None
+    kinds: List[str] = []
+
+  return RouteRecord, CompactRouteRecord
+
+
+@memory_benchmark("json2obj.instance")
+def bench_instance_memory():
+  model, _ = _record_models()
+  return lambda: model(serialized_obj={"prefix": "192.0.2.0/24", "network": "vk", "source": "AS47541"})
+
+
+@memory_benchmark("json2obj.instance_compact")
+def bench_compact_instance_memory():
+  _, model = _record_models()
+  return lambda: model(serialized_obj={"prefix": "192.0.2.0/24", "network": "vk", "source": "AS47541"})
+
+
+def load_baselines() -> Dict[str, dict]:
+  try:
+    with open(BASELINES_FILE, "r") as f:
+      return json.load(f)
+  except FileNotFoundError:
+    return {}
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Micro-benchmarks for apputils hot paths")
+  parser.add_argument("--filter", default="", help="run only benchmarks containing the string")
+  parser.add_argument("--samples", type=int, default=15)
+  parser.add_argument("--sample-time", type=float, default=0.05, help="minimal seconds per sample")
+  parser.add_argument("--warmup", type=float, default=0.1, help="warmup seconds")
+  parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown of median, 0.25 is 25%%")
+  parser.add_argument("--update-baseline", action="store_true", help="store current medians as baselines")
+  parser.add_argument("--json", help="write full statistics to the file")
+  args = parser.parse_args()
+
+  sys.path.insert(0, ROOT_DIR)
+  baselines = load_baselines()
+  results: Dict[str, BenchmarkResult] = {}
+  regressions = []
+
+  for name, setup in __benchmarks.items():
+    if args.filter not in name:
+      continue
+
+    result = measure(name, setup(), args.warmup, args.sample_time, args.samples)
+    results[name] = result
+    stats = result.to_dict()
+
+    baseline = baselines.get(name, {}).get("median")
+    ratio = stats["median"] / baseline if baseline else None
+    status = ""
+    if ratio is not None:
+      status = f"x{ratio:.2f} vs baseline"
+      if ratio > 1 + args.threshold:
+        status += " REGRESSION"
+        regressions.append(name)
+
+    print(f"{name:<40} median {stats['median'] * 1e6:>10.2f}us  p95 {stats['p95'] * 1e6:>10.2f}us"
+          f"  stdev {stats['stdev'] * 1e6:>8.2f}us  n={result.number}x{len(result.samples)}  {status}")
+
+  memory: Dict[str, float] = {}
+  for name, setup in __memory_benchmarks.items():
+    if args.filter not in name:
+      continue
+
+    memory[name] = measure_memory(setup())
+    print(f"{name:<40} {memory[name]:>10.0f} bytes per object")
+
+  if args.json:
+    with open(args.json, "w") as f:
+      json.dump({**{name: result.to_dict() for name, result in results.items()},
+                 **{name: {"bytes": size} for name, size in memory.items()}}, f, indent=2)
+
+  if args.update_baseline:
+    baselines.update({name: {"median": result.median} for name, result in results.items()})
+    with open(BASELINES_FILE, "w") as f:
+      json.dump(baselines, f, indent=2, sort_keys=True)
+    return
+
+  if regressions:
+    print(f"Regressed past {args.threshold:.0%}: {', '.join(regressions)}")
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+  main()
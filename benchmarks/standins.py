@@ -0,0 +1,250 @@
+"""
+Local stand-ins for the upstream sources (IRR whois, RIPE stat and DNS) serving synthetic data
+with configurable latency and response size
+"""
+import gzip
+import hashlib
+import json
+import socket
+import socketserver
+import struct
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+from urllib.parse import parse_qs, urlparse
+
+
+class SyntheticData(object):
+  def __init__(self, prefixes: int = 20, prefixes6: int = 2, padding: int = 0, peers: int = 3, ttl: int = 300,
+               addresses: int = 2):
+    """
+    :param prefixes: IPv4 prefixes announced by each ASN
+    :param prefixes6: IPv6 prefixes announced by each ASN
+    :param padding: extra bytes of "descr" attribute in each whois route object
+    :param peers: RIPE stat returns each prefix once per collector peer, this many times
+    :param ttl: TTL of DNS records
+    :param addresses: A records returned for each hostname
+    """
+    self.prefixes = prefixes
+    self.prefixes6 = prefixes6
+    self.padding = padding
+    self.peers = peers
+    self.ttl = ttl
+    self.addresses = addresses
+
+  @classmethod
+  def asn_number(cls, asn: str) -> int:
+    return int(asn.upper().lstrip("AS"))
+
+  def ipv4(self, asn: int) -> List[str]:
+    return [f"{asn % 223 + 1}.{(asn >> 8 ^ i >> 8) & 255}.{i & 255}.0/24" for i in range(self.prefixes)]
+
+  def ipv6(self, asn: int) -> List[str]:
+    return [f"2001:db8:{asn & 0xffff:x}:{i:x}::/64" for i in range(self.prefixes6)]
+
+  def set_members(self, as_set: str) -> List[str]:
+    seed = zlib.crc32(as_set.encode())
+    return [f"AS{64512 + (seed + i) % 1000}" for i in range(3)]
+
+  def host_addresses(self, hostname: str) -> List[str]:
+    seed = zlib.crc32(hostname.lower().encode())
+    return [socket.inet_ntoa(struct.pack("!I", 0xC6120000 | (seed + i) & 0xFFFF)) for i in range(self.addresses)]
+
+
+class TrafficCounter(object):
+  def __init__(self):
+    self.__lock = threading.Lock()
+    self.requests = 0
+    self.bytes_in = 0
+    self.bytes_out = 0
+
+  def count(self, bytes_in: int, bytes_out: int):
+    with self.__lock:
+      self.requests += 1
+      self.bytes_in += bytes_in
+      self.bytes_out += bytes_out
+
+  def reset(self):
+    with self.__lock:
+      self.requests = self.bytes_in = self.bytes_out = 0
+
+  def to_dict(self) -> Dict[str, int]:
+    return {"requests": self.requests, "bytes_in": self.bytes_in, "bytes_out": self.bytes_out}
+
+
+class StandIn(object):
+  def __init__(self, data: SyntheticData, latency: float = 0.0):
+    self.data = data
+    self.latency = latency
+    self.counter = TrafficCounter()
+    self._server = None
+    self._thread = None
+
+  @property
+  def address(self) -> str:
+    host, port = self._server.server_address[:2]
+    return f"{host}:{port}"
+
+  def _create_server(self):
+    raise NotImplementedError()
+
+  def start(self):
+    self._server = self._create_server()
+    self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+    self._thread.start()
+    return self
+
+  def stop(self):
+    self._server.shutdown()
+    self._server.server_close()
+
+
+class WhoisStandIn(StandIn):
+  """
+  Speaks RIPE-style "-i origin ASN" queries as well as IRRd "!g", "!6" and "!i" queries with "!!" persistent mode
+  """
+  def answer(self, query: str) -> bytes:
+    data = self.data
+    if query.startswith("-i origin"):
+      asn = query.split()[-1].upper()
+      number = data.asn_number(asn)
+      descr = f"descr:          {'x' * data.padding}\n" if data.padding else ""
+      objects = [f"route:          {prefix}\n{descr}origin:         {asn}\nsource:         BENCH\n"
+                 for prefix in data.ipv4(number)]
+      objects += [f"route6:         {prefix}\n{descr}origin:         {asn}\nsource:         BENCH\n"
+                  for prefix in data.ipv6(number)]
+      return "\n".join(objects).encode()
+
+    if query.startswith("!g") or query.startswith("!6"):
+      number = data.asn_number(query[2:])
+      body = " ".join(data.ipv4(number) if query.startswith("!g") else data.ipv6(number))
+    elif query.startswith("!i"):
+      body = " ".join(data.set_members(query[2:].partition(",")[0]))
+    else:
+      return b"F Unrecognized command\n"
+
+    return f"A{len(body) + 1}\n{body}\nC\n".encode() if body else b"D\n"
+
+  def _create_server(self):
+    stand_in = self
+
+    class Handler(socketserver.StreamRequestHandler):
+      def handle(self):
+        persistent = False
+        for line in self.rfile:
+          query = line.decode().strip()
+          if query == "!!":
+            persistent = True
+            continue
+          if not query:
+            continue
+
+          time.sleep(stand_in.latency)
+          response = stand_in.answer(query)
+          self.wfile.write(response)
+          stand_in.counter.count(len(line), len(response))
+          if not persistent:
+            break
+
+    socketserver.ThreadingTCPServer.allow_reuse_address = True
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    return server
+
+
+class RipeStandIn(StandIn):
+  """
+  Serves RIPE stat bgp-state endpoint: /data/bgp-state/data.json?resource=AS1,AS2
+  """
+  @property
+  def url(self) -> str:
+    return f"http://{self.address}/data/bgp-state/data.json?resource={{}}"
+
+  def answer(self, resources: List[str]) -> bytes:
+    state = []
+    for asn in resources:
+      number = self.data.asn_number(asn)
+      for prefix in self.data.ipv4(number) + self.data.ipv6(number):
+        state.extend({"target_prefix": prefix, "source_id": f"rrc00-{peer}", "path": [3333, 1299 + peer, number]}
+                     for peer in range(self.data.peers))
+
+    return json.dumps({"data": {"bgp_state": state, "resource": ",".join(resources)}, "status": "ok"}).encode()
+
+  def _create_server(self):
+    stand_in = self
+
+    class Handler(BaseHTTPRequestHandler):
+      protocol_version = "HTTP/1.1"
+      disable_nagle_algorithm = True  # as production servers do, otherwise keep-alive responses stall on delayed ACK
+
+      def do_GET(self):
+        url = urlparse(self.path)
+        resources = [r for item in parse_qs(url.query).get("resource", []) for r in item.split(",") if r]
+        time.sleep(stand_in.latency)
+
+        body = stand_in.answer(resources)
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        if self.headers.get("If-None-Match") == etag:
+          self.send_response(304)
+          self.send_header("ETag", etag)
+          self.end_headers()
+          stand_in.counter.count(len(self.requestline), 0)
+          return
+
+        use_gzip = "gzip" in self.headers.get("Accept-Encoding", "")
+        if use_gzip:
+          body = gzip.compress(body)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        if use_gzip:
+          self.send_header("Content-Encoding", "gzip")
+        self.end_headers()
+        self.wfile.write(body)
+        stand_in.counter.count(len(self.requestline), len(body))
+
+      def log_message(self, format, *args):
+        pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    return server
+
+
+class DnsStandIn(StandIn):
+  """
+  Answers any A query with synthetic addresses
+  """
+  def answer(self, packet: bytes) -> bytes:
+    query_id, _, qd_count, _, _, _ = struct.unpack_from("!HHHHHH", packet)
+    offset, labels = 12, []
+    while packet[offset]:
+      labels.append(packet[offset + 1:offset + 1 + packet[offset]].decode())
+      offset += packet[offset] + 1
+    question = packet[12:offset + 5]
+
+    addresses = self.data.host_addresses(".".join(labels))
+    header = struct.pack("!HHHHHH", query_id, 0x8180, 1, len(addresses), 0, 0)
+    answers = b"".join(
+      b"\xc0\x0c" + struct.pack("!HHIH", 1, 1, self.data.ttl, 4) + socket.inet_aton(address) for address in addresses
+    )
+    return header + question + answers
+
+  def _create_server(self):
+    stand_in = self
+
+    class Handler(socketserver.BaseRequestHandler):
+      def handle(self):
+        packet, sock = self.request
+        time.sleep(stand_in.latency)
+        response = stand_in.answer(packet)
+        sock.sendto(response, self.client_address)
+        stand_in.counter.count(len(packet), len(response))
+
+    server = socketserver.ThreadingUDPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    return server
@@ -1,3 +1,3 @@
 from modules.apputils.discovery import CommandsDiscovery
 
-discovery = CommandsDiscovery(__file__, __name__).collect()
+discovery = CommandsDiscovery(__file__, __name__, use_manifest=True).collect()
@@ -1,9 +1,8 @@
 import os
 import sys
-import json
+import time
 
 from typing import List
-from models import Networks
 
 from modules.apputils.discovery import CommandMetaInfo
 
@@ -12,19 +11,61 @@ __args__ = __module__.arg_builder \
   .add_default_argument("display_mode", str, "") \
   .add_argument("nets", list, "Networks to apply changes", default=[]) \
   .add_argument("optional", bool,"", default=True) \
-  .add_argument("formatter", str, "", default="")
+  .add_argument("formatter", str, "", default="") \
+  .add_argument("source", str, "Fetch lists from 'serve' publisher instead of resolving them, like http://host:8080",
+                default="") \
+  .add_argument("incremental", bool, "Re-resolve only networks changed or expired since the previous run") \
+  .add_argument("state_ttl", int, "Seconds for which resolved network is reused in incremental mode", default=3600,
+                alias="state-ttl") \
+  .add_argument("deadline", float, "Seconds to resolve networks in, the late ones are taken from the previous runs "
+                                   "and reported as stale", default=0.0) \
+  .add_argument("by_network", bool, "Group displayed prefixes by the network produced them",
+                alias="by-network") \
+  .add_argument("skip_dns", bool, "Do not resolve hostnames, their addresses are maintained by 'dns' command instead",
+                alias="skip-dns") \
+  .add_argument("stats", bool, "Print per-phase timing summary to stderr") \
+  .add_argument("stats_json", str, "Dump raw timing spans to the JSON file", default="", alias="stats-json") \
+  .add_argument("metrics_file", str, "Write run metrics to the node_exporter textfile (.prom)", default="",
+                alias="metrics-file") \
+  .add_argument("metrics_profile", str, "Value of the 'profile' label of the written metrics", default="default",
+                alias="metrics-profile")
 
-from modules.routing import DisplayOptions, generate_exclude_lists, networks_printer
+from modules.routing import DisplayOptions, generate_records_async, load_networks, networks_printer, records_printer
+from modules.routing.metrics import TextfileExporter
+from modules.routing.plan import ItemKind
+from modules.routing.publisher import fetch_published
+from modules.routing.state import StateStore
+from instrumentation import recorder
+from lookup import QueryMethod, WHOIS_MIRRORS
 
 
-def __init__(root_path: str, nets: List[str], formatter: str, optional: bool, display_mode: str):
-  __networks_file = os.path.join(root_path, "conf", "networks.json")
+async def __init__(root_path: str, nets: List[str], formatter: str, optional: bool, display_mode: str, source: str,
+             incremental: bool, state_ttl: int, deadline: float, by_network: bool, skip_dns: bool, stats: bool,
+             stats_json: str, metrics_file: str, metrics_profile: str):
+  recorder.enabled = stats or bool(stats_json) or bool(metrics_file)
+  recorder.reset()
+  exporter = TextfileExporter(metrics_file, metrics_profile) if metrics_file else None
+  started = time.time()
+  resolved, state, success = None, None, False
   try:
-    with open(__networks_file, "r") as fp:
-      nets_to_proccess = Networks(serialized_obj=json.load(fp))
-  except FileNotFoundError:
-    raise FileNotFoundError(f"Network definition profile not found: {__networks_file}")
+    resolved, state = await __run(root_path, nets, formatter, optional, display_mode, source, incremental, state_ttl,
+                                  deadline, by_network, skip_dns)
+    success = True
+  finally:
+    if stats:
+      sys.stdout.flush()
+      sys.stderr.write(recorder.summary_table())
+      sys.stderr.write(WHOIS_MIRRORS.summary_table())
+    if stats_json:
+      stale = {"stale": resolved.stale, "unresolved": resolved.unresolved} if resolved else {}
+      recorder.dump_json(stats_json, {"whois_servers": WHOIS_MIRRORS.summary(), **stale})
+    if exporter:
+      cache = (len(state.reused), len(state.reused) + len(state.recomputed)) if state and incremental else (0, 0)
+      exporter.export(started, success, recorder.spans, resolved, cache, WHOIS_MIRRORS.summary())
 
+
+async def __run(root_path: str, nets: List[str], formatter: str, optional: bool, display_mode: str, source: str,
+          incremental: bool, state_ttl: int, deadline: float, by_network: bool, skip_dns: bool):
   inc_optional_nets = optional
 
   if not display_mode or display_mode not in (DisplayOptions.IPV4, DisplayOptions.IPV6, DisplayOptions.NETS):
@@ -36,26 +77,66 @@ Formatter string must be in default python format syntax, variables that passed
 * mask - network mask
 * cidr - network mask in cidr notation
 * count - route number
+* network - name of the network produced the route
+* source - ASN, hostname or address produced the route
 """.format(
       DisplayOptions.NETS,
       DisplayOptions.IPV4,
       DisplayOptions.IPV6))
     sys.exit(-1)
 
+  if source:
+    try:
+      published = fetch_published(source, display_mode, nets, inc_optional_nets, os.path.join(root_path, "cache"))
+    except OSError as e:
+      sys.stderr.write(f"{e}\n")
+      published = None
+
+    # same as for the local resolution, only empty ipv4 list is an error
+    if published is None or (not published and display_mode == DisplayOptions.IPV4):
+      print("[ERR] List is empty or error occurs!")
+      sys.exit(-1)
 
-  filtered_nets = [net for net in nets_to_proccess.items if net.name in nets] if nets else nets_to_proccess.items
+    if not published:
+      return None, None
+
+    if display_mode == DisplayOptions.NETS:
+      print("\n".join(published))
+    else:
+      networks_printer(published, formatter)
+    return None, None
+
+  filtered_nets = load_networks(root_path).select(nets)
+  if skip_dns:
+    filtered_nets = filtered_nets.without_kinds((ItemKind.HOSTNAME,))
 
   if display_mode == DisplayOptions.NETS:
-    print("\n".join([net.name for net in filtered_nets]))
+    print("\n".join([net.name for net in filtered_nets.items]))
+    return None, None
   else:
-    net_names, prefixes_ipv4, prefixes_ipv6 = generate_exclude_lists(Networks(items=filtered_nets),
-                                                                     include_optional=inc_optional_nets,
-                                                                     make_query=display_mode != DisplayOptions.NETS)
-    if not prefixes_ipv4 and display_mode != DisplayOptions.NETS:
+    method = QueryMethod.radb_whois
+    state = StateStore(os.path.join(root_path, "cache", "state.json"), state_ttl, method) \
+      if incremental or deadline > 0 else None
+    resolved = await generate_records_async(filtered_nets,
+                                            include_optional=inc_optional_nets,
+                                            make_query=display_mode != DisplayOptions.NETS,
+                                            method=method,
+                                            state=state if incremental else None,
+                                            deadline=time.monotonic() + deadline if deadline > 0 else None,
+                                            fallback=state if deadline > 0 else None)
+    if state:
+      state.save()
+    if incremental:
+      sys.stderr.write(f"Recomputed networks: {', '.join(state.recomputed) or '-'}"
+                       f" (reused: {', '.join(state.reused) or '-'})\n")
+    if resolved.stale or resolved.unresolved:
+      stale = ", ".join(f"{name} ({age:.0f}s old)" for name, age in resolved.stale.items())
+      sys.stderr.write(f"[WARN] Deadline of {deadline:g}s exceeded, stale networks: {stale or '-'}"
+                       f" (unresolved: {', '.join(resolved.unresolved) or '-'})\n")
+
+    if not resolved.filter(DisplayOptions.IPV4) and display_mode != DisplayOptions.NETS:
       print("[ERR] List is empty or error occurs!")
       sys.exit(-1)
 
-    if display_mode == DisplayOptions.IPV4:
-      networks_printer(prefixes_ipv4, formatter)
-    elif display_mode == DisplayOptions.IPV6:
-      networks_printer(prefixes_ipv6, formatter)
\ No newline at end of file
+    records_printer(resolved, display_mode, formatter, by_network=by_network)
+    return resolved, state
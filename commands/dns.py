@@ -0,0 +1,40 @@
+import sys
+from typing import List
+
+from modules.apputils.discovery import CommandMetaInfo
+
+__module__ = CommandMetaInfo("dns", "Publishes addresses of hostnames to the set with timeout support")
+__args__ = __module__.arg_builder \
+  .add_argument("set_name", str, "Name of the set created with timeout support", alias="set") \
+  .add_argument("backend", str, "Data plane backend: ipset or nft", default="ipset") \
+  .add_argument("table", str, "nft table which holds the set (nft backend only)", default="") \
+  .add_argument("nets", list, "Networks to apply changes", default=[]) \
+  .add_argument("optional", bool, "", default=True) \
+  .add_argument("slack", int, "Seconds added to the record TTL before entry expires", default=60) \
+  .add_argument("min_interval", int, "Minimal seconds between re-resolving of the same hostname", default=30,
+                alias="min-interval") \
+  .add_argument("loop", bool, "Keep refreshing hostnames once their records expire") \
+  .add_argument("dry_run", bool, "Print data plane commands instead of executing them", alias="dry-run")
+
+from modules.routing import load_networks
+from modules.routing.dataplane import create_backend
+from modules.routing.dnsrefresh import HostnameRefresher, plan_hostnames
+
+
+def __init__(root_path: str, set_name: str, backend: str, table: str, nets: List[str], optional: bool, slack: int,
+             min_interval: int, loop: bool, dry_run: bool):
+  hostnames = plan_hostnames(load_networks(root_path).select(nets), include_optional=optional)
+  refresher = HostnameRefresher(create_backend(backend, set_name, "", table, dry_run), slack, min_interval)
+
+  if not hostnames:
+    sys.stderr.write("No hostnames found in the selected networks\n")
+    return
+
+  if not loop:
+    refresher.refresh(hostnames)
+    return
+
+  try:
+    refresher.run(hostnames)
+  except KeyboardInterrupt:
+    pass
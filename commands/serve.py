@@ -0,0 +1,16 @@
+from modules.apputils.discovery import CommandMetaInfo
+
+__module__ = CommandMetaInfo("serve", "Resolves networks once and publishes compiled lists over HTTP")
+__args__ = __module__.arg_builder \
+  .add_argument("host", str, "Address to listen on", default="0.0.0.0") \
+  .add_argument("port", int, "Port to listen on", default=8080) \
+  .add_argument("refresh", int, "Seconds before published lists are resolved again", default=3600)
+
+from modules.routing import generate_exclude_lists, load_networks
+from modules.routing.publisher import ListPublisher, serve
+
+
+def __init__(root_path: str, host: str, port: int, refresh: int):
+  publisher = ListPublisher(lambda: load_networks(root_path), generate_exclude_lists, refresh=refresh)
+  print(f"Publishing lists on http://{host}:{port}/[ipv4|ipv6|nets]?nets=NAME1,NAME2&optional=1")
+  serve(publisher, host, port)
@@ -0,0 +1,71 @@
+import os
+import sys
+import time
+from typing import List
+
+from modules.apputils.discovery import CommandMetaInfo
+
+__module__ = CommandMetaInfo("watch", "Applies networks to the data plane and re-applies changes of networks.json")
+__args__ = __module__.arg_builder \
+  .add_argument("set_name", str, "Name of the set for IPv4 prefixes", alias="set") \
+  .add_argument("set6_name", str, "Name of the set for IPv6 prefixes, IPv6 prefixes are skipped if not set",
+                default="", alias="set6") \
+  .add_argument("backend", str, "Data plane backend: ipset or nft", default="ipset") \
+  .add_argument("table", str, "nft table which holds the sets (nft backend only)", default="") \
+  .add_argument("nets", list, "Networks to apply changes", default=[]) \
+  .add_argument("optional", bool, "", default=True) \
+  .add_argument("phased", bool, "Apply networks which are not optional first and optional ones by the second update") \
+  .add_argument("debounce", float, "Seconds to wait for more changes before re-applying", default=0.5) \
+  .add_argument("poll", float, "Polling interval in seconds, if inotify is not available", default=1.0) \
+  .add_argument("dry_run", bool, "Print data plane commands instead of executing them", alias="dry-run") \
+  .add_argument("skip_dns", bool, "Do not apply addresses of hostnames, to be maintained by 'dns' command instead",
+                alias="skip-dns") \
+  .add_argument("metrics_file", str, "Write metrics of each sync to the node_exporter textfile (.prom)", default="",
+                alias="metrics-file") \
+  .add_argument("metrics_profile", str, "Value of the 'profile' label of the written metrics", default="default",
+                alias="metrics-profile")
+
+from instrumentation import recorder
+from lookup import WHOIS_MIRRORS
+from modules.routing import load_networks
+from modules.routing.dataplane import create_backend
+from modules.routing.metrics import TextfileExporter
+from modules.routing.plan import ItemKind, PlanCompileError
+from modules.routing.watcher import FileWatcher, NetworksSync
+
+
+def __init__(root_path: str, set_name: str, set6_name: str, backend: str, table: str, nets: List[str], optional: bool,
+             phased: bool, debounce: float, poll: float, dry_run: bool, skip_dns: bool, metrics_file: str, metrics_profile: str):
+  networks_file = os.path.join(root_path, "conf", "networks.json")
+  sync = NetworksSync(create_backend(backend, set_name, set6_name, table, dry_run),
+                      include_optional=optional,
+                      exclude_kinds=(ItemKind.HOSTNAME,) if skip_dns else ())
+  watcher = FileWatcher(networks_file, debounce=debounce, poll_interval=poll)
+  exporter = TextfileExporter(metrics_file, metrics_profile) if metrics_file else None
+  recorder.enabled = bool(metrics_file)
+
+  sys.stderr.write(f"Watching {networks_file} ({'inotify' if watcher.uses_inotify else 'polling'})\n")
+  try:
+    while True:
+      recorder.reset()
+      started, success, cache = time.time(), False, (0, 0)
+      try:
+        plan = load_networks(root_path).select(nets)
+        updates = sync.sync_phased(plan) if phased else [sync.sync(plan)]
+        resolved_total = 0
+        for added, removed, resolved_nets in updates:
+          sys.stderr.write(f"Applied: +{len(added)} -{len(removed)} prefixes,"
+                           f" resolved networks: {', '.join(resolved_nets) or '-'}\n")
+          resolved_total += len(resolved_nets)
+        success, cache = True, (len(plan.items) - resolved_total, len(plan.items))
+      except (PlanCompileError, FileNotFoundError, IOError) as e:
+        sys.stderr.write(f"[ERR] Keeping previously applied networks: {e}\n")
+
+      if exporter:
+        exporter.export(started, success, recorder.spans, sync.records, cache, WHOIS_MIRRORS.summary())
+
+      watcher.wait()
+  except KeyboardInterrupt:
+    pass
+  finally:
+    watcher.close()
@@ -0,0 +1,124 @@
+import json
+import statistics
+import threading
+import time
+from typing import Dict, List
+
+
+class Span(object):
+  __slots__ = ("category", "name", "started", "duration", "bytes", "prefixes", "error")
+
+  def __init__(self, category: str, name: str):
+    self.category = category
+    self.name = name
+    self.started = 0.0
+    self.duration = 0.0
+    self.bytes = 0
+    self.prefixes = 0
+    self.error: str or None = None
+
+  def to_dict(self) -> dict:
+    return {k: getattr(self, k) for k in self.__slots__}
+
+
+class _SpanContext(object):
+  __slots__ = ("_recorder", "_span", "_perf_started")
+
+  def __init__(self, recorder, span: Span):
+    self._recorder = recorder
+    self._span = span
+
+  def __enter__(self) -> Span:
+    self._span.started = time.time()
+    self._perf_started = time.perf_counter()
+    return self._span
+
+  def __exit__(self, exc_type, exc_val, exc_tb):
+    self._span.duration = time.perf_counter() - self._perf_started
+    if exc_type is not None and self._span.error is None:
+      self._span.error = exc_type.__name__
+    self._recorder.add(self._span)
+    return False
+
+
+class _NoopContext(object):
+  __slots__ = ("_span",)
+
+  def __init__(self):
+    self._span = Span("", "")
+
+  def __enter__(self) -> Span:
+    return self._span
+
+  def __exit__(self, exc_type, exc_val, exc_tb):
+    return False
+
+
+class Recorder(object):
+  """
+  Collects timing spans of the run phases and upstream lookups, disabled recorder costs almost nothing
+  """
+  def __init__(self):
+    self.enabled = False
+    self.__spans: List[Span] = []
+    self.__lock = threading.Lock()
+    self.__noop = _NoopContext()
+
+  @property
+  def spans(self) -> List[Span]:
+    return list(self.__spans)
+
+  def span(self, category: str, name: str = ""):
+    """
+    Usage:
+      with recorder.span("whois", asn) as s:
+        s.bytes = ...
+    """
+    if not self.enabled:
+      return self.__noop
+    return _SpanContext(self, Span(category, name))
+
+  def add(self, span: Span):
+    with self.__lock:
+      self.__spans.append(span)
+
+  def reset(self):
+    with self.__lock:
+      self.__spans = []
+
+  def summary(self) -> Dict[str, dict]:
+    by_category: Dict[str, List[Span]] = {}
+    for span in self.spans:
+      by_category.setdefault(span.category, []).append(span)
+
+    summary = {}
+    for category, spans in by_category.items():
+      durations = sorted(span.duration for span in spans)
+      summary[category] = {
+        "calls": len(spans),
+        "errors": len([span for span in spans if span.error]),
+        "total": sum(durations),
+        "p50": statistics.median(durations),
+        "max": durations[-1],
+        "bytes": sum(span.bytes for span in spans),
+        "prefixes": sum(span.prefixes for span in spans)
+      }
+    return summary
+
+  def summary_table(self) -> str:
+    lines = [f"{'phase':<10} {'calls':>6} {'errors':>6} {'total s':>9} {'p50 ms':>9} {'max ms':>9} {'bytes':>10} {'prefixes':>9}"]
+    for category, s in self.summary().items():
+      lines.append(f"{category:<10} {s['calls']:>6} {s['errors']:>6} {s['total']:>9.3f} {s['p50'] * 1000:>9.2f}"
+                   f" {s['max'] * 1000:>9.2f} {s['bytes']:>10} {s['prefixes']:>9}")
+    return "\n".join(lines) + "\n"
+
+  def dump_json(self, path: str, extra: Dict[str, object] = None):
+    """
+    :param extra: additional top-level sections of the dump
+    """
+    with open(path, "w") as f:
+      json.dump(dict({"spans": [span.to_dict() for span in self.spans], "summary": self.summary()}, **(extra or {})),
+                f, indent=2)
+
+
+recorder = Recorder()
@@ -1,9 +1,49 @@
+import asyncio
+import os
+import random
+import re
 import socket
+import struct
+import threading
+import time
+from collections import deque
 from contextlib import contextmanager
 
-from modules.apputils.curl import curl
+from instrumentation import recorder
+from modules.apputils.curl import CurlSession, HTTPCache, curl_async
+from modules.apputils.ratelimit import UpstreamLimiter
 
-RIPE_BGP_STATUS_URL = "https://stat.ripe.net/data/bgp-state/data.json?resource={}"
+# upstream endpoints could be overridden by the environment, e.g. to point them to the local stand-ins
+RIPE_BGP_STATUS_URL = os.environ.get("RT_RIPE_URL", "https://stat.ripe.net/data/bgp-state/data.json?resource={}")
+# comma separated list of IRR mirrors, e.g. "whois.radb.net:43,rr.ntt.net:43,whois.ripe.net:43"
+WHOIS_SERVER = os.environ.get("RT_WHOIS_SERVER", "whois.radb.net:43")
+DNS_SERVER = os.environ.get("RT_DNS_SERVER", "")  # system resolver is used if not set
+# directory of the on-disk cache of RIPE responses, revalidated by ETag/Last-Modified, disabled if not set
+HTTP_CACHE_DIR = os.environ.get("RT_HTTP_CACHE", "")
+
+# requests per second allowed to the upstream sources, not limited if 0
+WHOIS_RATE = float(os.environ.get("RT_WHOIS_RATE", "20"))
+RIPE_RATE = float(os.environ.get("RT_RIPE_RATE", "5"))
+
+# politeness policy shared by all the queries of the process: rate limit, retries with backoff,
+# adaptive concurrency of async queries and connection timeouts
+WHOIS_LIMITER = UpstreamLimiter("whois", rate=WHOIS_RATE, burst=max(1, int(WHOIS_RATE * 2)), timeout=30.0)
+RIPE_LIMITER = UpstreamLimiter("ripe", rate=RIPE_RATE, burst=max(1, int(RIPE_RATE * 2)), timeout=60.0,
+                               latency_target=10.0)
+
+# RIPE requests of the process share persistent connections and the HTTP cache
+RIPE_CACHE = HTTPCache(HTTP_CACHE_DIR) if HTTP_CACHE_DIR else None
+RIPE_SESSION = CurlSession(cache=RIPE_CACHE, limiter=RIPE_LIMITER)
+
+
+def split_address(address, default_port):
+  """
+  :type address str
+  :type default_port int
+  :rtype (str, int)
+  """
+  host, _, port = address.rpartition(":") if address.count(":") == 1 else (address, "", "")
+  return host, int(port) if port else default_port
 
 
 class QueryMethod(object):
@@ -23,30 +63,268 @@ def fetch_ripe_info(as_list):
 
   results = []
 
-  r = curl(RIPE_BGP_STATUS_URL.format(",".join(as_list)))
+  with recorder.span("ripe", ",".join(as_list)) as span:
+    r = RIPE_SESSION.curl(RIPE_BGP_STATUS_URL.format(",".join(as_list)))
+    span.bytes = len(r.raw)
+    if r.code == 200:
+      nets = r.from_json()
+      if not nets:
+        span.error = "invalid response"
+        return None
+
+      for item in nets["data"]["bgp_state"]:
+        results.append(item["target_prefix"])
+    else:
+      span.error = f"HTTP {r.code}"
+
+    span.prefixes = len(results)
+
+  return results
+
+
+def __group_by_origin(as_list, r, span):
+  """
+  Group prefixes of RIPE response by the requested origin AS
+
+  :type as_list list[str]
+  :type r modules.apputils.curl.CURLResponse
+  :rtype dict[str, list[str]]
+  """
+  results = {asn: {} for asn in as_list}  # dict used as ordered set, RIPE returns prefix per each peer
+  as_by_number = {asn.upper().lstrip("AS"): asn for asn in as_list}
+
+  span.bytes = len(r.raw)
   if r.code == 200:
     nets = r.from_json()
     if not nets:
+      span.error = "invalid response"
       return None
 
     for item in nets["data"]["bgp_state"]:
-      results.append(item["target_prefix"])
+      origin = as_by_number.get(str(item["path"][-1])) if item.get("path") else None
+      if origin:
+        results[origin][item["target_prefix"]] = None
+  else:
+    span.error = f"HTTP {r.code}"
 
-  return results
+  span.prefixes = sum(len(prefixes) for prefixes in results.values())
+  return {asn: list(prefixes) for asn, prefixes in results.items()}
+
+
+def fetch_ripe_info_by_asn(as_list):
+  """
+  Downloading metadata from RIPE, grouping prefixes by the requested origin AS
+
+  :type as_list list[str]
+  :rtype dict[str, list[str]]
+  """
+  if not isinstance(as_list, (list, set)):
+    return None
+
+  with recorder.span("ripe", ",".join(as_list)) as span:
+    r = RIPE_SESSION.curl(RIPE_BGP_STATUS_URL.format(",".join(as_list)))
+    return __group_by_origin(as_list, r, span)
+
+
+async def fetch_ripe_info_by_asn_async(as_list):
+  """
+  Same as fetch_ripe_info_by_asn, request is made by the non-blocking client on the running loop
+
+  :type as_list list[str]
+  :rtype dict[str, list[str]]
+  """
+  if not isinstance(as_list, (list, set)):
+    return None
+
+  with recorder.span("ripe", ",".join(as_list)) as span:
+    r = await curl_async(asyncio.get_running_loop(), RIPE_BGP_STATUS_URL.format(",".join(as_list)), cache=RIPE_CACHE,
+                         limiter=RIPE_LIMITER)
+    return __group_by_origin(as_list, r, span)
+
+
+class WhoisServerStats(object):
+  """
+  Latency and error rate of the single whois server: EWMA for the server selection and the window of the recent
+  latencies for the hedging deadline and percentiles report
+  """
+  ALPHA = 0.2
+  WINDOW = 1024
+
+  # servers running RIPE database software, which doesn't support IRRd "!" queries
+  NON_IRRD_SERVERS = ("whois.ripe.net", "whois.apnic.net", "whois.afrinic.net")
+
+  def __init__(self, address):
+    """
+    :type address (str, int)
+    """
+    self.address = address
+    self.irrd = address[0].lower() not in self.NON_IRRD_SERVERS
+    self.latency = None
+    self.error_rate = 0.0
+    self.queries = 0
+    self.errors = 0
+    self.hedges = 0
+    self.__samples = deque(maxlen=self.WINDOW)
+    self.__lock = threading.Lock()
+
+  @property
+  def name(self):
+    return "{}:{}".format(*self.address)
+
+  @property
+  def score(self):
+    """
+    Expected time to get the answer, not probed servers go first
+    """
+    if self.latency is None:
+      return 0.0
+    return self.latency / max(0.05, 1.0 - self.error_rate)
+
+  def record(self, latency, success):
+    with self.__lock:
+      self.queries += 1
+      self.error_rate += self.ALPHA * ((0.0 if success else 1.0) - self.error_rate)
+      if success:
+        self.latency = latency if self.latency is None else self.latency + self.ALPHA * (latency - self.latency)
+        self.__samples.append(latency)
+      else:
+        self.errors += 1
+
+  def percentile(self, p):
+    """
+    :type p float
+    :rtype float|None
+    """
+    samples = sorted(self.__samples)
+    if not samples:
+      return None
+    return samples[min(len(samples) - 1, int(len(samples) * p / 100.0))]
+
+  @property
+  def samples(self):
+    return len(self.__samples)
+
+
+class WhoisMirrors(object):
+  """
+  Pool of IRR mirrors: queries go to the server with the best expected latency, async queries are duplicated
+  to the next best server once the first one hasn't answered within the percentile of its recent latencies
+  """
+  def __init__(self, servers, hedge_percentile=95.0, hedge_min_samples=20, hedge_default=1.0, hedge_min_delay=0.005):
+    """
+    :param servers: (host, port) of the mirrors, in the order of preference
+    :param hedge_percentile: percentile of the server recent latencies used as the hedging deadline
+    :param hedge_min_samples: latencies required to trust the percentile, hedge_default is used before that
+    :param hedge_default: seconds, hedging deadline of the servers with not enough samples
+    :param hedge_min_delay: seconds, lower bound of the hedging deadline
+    :type servers list[(str, int)]
+    """
+    if not servers:
+      raise ValueError("No whois servers configured, set RT_WHOIS_SERVER to the comma-separated list of host[:port]")
+
+    self.servers = [WhoisServerStats(address) for address in servers]
+    self.hedge_percentile = hedge_percentile
+    self.hedge_min_samples = hedge_min_samples
+    self.hedge_default = hedge_default
+    self.hedge_min_delay = hedge_min_delay
+
+  def ranked(self, irrd_only=False):
+    """
+    :rtype list[WhoisServerStats]
+    """
+    servers = [server for server in self.servers if server.irrd or not irrd_only] or self.servers
+    return sorted(servers, key=lambda server: server.score)
+
+  def hedge_delay(self, server):
+    """
+    :type server WhoisServerStats
+    :rtype float
+    """
+    if server.samples < self.hedge_min_samples:
+      return self.hedge_default
+    return max(self.hedge_min_delay, server.percentile(self.hedge_percentile))
+
+  def summary(self):
+    """
+    :rtype dict[str, dict]
+    """
+    return {
+      server.name: {
+        "queries": server.queries,
+        "errors": server.errors,
+        "hedges": server.hedges,
+        "ewma": server.latency,
+        "p50": server.percentile(50),
+        "p99": server.percentile(99)
+      }
+      for server in self.servers
+    }
+
+  def summary_table(self):
+    lines = [f"{'whois server':<30} {'queries':>7} {'errors':>6} {'hedges':>6} {'ewma ms':>9} {'p50 ms':>9} {'p99 ms':>9}"]
+    for name, s in self.summary().items():
+      ewma, p50, p99 = (f"{value * 1000:>9.2f}" if value is not None else f"{'-':>9}"
+                        for value in (s["ewma"], s["p50"], s["p99"]))
+      lines.append(f"{name:<30} {s['queries']:>7} {s['errors']:>6} {s['hedges']:>6} {ewma} {p50} {p99}")
+    return "\n".join(lines) + "\n"
+
+
+# all queries to the default servers share the latency statistics
+WHOIS_MIRRORS = WhoisMirrors([split_address(address.strip(), 43) for address in WHOIS_SERVER.split(",")
+                              if address.strip()])
 
 
 class WhoisQuery(object):
 
-  def __init__(self, server="whois.radb.net", port=43):
-    self.__whois_server = (server, port)
+  def __init__(self, server=None, port=43, concurrency=8, limiter=None, mirrors=None):
+    """
+    :param server: query only this server instead of the mirrors
+    :param concurrency: maximal number of simultaneous connections made by async queries
+    :param limiter: rate limit, retries and timeout of the queries, shared WHOIS_LIMITER if not set
+    :param mirrors: servers to choose from, shared WHOIS_MIRRORS if not set
+    :type limiter UpstreamLimiter
+    :type mirrors WhoisMirrors
+    """
+    if server:
+      self.__mirrors = WhoisMirrors([(server, port)])
+    else:
+      self.__mirrors = mirrors if mirrors is not None else WHOIS_MIRRORS
+    self.__concurrency = concurrency
+    self.__async_limit = None
+    self.__limiter = limiter if limiter is not None else WHOIS_LIMITER
 
   def query(self, q):
     """
     :type q str
     """
+    return self.__limiter.call(self.__query, q)
+
+  def __query(self, q):
+    """
+    Query the best server, the next one is tried if it fails
+    """
+    error = None
+    for server in self.__mirrors.ranked(irrd_only=q.startswith("!"))[:2]:
+      if error is not None:  # the failover query is charged to the rate limit as well
+        self.__limiter.bucket.acquire()
+      started = time.perf_counter()
+      try:
+        response = self.__exchange(server.address, q)
+      except OSError as e:
+        server.record(time.perf_counter() - started, False)
+        error = e
+        continue
+
+      server.record(time.perf_counter() - started, True)
+      return response
+
+    raise error
+
+  def __exchange(self, address, q):
     _sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    _sock.settimeout(self.__limiter.timeout)
     try:
-      _sock.connect(self.__whois_server)
+      _sock.connect(address)
       _sock.send(str(q + "\r\n").encode())
 
       response = b""
@@ -66,20 +344,146 @@ class WhoisQuery(object):
 
     return ""
 
+  async def query_async(self, q):
+    """
+    :type q str
+    """
+    return await self.__limiter.call_async(self.__query_async, q)
+
+  async def __query_async(self, q):
+    """
+    Query the best server and, if it hasn't answered by the hedging deadline or failed, the next one as well.
+    The first answer wins, the other query is cancelled.
+    """
+    async with self.__semaphore():  # hedged duplicate doesn't take own slot, so the deadline excludes queueing
+      return await self.__hedged_query_async(q)
+
+  async def __hedged_query_async(self, q):
+    servers = self.__mirrors.ranked(irrd_only=q.startswith("!"))[:2]
+    tasks = [asyncio.ensure_future(self.__timed_exchange_async(servers[0], q))]
+    try:
+      if len(servers) > 1:
+        await asyncio.wait(tasks, timeout=self.__mirrors.hedge_delay(servers[0]))
+        if not tasks[0].done() or tasks[0].exception():
+          await self.__limiter.bucket.acquire_async()  # hedged duplicate is charged to the rate limit as well
+        if not tasks[0].done() or tasks[0].exception():  # could be answered while waiting for the rate limit
+          servers[1].hedges += 1
+          tasks.append(asyncio.ensure_future(self.__timed_exchange_async(servers[1], q)))
+
+      pending, error = set(tasks), None
+      while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+          if task.exception() is None:
+            return task.result()
+          error = task.exception()
+      raise error
+    finally:
+      for task in tasks:
+        task.cancel()
+      # let the losing query close its connection and retrieve its exception
+      await asyncio.gather(*tasks, return_exceptions=True)
+
+  async def __timed_exchange_async(self, server, q):
+    """
+    :type server WhoisServerStats
+    """
+    started = time.perf_counter()
+    try:
+      if self.__limiter.timeout is None:
+        response = await self.__exchange_async(server.address, q)
+      else:
+        response = await asyncio.wait_for(self.__exchange_async(server.address, q), self.__limiter.timeout)
+    except OSError:
+      server.record(time.perf_counter() - started, False)
+      raise
+
+    server.record(time.perf_counter() - started, True)
+    return response
+
+  async def __exchange_async(self, address, q):
+    reader, writer = await asyncio.open_connection(*address)
+    try:
+      writer.write(str(q + "\r\n").encode())
+      await writer.drain()
+      return (await reader.read()).decode()
+    finally:
+      writer.close()
+
+  def __semaphore(self):
+    """
+    Limits number of concurrent connections of async queries
+    """
+    if self.__async_limit is None:
+      self.__async_limit = asyncio.Semaphore(self.__concurrency)
+    return self.__async_limit
+
+  @classmethod
+  def __parse_routes(cls, response):
+    return [line.partition(":")[2].strip() for line in response.split("\n") if line.startswith("route")]
+
+  @classmethod
+  def __parse_members(cls, response):
+    result = []
+    for line in response.split("\n"):
+      line = line.strip()
+      if not line or re.fullmatch(r"[A-F]\d*", line) or line.startswith("F "):  # IRRd response status lines
+        continue
+
+      result.extend(item for item in line.split() if item.upper().startswith("AS"))
+
+    return result
+
   def subnets_by_asn(self, asn):
     """
     :type asn str
     :rtype list[str]
     """
-    result = []
-    q = "-i origin {}".format(asn)
-    lines = self.query(q).split("\n")
-    for line in lines:
-      if line.startswith("route"):
-        result.append(line.partition(":")[2].strip())
+    with recorder.span("whois", asn) as span:
+      response = self.query("-i origin {}".format(asn))
+      result = self.__parse_routes(response)
+      span.bytes = len(response)
+      span.prefixes = len(result)
 
     return result
 
+  async def subnets_by_asn_async(self, asn):
+    """
+    :type asn str
+    :rtype list[str]
+    """
+    with recorder.span("whois", asn) as span:
+      response = await self.query_async("-i origin {}".format(asn))
+      result = self.__parse_routes(response)
+      span.bytes = len(response)
+      span.prefixes = len(result)
+
+    return result
+
+  def members_by_as_set(self, as_set):
+    """
+    Recursively expand AS-SET into the list of ASNs, using IRRd "!i" query
+
+    :type as_set str
+    :rtype list[str]
+    """
+    with recorder.span("whois", as_set) as span:
+      response = self.query("!i{},1".format(as_set))
+      span.bytes = len(response)
+
+    return self.__parse_members(response)
+
+  async def members_by_as_set_async(self, as_set):
+    """
+    :type as_set str
+    :rtype list[str]
+    """
+    with recorder.span("whois", as_set) as span:
+      response = await self.query_async("!i{},1".format(as_set))
+      span.bytes = len(response)
+
+    return self.__parse_members(response)
+
   def subnets_by_asns(self, asn_list):
     """
     :type asn_list list
@@ -91,12 +495,159 @@ class WhoisQuery(object):
 
     return results
 
+  async def subnets_by_asns_async(self, asn_list):
+    """
+    :type asn_list list
+    :rtype list[str]
+    """
+    results = []
+    for prefixes in await asyncio.gather(*(self.subnets_by_asn_async(asn) for asn in asn_list)):
+      results.extend(prefixes)
+
+    return results
+
+
+def __system_nslookup(sitename, span):
+  try:
+    return socket.gethostbyname_ex(sitename)[2]
+  except Exception as e:
+    span.error = type(e).__name__
+    return []
+
 
 def nslookup(sitename):
   """
   :type sitename str
   """
+  if DNS_SERVER:
+    return [address for address, _ in nslookup_ttl(sitename)]
+
+  with recorder.span("dns", sitename) as span:
+    addresses = __system_nslookup(sitename, span)
+    span.prefixes = len(addresses)
+
+  return addresses
+
+
+DNS_DEFAULT_TTL = 300
+__DNS_HEADER = struct.Struct("!HHHHHH")
+__DNS_RECORD = struct.Struct("!HHIH")
+
+
+async def nslookup_async(sitename):
+  """
+  Blocking lookup is run in the default executor of the running loop
+
+  :type sitename str
+  """
+  return await asyncio.get_running_loop().run_in_executor(None, nslookup, sitename)
+
+
+def system_nameserver(resolv_conf="/etc/resolv.conf"):
+  """
+  :type resolv_conf str
+  :rtype str
+  """
   try:
-    return socket.gethostbyname_ex(sitename)[2]
-  except:
+    with open(resolv_conf, "r") as f:
+      for line in f:
+        parts = line.split()
+        if len(parts) >= 2 and parts[0] == "nameserver":
+          return parts[1]
+  except IOError:
+    pass
+
+  return "127.0.0.1"
+
+
+def __dns_skip_name(data, offset):
+  while True:
+    length = data[offset]
+    if length & 0xC0 == 0xC0:  # compression pointer
+      return offset + 2
+    if length == 0:
+      return offset + 1
+    offset += length + 1
+
+
+def __dns_parse_a_records(data, query_id):
+  """
+  :type data bytes
+  :type query_id int
+  :rtype list[(str, int)]
+  """
+  _id, flags, qd_count, an_count, _, _ = __DNS_HEADER.unpack_from(data)
+  if _id != query_id or flags & 0x000F != 0:  # foreign response or error rcode
     return []
+
+  offset = __DNS_HEADER.size
+  for _ in range(qd_count):
+    offset = __dns_skip_name(data, offset) + 4
+
+  addresses = []
+  min_ttl = None
+  for _ in range(an_count):
+    offset = __dns_skip_name(data, offset)
+    r_type, r_class, ttl, r_len = __DNS_RECORD.unpack_from(data, offset)
+    offset += __DNS_RECORD.size
+    min_ttl = ttl if min_ttl is None else min(min_ttl, ttl)  # CNAME chain expires with its shortest record
+    if r_type == 1 and r_class == 1 and r_len == 4:
+      addresses.append(socket.inet_ntoa(data[offset:offset + 4]))
+    offset += r_len
+
+  return [(address, min_ttl) for address in addresses]
+
+
+def dns_query(sitename, server=None, port=53, timeout=2.0):
+  """
+  Resolve A records of the site together with their TTL
+
+  :type sitename str
+  :type server str
+  :type port int
+  :type timeout float
+  :rtype list[(str, int)]
+  """
+  query_id = random.randint(0, 0xFFFF)
+  question = b"".join(bytes([len(label)]) + label.encode("idna") for label in sitename.rstrip(".").split("."))
+  packet = __DNS_HEADER.pack(query_id, 0x0100, 1, 0, 0, 0) + question + b"\0" + struct.pack("!HH", 1, 1)
+  address = (server or system_nameserver(), port)
+
+  with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as _sock:
+    _sock.settimeout(timeout)
+    _sock.sendto(packet, address)
+    data, _ = _sock.recvfrom(4096)
+
+  if __DNS_HEADER.unpack_from(data)[1] & 0x0200:  # truncated, repeat over tcp
+    with socket.create_connection(address, timeout=timeout) as _sock:
+      _sock.sendall(struct.pack("!H", len(packet)) + packet)
+      data = b""
+      while len(data) < 2 or len(data) < struct.unpack_from("!H", data)[0] + 2:
+        chunk = _sock.recv(4096)
+        if not chunk:
+          break
+        data += chunk
+      data = data[2:]
+
+  return __dns_parse_a_records(data, query_id)
+
+
+def nslookup_ttl(sitename, server=None):
+  """
+  Resolve the site addresses with their TTL, falling back to the system resolver with default TTL
+
+  :type sitename str
+  :type server str
+  :rtype list[(str, int)]
+  """
+  host, port = split_address(server or DNS_SERVER or system_nameserver(), 53)
+  with recorder.span("dns", sitename) as span:
+    try:
+      records = dns_query(sitename, host, port)
+    except (socket.error, IndexError, struct.error, UnicodeError) as e:
+      span.error = type(e).__name__
+      records = [(address, DNS_DEFAULT_TTL) for address in __system_nslookup(sitename, span)]
+
+    span.prefixes = len(records)
+
+  return records
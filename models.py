@@ -1,8 +1,9 @@
-from typing import List
+from typing import Dict, List
 
-from modules.apputils.json2obj import SerializableObject
+from modules.apputils.json2obj import SerializableObject, compact
 
 
+@compact
 class NetworkItem(SerializableObject):
   name: str = None
   items:List[str] = []
@@ -11,3 +12,14 @@ class NetworkItem(SerializableObject):
 
 class Networks(SerializableObject):
   items:List[NetworkItem] = []
+
+
+@compact
+class ResolvedNetwork(SerializableObject):
+  hash: str = None
+  resolved: float = 0.0
+  sources: Dict[str, List[str]] = {}
+
+
+class ResolutionState(SerializableObject):
+  items: Dict[str, ResolvedNetwork] = {}
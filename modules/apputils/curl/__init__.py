@@ -17,19 +17,24 @@
 #
 #
 
+import codecs
 import json
 import base64
 import gzip
 import zlib
 import re
+import threading
+import time
 from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from asyncio.events import AbstractEventLoop
 from enum import Enum
 
-from typing import Dict, IO, Mapping, Optional, Tuple, List
+from typing import Dict, IO, Iterator, Mapping, Optional, Tuple, List
 from http.client import HTTPResponse
 from urllib.request import HTTPPasswordMgrWithDefaultRealm, HTTPBasicAuthHandler, HTTPRedirectHandler, Request, \
-  build_opener
+  HTTPCookieProcessor, OpenerDirector, build_opener
+from http.cookiejar import CookieJar
 from urllib.parse import urlencode
 from io import BytesIO
 try:
@@ -37,6 +42,13 @@ try:
 except ImportError:
   from urllib.error import URLError, HTTPError
 
+from ..ratelimit import RetryableError, UpstreamLimiter
+from .cache import CachedResult, CacheEntry, HTTPCache, response_headers
+from .pool import ConnectionPool, PooledHTTPHandler, PooledHTTPSHandler, PooledRedirectHandler
+
+
+RETRY_CODES = (429, 502, 503, 504)  # responses retried by the sessions with the upstream limiter
+
 
 class CurlRequestType(Enum):
   GET = "GET"
@@ -95,7 +107,37 @@ class CURLCookie(object):
     return f"{self.__name}={self.__value}"
 
 
+class _ContentDecoder(object):
+  """
+  Incremental decoder of the compressed content, handles concatenated gzip members the same way as GzipFile
+  """
+  def __init__(self, content_encoding: str):
+    if "gzip" in content_encoding or "x-gzip" in content_encoding:
+      self.__wbits = 16 + zlib.MAX_WBITS
+    elif "deflate" in content_encoding:
+      self.__wbits = zlib.MAX_WBITS
+    else:
+      self.__wbits = None
+    self.__decompressor = zlib.decompressobj(self.__wbits) if self.__wbits else None
+
+  def decompress(self, data: bytes) -> bytes:
+    if self.__decompressor is None:
+      return data
+
+    result = [self.__decompressor.decompress(data)]
+    while self.__decompressor.eof and self.__decompressor.unused_data:
+      data = self.__decompressor.unused_data
+      self.__decompressor = zlib.decompressobj(self.__wbits)
+      result.append(self.__decompressor.decompress(data))
+    return b"".join(result)
+
+  def flush(self) -> bytes:
+    return self.__decompressor.flush() if self.__decompressor is not None else b""
+
+
 class CURLResponse(object):
+  CHUNK_SIZE = 64 * 1024
+
   def __init__(self, director_open_result: HTTPResponse or HTTPError, is_stream: bool = False):
     self._code: int = director_open_result.getcode()
     self._headers = director_open_result.info()
@@ -105,17 +147,19 @@ class CURLResponse(object):
     if not self._is_stream:
       self._content = director_open_result.read()
 
-  def __decode_response(self, data: bytes or str) -> str:
-    data = self.__decode_compressed(data)
-    if isinstance(data, bytes) and "Content-Type" in self._headers and "charset" in self._headers["Content-Type"]:
+  def __charset(self) -> str:
+    if "Content-Type" in self._headers and "charset" in self._headers["Content-Type"]:
       charset = list(filter(lambda x: "charset" in x, self._headers["Content-Type"].split(';')))
       if len(charset) > 0:
         charset = charset[0].split('=')
         if len(charset) == 2:
-          return data.decode(charset[1].lower())
-      return data.decode('utf-8')
-    elif isinstance(data, bytes):
-      return data.decode('utf-8')
+          return charset[1].strip().strip('"').lower()
+    return 'utf-8'
+
+  def __decode_response(self, data: bytes or str) -> str:
+    data = self.__decode_compressed(data)
+    if isinstance(data, bytes):
+      return data.decode(self.__charset())
     else:
       return data
 
@@ -129,6 +173,67 @@ class CURLResponse(object):
 
     return data
 
+  def __raw_chunks(self, chunk_size: int) -> Iterator[bytes]:
+    if not self._is_stream:
+      content = memoryview(self._content)
+      for offset in range(0, len(content), chunk_size):
+        yield content[offset:offset + chunk_size]
+      return
+
+    while True:
+      data = self._director_result.read(chunk_size)
+      if not data:
+        break
+      yield data
+
+  def iter_bytes(self, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Iterate over the decompressed content, only one chunk of the decompressed data is kept in memory.
+    Stream response is read from the connection while iterating and could be iterated only once.
+
+    :param chunk_size: size of the raw (compressed) data chunks
+    """
+    decoder = _ContentDecoder(self._headers.get("Content-Encoding", ""))
+    for data in self.__raw_chunks(chunk_size):
+      data = decoder.decompress(data)
+      if data:
+        yield data
+
+    data = decoder.flush()
+    if data:
+      yield data
+
+  def iter_lines(self, chunk_size: int = CHUNK_SIZE, keep_ends: bool = False) -> Iterator[str]:
+    """
+    Iterate over the decompressed and decoded lines of the content
+
+    :param chunk_size: size of the raw (compressed) data chunks
+    :param keep_ends: keep line breaks at the end of the lines
+    """
+    decoder = codecs.getincrementaldecoder(self.__charset())()
+    pending = ""
+    for data in self.iter_bytes(chunk_size):
+      lines = (pending + decoder.decode(data)).split("\n")
+      pending = lines.pop()
+      for line in lines:
+        yield line + "\n" if keep_ends else line.rstrip("\r")
+
+    pending += decoder.decode(b"", final=True)
+    if pending:
+      yield pending if keep_ends else pending.rstrip("\r")
+
+  def json(self):
+    """
+    Parse the content as JSON directly from the decompressed bytes without decoding it to the text first
+
+    :raises ValueError: if the content is not a valid JSON
+    """
+    data = b"".join(self.iter_bytes()) if self._is_stream else self.__decode_compressed(self._content)
+    charset = self.__charset()
+    if charset.replace("-", "").replace("_", "") not in ("utf8", "utf16", "utf32"):  # json detects only UTF encodings
+      return json.loads(data.decode(charset))
+    return json.loads(data)
+
   @property
   def code(self):
     """
@@ -160,6 +265,13 @@ class CURLResponse(object):
     """
     return self._director_result if self._is_stream else self._content
 
+  @property
+  def director_result(self) -> HTTPResponse or HTTPError:
+    """
+    :return: Response object returned by the opener
+    """
+    return self._director_result
+
   def from_json(self):
     """
     :return: Return parsed json object from the response, if possible.
@@ -168,7 +280,7 @@ class CURLResponse(object):
     :rtype dict
     """
     try:
-      return json.loads(self.content)
+      return self.json()
     except ValueError:
       return None
 
@@ -274,39 +386,28 @@ async def curl_async(loop: AbstractEventLoop,
                      timeout: int = None,
                      use_gzip: bool = True,
                      use_stream: bool = False,
-                     follow_redirect: bool = True) -> CURLResponse:
-  return await loop.run_in_executor(
-    None,
-    lambda: curl(url, params, auth, req_type, data, headers, cookies, timeout, use_gzip, use_stream, follow_redirect)
-  )
-
+                     follow_redirect: bool = True,
+                     cache: HTTPCache = None,
+                     limiter: UpstreamLimiter = None) -> CURLResponse:
+  """
+  Non-blocking version of curl, made over the connections shared by the calls in the running event loop
 
-def curl(url: str,
-         params: Dict[str, str] = None,
-         auth: CURLAuth = None,
-         req_type: CurlRequestType = CurlRequestType.GET,
-         data: str or bytes or dict = None,
-         headers: Dict[str, str] = None,
-         cookies: List[CURLCookie] = None,
-         timeout: int = None,
-         use_gzip: bool = True,
-         use_stream: bool = False,
-         follow_redirect: bool = True) -> CURLResponse:
+  :param loop: kept for compatibility, the running loop is always used
   """
-  Make request to web resource
+  return await aio.default_session().curl(url, params, auth, req_type, data, headers, cookies, timeout, use_gzip,
+                                          use_stream, follow_redirect, cache, limiter)
 
-  :param cookies: list of cookies to send alongside with the request
-  :param url: Url to endpoint
-  :param params: list of params after "?"
-  :param auth: authorization tokens
-  :param req_type: column_type of the request
-  :param data: data which need to be posted
-  :param headers: headers which would be posted with request
-  :param timeout: Request timeout
-  :param use_gzip: Accept gzip and deflate response from the server
-  :param use_stream: Do not parse content of response ans stream it via raw property
-  :param follow_redirect Do follow HTTP redirects or not
-  :return Response object
+
+def _prepare_request(url: str,
+                     params: Dict[str, str] = None,
+                     auth: CURLAuth = None,
+                     req_type: CurlRequestType = CurlRequestType.GET,
+                     data: str or bytes or dict = None,
+                     headers: Dict[str, str] = None,
+                     cookies: List[CURLCookie] = None,
+                     use_gzip: bool = True) -> Tuple[Request, Optional[CURLAuth]]:
+  """
+  :return request and credentials which should be handled by basic auth handler
   """
   post_req = [CurlRequestType.POST, CurlRequestType.PUT]
   get_req = [CurlRequestType.GET, CurlRequestType.DELETE]
@@ -318,7 +419,6 @@ def curl(url: str,
     raise IOError("Wrong request column_type \"%s\" passed" % req_type)
 
   _headers = {}
-  handler_chain = []
   req_args = {
     "headers": _headers
   }
@@ -336,11 +436,6 @@ def curl(url: str,
     else:
       _headers["Accept-Encoding"] = "gzip, x-gzip, deflate"
 
-  if auth is not None and auth.force is False:
-    manager = HTTPPasswordMgrWithDefaultRealm()
-    manager.add_password("", url, auth.user, auth.password)
-    handler_chain.append(HTTPBasicAuthHandler(manager))
-
   if auth is not None and auth.force:
     _headers.update(auth.headers)
 
@@ -354,13 +449,12 @@ def curl(url: str,
 
     _headers["cookie"] = "; ".join(temp_cookies)
 
-  if not follow_redirect:
-    handler_chain.append(HTTPRedirectFilter)
-
-  director = build_opener(*handler_chain)
   req = Request(url, **req_args)
   req.get_method = lambda: req_type.value
+  return req, auth if auth is not None and auth.force is False else None
 
+
+def _open(director: OpenerDirector, req: Request, timeout: int = None, use_stream: bool = False) -> CURLResponse:
   try:
     if timeout is not None:
       return CURLResponse(director.open(req, timeout=timeout), is_stream=use_stream)
@@ -371,3 +465,197 @@ def curl(url: str,
       return CURLResponse(e, is_stream=use_stream)
     else:
       raise TimeoutError
+
+
+def _cache_lookup(cache: Optional[HTTPCache], req: Request,
+                  use_stream: bool) -> Tuple[Optional[CacheEntry], Optional[CURLResponse]]:
+  """
+  :return cached entry to be revalidated and the response if the entry is fresh enough to be served as is
+  """
+  if cache is None or use_stream or not cache.is_cacheable_request(req):
+    return None, None
+
+  entry = cache.get(req)
+  if entry is not None and entry.is_fresh:
+    return entry, CURLResponse(CachedResult(entry))
+
+  if entry is not None:
+    cache.add_validators(req, entry)
+  return entry, None
+
+
+def _cache_update(cache: Optional[HTTPCache], req: Request, entry: Optional[CacheEntry],
+                  r: CURLResponse) -> CURLResponse:
+  """
+  :return cached response for 304 answer to the conditional request, the passed one otherwise
+  """
+  if cache is None or (entry is None and not cache.is_cacheable_request(req)):
+    return r
+
+  if r.code == 304 and entry is not None:
+    return CURLResponse(CachedResult(cache.revalidated(entry, response_headers(r.headers))))
+
+  if not r._is_stream:
+    cache.put(req, r.code, response_headers(r.headers), r.raw)
+  return r
+
+
+def _retry_after(r: CURLResponse) -> Optional[float]:
+  value = r.headers.get("Retry-After", "").strip()
+  if value.isdigit():
+    return float(value)
+  try:
+    return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+  except (TypeError, ValueError):
+    return None
+
+
+def _raise_for_retry(r: CURLResponse) -> CURLResponse:
+  """
+  Turn the "try later" answer into RetryableError for the upstream limiter
+  """
+  if r.code in RETRY_CODES and not r._is_stream:
+    raise RetryableError(f"HTTP {r.code}", r, _retry_after(r))
+  return r
+
+
+def curl(url: str,
+         params: Dict[str, str] = None,
+         auth: CURLAuth = None,
+         req_type: CurlRequestType = CurlRequestType.GET,
+         data: str or bytes or dict = None,
+         headers: Dict[str, str] = None,
+         cookies: List[CURLCookie] = None,
+         timeout: int = None,
+         use_gzip: bool = True,
+         use_stream: bool = False,
+         follow_redirect: bool = True,
+         cache: HTTPCache = None,
+         limiter: UpstreamLimiter = None) -> CURLResponse:
+  """
+  Make request to web resource, over the session living for this request only.
+  Use CurlSession to keep connections and cookies between the requests
+
+  :param cookies: list of cookies to send alongside with the request
+  :param url: Url to endpoint
+  :param params: list of params after "?"
+  :param auth: authorization tokens
+  :param req_type: column_type of the request
+  :param data: data which need to be posted
+  :param headers: headers which would be posted with request
+  :param timeout: Request timeout
+  :param use_gzip: Accept gzip and deflate response from the server
+  :param use_stream: Do not parse content of response ans stream it via raw property
+  :param follow_redirect Do follow HTTP redirects or not
+  :param cache: serve GET requests from the cache and revalidate the cached responses
+  :param limiter: wait for the rate limit and retry failed requests, see CurlSession.curl
+  :return Response object
+  """
+  with CurlSession() as session:
+    return session.curl(url, params, auth, req_type, data, headers, cookies, timeout, use_gzip, use_stream,
+                        follow_redirect, cache, limiter)
+
+
+class CurlSession(object):
+  """
+  Keeps persistent HTTP/1.1 connections to the hosts between requests, alongside with the cookies set by them.
+  Openers and handler chains are built once per session and reused by all the requests.
+
+  Usage:
+    with CurlSession(pool_size=4, idle_timeout=30) as session:
+      r = session.curl("https://stat.ripe.net/data/bgp-state/data.json", params={"resource": "AS1"})
+  """
+  def __init__(self, pool_size: int = 4, idle_timeout: float = 30.0, cookie_jar: CookieJar = None,
+               cache: HTTPCache = None, limiter: UpstreamLimiter = None):
+    """
+    :param pool_size: maximal number of idle connections kept per host
+    :param idle_timeout: seconds after which idle connection is not reused anymore
+    :param cookie_jar: storage of the cookies set by the servers, new one is created if not passed
+    :param cache: HTTP cache used by the requests which don't pass own one
+    :param limiter: rate limit, retries and default timeout of the requests which don't pass own one
+    """
+    self.__pool = ConnectionPool(pool_size, idle_timeout)
+    self.__cache = cache
+    self.__limiter = limiter
+    self.__cookie_jar = cookie_jar if cookie_jar is not None else CookieJar()
+    self.__passwords = HTTPPasswordMgrWithDefaultRealm()
+    self.__openers: Dict[bool, OpenerDirector] = {}
+    self.__lock = threading.Lock()
+
+  @property
+  def cookie_jar(self) -> CookieJar:
+    return self.__cookie_jar
+
+  def __opener(self, follow_redirect: bool) -> OpenerDirector:
+    with self.__lock:
+      if follow_redirect not in self.__openers:
+        handler_chain = [
+          PooledHTTPHandler(self.__pool),
+          PooledHTTPSHandler(self.__pool),
+          HTTPCookieProcessor(self.__cookie_jar),
+          HTTPBasicAuthHandler(self.__passwords),
+          PooledRedirectHandler(self.__pool) if follow_redirect else HTTPRedirectFilter
+        ]
+        self.__openers[follow_redirect] = build_opener(*handler_chain)
+
+      return self.__openers[follow_redirect]
+
+  def curl(self,
+           url: str,
+           params: Dict[str, str] = None,
+           auth: CURLAuth = None,
+           req_type: CurlRequestType = CurlRequestType.GET,
+           data: str or bytes or dict = None,
+           headers: Dict[str, str] = None,
+           cookies: List[CURLCookie] = None,
+           timeout: int = None,
+           use_gzip: bool = True,
+           use_stream: bool = False,
+           follow_redirect: bool = True,
+           cache: HTTPCache = None,
+           limiter: UpstreamLimiter = None) -> CURLResponse:
+    """
+    Same as curl function, but the request is made over pooled connection. Connection of the stream response
+    is not reused.
+
+    With the limiter requests wait for the rate limit, failed and answered with 429/5xx "try later" codes
+    requests are retried with backoff (POST only once the limiter allows, without retries).
+    """
+    req, basic_auth = _prepare_request(url, params, auth, req_type, data, headers, cookies, use_gzip)
+    cache = cache if cache is not None else self.__cache
+    entry, cached = _cache_lookup(cache, req, use_stream)
+    if cached is not None:
+      return cached
+
+    if basic_auth is not None:
+      self.__passwords.add_password("", req.full_url, basic_auth.user, basic_auth.password)
+
+    limiter = limiter if limiter is not None else self.__limiter
+    if limiter is not None and timeout is None:
+      timeout = limiter.timeout
+
+    def _request() -> CURLResponse:
+      r = _open(self.__opener(follow_redirect), req, timeout, use_stream)
+      if not use_stream:
+        result = r.director_result
+        self.__pool.release_response(result.fp if isinstance(result, HTTPError) else result)
+      return _raise_for_retry(r) if limiter is not None else r
+
+    if limiter is not None:
+      r = limiter.call(_request, retry=req.get_method() != CurlRequestType.POST.value)
+    else:
+      r = _request()
+    return _cache_update(cache, req, entry, r)
+
+  def close(self):
+    self.__pool.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_val, exc_tb):
+    self.close()
+
+
+from . import aio  # noqa: E402, asyncio client depends on the definitions above
+from .aio import AsyncCurlSession  # noqa: E402
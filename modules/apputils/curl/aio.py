@@ -0,0 +1,474 @@
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Github: https://github.com/hapylestat/apputils
+#
+#
+
+import asyncio
+import ssl
+import sys
+import time
+import weakref
+from email.parser import Parser
+from http.client import HTTPMessage
+from http.cookiejar import CookieJar
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+from urllib.request import Request
+
+from ..discovery.eventloop import at_shutdown
+from ..ratelimit import UpstreamLimiter
+from . import CURLAuth, CURLCookie, CURLResponse, CurlRequestType, _cache_lookup, _cache_update, _prepare_request, \
+  _raise_for_retry
+from .cache import HTTPCache
+
+MAX_REDIRECTIONS = 10  # same as urllib
+MAX_HEADERS = 100
+READ_SIZE = 64 * 1024
+USER_AGENT = f"Python-urllib/{sys.version_info[0]}.{sys.version_info[1]}"
+
+__default_sessions: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncCurlSession]" = \
+  weakref.WeakKeyDictionary()
+
+
+class HTTPProtocolError(IOError):
+  pass
+
+
+class AsyncConnection(object):
+  def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    self.reader = reader
+    self.writer = writer
+    self.last_used = time.monotonic()
+
+  @property
+  def is_closed(self) -> bool:
+    return self.writer.is_closing() or self.reader.at_eof()
+
+  def close(self):
+    self.writer.close()
+
+
+class AsyncHTTPResponse(object):
+  """
+  HTTP/1.1 response read from the asyncio stream, provides the part of http.client.HTTPResponse interface used
+  by CURLResponse. Body of the stream response is read by "aread" or by iterating over it with "async for".
+  """
+  def __init__(self, url: str, status: int, reason: str, version: int, headers: HTTPMessage, method: str):
+    self.url = url
+    self.status = self.code = status
+    self.reason = self.msg = reason
+    self.version = version
+    self.headers = headers
+    self.will_close = False
+
+    self.__conn: Optional[AsyncConnection] = None
+    self.__on_done: Optional[Callable[[AsyncConnection, bool], None]] = None
+    self.__chunked = False
+    self.__remaining: Optional[int] = None  # bytes left for Content-Length body, None if read until EOF
+    self.__chunk_left = 0
+    self.__eof = False
+    self.__buffer = b""
+    self.__body = b""
+
+    connection = headers.get("Connection", "").lower()
+    if "close" in connection or (version == 10 and "keep-alive" not in connection):
+      self.will_close = True
+
+    if method == "HEAD" or status in (204, 304) or 100 <= status < 200:
+      self.__remaining = 0
+    elif "chunked" in headers.get("Transfer-Encoding", "").lower():
+      self.__chunked = True
+    elif headers.get("Content-Length", "").strip().isdigit():
+      self.__remaining = int(headers["Content-Length"])
+    else:
+      self.will_close = True
+
+  def attach(self, conn: AsyncConnection, on_done: Callable[[AsyncConnection, bool], None]):
+    """
+    :arg on_done called with the connection and whether it could be reused once the body is read or closed
+    """
+    self.__conn = conn
+    self.__on_done = on_done
+    if self.__remaining == 0:
+      self.__finish()
+
+  def getcode(self) -> int:
+    return self.status
+
+  def info(self) -> HTTPMessage:
+    return self.headers
+
+  def read(self) -> bytes:
+    """
+    :return body of the response loaded by the client, use "aread" for stream response
+    """
+    return self.__body
+
+  def isclosed(self) -> bool:
+    return self.__eof
+
+  def __finish(self, reusable: bool = True):
+    self.__eof = True
+    conn, on_done = self.__conn, self.__on_done
+    self.__conn = self.__on_done = None
+    if conn is not None:
+      on_done(conn, reusable and not self.will_close)
+
+  async def __read_chunk(self) -> bytes:
+    reader = self.__conn.reader
+    if self.__chunked:
+      if self.__chunk_left == 0:
+        line = await reader.readline()
+        try:
+          self.__chunk_left = int(line.split(b";", 1)[0], 16)
+        except ValueError:
+          raise HTTPProtocolError(f"invalid chunk size: {line!r}")
+
+        if self.__chunk_left == 0:
+          while (await reader.readline()) not in (b"\r\n", b"\n", b""):  # trailers
+            pass
+          self.__finish()
+          return b""
+
+      data = await reader.read(min(self.__chunk_left, READ_SIZE))
+      if not data:
+        raise asyncio.IncompleteReadError(b"", self.__chunk_left)
+      self.__chunk_left -= len(data)
+      if self.__chunk_left == 0:
+        await reader.readexactly(2)  # CRLF after the chunk data
+      return data
+
+    if self.__remaining is None:
+      data = await reader.read(READ_SIZE)
+      if not data:
+        self.__finish(reusable=False)
+      return data
+
+    data = await reader.read(min(self.__remaining, READ_SIZE))
+    if not data:
+      raise asyncio.IncompleteReadError(b"", self.__remaining)
+    self.__remaining -= len(data)
+    if self.__remaining == 0:
+      self.__finish()
+    return data
+
+  async def aread(self, amt: int = -1) -> bytes:
+    """
+    :arg amt maximal number of bytes to read, whole remaining body if negative
+    """
+    result = [self.__buffer]
+    size = len(self.__buffer)
+    try:
+      while not self.__eof and (amt < 0 or size < amt):
+        data = await self.__read_chunk()
+        result.append(data)
+        size += len(data)
+    except BaseException:
+      self.close()
+      raise
+
+    data = b"".join(result)
+    if amt < 0:
+      self.__buffer = b""
+      return data
+
+    self.__buffer = data[amt:]
+    return data[:amt]
+
+  async def load(self):
+    """
+    Read the whole body, so it could be accessed via "read"
+    """
+    self.__body = await self.aread()
+
+  def close(self):
+    if not self.__eof:
+      self.__finish(reusable=False)
+
+  async def __aiter__(self):
+    while True:
+      data = await self.aread(READ_SIZE)
+      if not data:
+        break
+      yield data
+
+
+class AsyncCurlSession(object):
+  """
+  Non-blocking HTTP/1.1 client built on asyncio streams: persistent connections, chunked transfer encoding and
+  limit of concurrent connections per host. Responses are wrapped into CURLResponse, so compressed content is
+  decoded the same way as for the synchronous curl.
+
+  Session is bound to the event loop it was first used in.
+
+  Usage:
+    async with AsyncCurlSession(limit_per_host=8) as session:
+      r = await session.curl("https://stat.ripe.net/data/bgp-state/data.json", params={"resource": "AS1"})
+  """
+  def __init__(self, limit_per_host: int = 8, idle_timeout: float = 30.0, cookie_jar: CookieJar = None,
+               ssl_context: ssl.SSLContext = None, cache: HTTPCache = None, limiter: UpstreamLimiter = None):
+    """
+    :param limit_per_host: maximal number of simultaneous connections to the same host
+    :param idle_timeout: seconds after which idle connection is not reused anymore
+    :param cookie_jar: storage of the cookies set by the servers, new one is created if not passed
+    :param ssl_context: context for HTTPS connections, default one is used if not passed
+    :param cache: HTTP cache used by the requests which don't pass own one
+    :param limiter: rate limit, retries and default timeout of the requests which don't pass own one
+    """
+    self.__limit = limit_per_host
+    self.__idle_timeout = idle_timeout
+    self.__cookie_jar = cookie_jar if cookie_jar is not None else CookieJar()
+    self.__ssl_context = ssl_context
+    self.__cache = cache
+    self.__limiter = limiter
+    self.__semaphores: Dict[tuple, asyncio.Semaphore] = {}
+    self.__idle: Dict[tuple, List[AsyncConnection]] = {}
+
+  @property
+  def cookie_jar(self) -> CookieJar:
+    return self.__cookie_jar
+
+  def __ssl(self) -> ssl.SSLContext:
+    if self.__ssl_context is None:
+      self.__ssl_context = ssl.create_default_context()
+    return self.__ssl_context
+
+  def __semaphore(self, key: tuple) -> asyncio.Semaphore:
+    if key not in self.__semaphores:
+      self.__semaphores[key] = asyncio.Semaphore(self.__limit)
+    return self.__semaphores[key]
+
+  async def __connect(self, key: tuple) -> Tuple[AsyncConnection, bool]:
+    """
+    :return connection and whether it was reused from the pool
+    """
+    now = time.monotonic()
+    idle = self.__idle.get(key, [])
+    while idle:
+      conn = idle.pop()
+      if now - conn.last_used < self.__idle_timeout and not conn.is_closed:
+        return conn, True
+      conn.close()
+
+    scheme, host, port = key
+    if scheme == "https":
+      reader, writer = await asyncio.open_connection(host, port, ssl=self.__ssl(), server_hostname=host)
+    else:
+      reader, writer = await asyncio.open_connection(host, port)
+    return AsyncConnection(reader, writer), False
+
+  def __release(self, key: tuple, conn: AsyncConnection, reusable: bool):
+    if reusable and not conn.is_closed:
+      conn.last_used = time.monotonic()
+      self.__idle.setdefault(key, []).append(conn)
+    else:
+      conn.close()
+    self.__semaphore(key).release()
+
+  @classmethod
+  def __encode_request(cls, req: Request) -> bytes:
+    headers = dict(req.unredirected_hdrs)
+    headers.update({k: v for k, v in req.headers.items() if k not in headers})
+    headers = {name.title(): str(val) for name, val in headers.items()}
+    headers.setdefault("Host", req.host)
+    headers.setdefault("User-Agent", USER_AGENT)
+    headers.setdefault("Accept-Encoding", "identity")
+    headers["Connection"] = "keep-alive"
+    if req.data is not None:
+      headers.setdefault("Content-Type", "application/x-www-form-urlencoded")
+      headers.setdefault("Content-Length", str(len(req.data)))
+
+    lines = [f"{req.get_method()} {req.selector} HTTP/1.1"]
+    lines.extend(f"{name}: {value}" for name, value in headers.items())
+    head = ("\r\n".join(lines) + "\r\n\r\n").encode("iso-8859-1")
+    return head + req.data if req.data is not None else head
+
+  @classmethod
+  async def __read_response(cls, conn: AsyncConnection, req: Request) -> AsyncHTTPResponse:
+    while True:
+      line = await conn.reader.readline()
+      if not line:
+        raise ConnectionResetError("Remote end closed connection without response")
+
+      version, _, rest = line.decode("iso-8859-1").strip().partition(" ")
+      status, _, reason = rest.partition(" ")
+      if not version.startswith("HTTP/") or not status.isdigit():
+        raise HTTPProtocolError(f"invalid status line: {line!r}")
+
+      header_lines = []
+      while True:
+        header_line = await conn.reader.readline()
+        if header_line in (b"\r\n", b"\n", b""):
+          break
+        header_lines.append(header_line)
+        if len(header_lines) > MAX_HEADERS:
+          raise HTTPProtocolError(f"got more than {MAX_HEADERS} headers")
+
+      if 100 <= int(status) < 200:  # interim response, e.g. "100 Continue"
+        continue
+
+      headers = Parser(_class=HTTPMessage).parsestr(b"".join(header_lines).decode("iso-8859-1"))
+      return AsyncHTTPResponse(req.full_url, int(status), reason.strip(), 10 if version == "HTTP/1.0" else 11,
+                               headers, req.get_method())
+
+  async def __request(self, req: Request) -> AsyncHTTPResponse:
+    """
+    Send request and read response headers, body is left in the connection
+    """
+    url = urlsplit(req.full_url)
+    if url.scheme not in ("http", "https") or not url.hostname:
+      raise HTTPProtocolError(f"unsupported url: {req.full_url}")
+
+    key = (url.scheme, url.hostname, url.port or (443 if url.scheme == "https" else 80))
+    semaphore = self.__semaphore(key)
+    await semaphore.acquire()
+
+    try:
+      for attempt in range(2):
+        conn, reused = await self.__connect(key)
+        try:
+          conn.writer.write(self.__encode_request(req))
+          await conn.writer.drain()
+          response = await self.__read_response(conn, req)
+          break
+        except (ConnectionResetError, BrokenPipeError, asyncio.IncompleteReadError):
+          conn.close()
+          if reused and attempt == 0:  # keep-alive connection was closed by the server meanwhile, retry on a new one
+            continue
+          raise
+        except BaseException:
+          conn.close()
+          raise
+    except BaseException:
+      semaphore.release()
+      raise
+
+    response.attach(conn, lambda _conn, reusable: self.__release(key, _conn, reusable))
+    return response
+
+  @classmethod
+  def __redirect_request(cls, req: Request, response: AsyncHTTPResponse) -> Optional[Request]:
+    """
+    Same rules as urllib.request.HTTPRedirectHandler follows
+    """
+    location = response.headers.get("Location") or response.headers.get("URI")
+    method = req.get_method()
+    if not location or not ((response.status in (301, 302, 303, 307, 308) and method in ("GET", "HEAD"))
+                            or (response.status in (301, 302, 303) and method == "POST")):
+      return None
+
+    headers = {k: v for k, v in req.headers.items() if k.lower() not in ("content-length", "content-type")}
+    return Request(urljoin(req.full_url, location), headers=headers, origin_req_host=req.origin_req_host,
+                   unverifiable=True, method="HEAD" if method == "HEAD" else "GET")
+
+  async def __open(self, req: Request, basic_auth: Optional[CURLAuth], use_stream: bool,
+                   follow_redirect: bool) -> AsyncHTTPResponse:
+    auth_sent = False
+    for _ in range(MAX_REDIRECTIONS + 1):
+      self.__cookie_jar.add_cookie_header(req)
+      response = await self.__request(req)
+      self.__cookie_jar.extract_cookies(response, req)
+
+      if response.status == 401 and basic_auth is not None and not auth_sent \
+        and "basic" in response.headers.get("WWW-Authenticate", "").lower():
+        await response.aread()
+        req.add_unredirected_header("Authorization", basic_auth.get_auth_header()["Authorization"])
+        auth_sent = True
+        continue
+
+      new_req = self.__redirect_request(req, response) if follow_redirect else None
+      if new_req is None:
+        if not use_stream:
+          await response.load()
+        return response
+
+      await response.aread()
+      req = new_req
+
+    if not use_stream:
+      await response.load()
+    return response
+
+  async def curl(self,
+                 url: str,
+                 params: Dict[str, str] = None,
+                 auth: CURLAuth = None,
+                 req_type: CurlRequestType = CurlRequestType.GET,
+                 data: str or bytes or dict = None,
+                 headers: Dict[str, str] = None,
+                 cookies: List[CURLCookie] = None,
+                 timeout: int = None,
+                 use_gzip: bool = True,
+                 use_stream: bool = False,
+                 follow_redirect: bool = True,
+                 cache: HTTPCache = None,
+                 limiter: UpstreamLimiter = None) -> CURLResponse:
+    """
+    Same as CurlSession.curl. For the stream response timeout is applied to the response headers only and
+    the body should be read via "await response.raw.aread()" or "async for chunk in response.raw".
+    """
+    req, basic_auth = _prepare_request(url, params, auth, req_type, data, headers, cookies, use_gzip)
+    cache = cache if cache is not None else self.__cache
+    entry, cached = _cache_lookup(cache, req, use_stream)
+    if cached is not None:
+      return cached
+
+    limiter = limiter if limiter is not None else self.__limiter
+    if limiter is not None and timeout is None:
+      timeout = limiter.timeout
+
+    async def _request() -> CURLResponse:
+      try:
+        if timeout is not None:
+          response = await asyncio.wait_for(self.__open(req, basic_auth, use_stream, follow_redirect), timeout)
+        else:
+          response = await self.__open(req, basic_auth, use_stream, follow_redirect)
+      except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:  # same as curl raises for URLError
+        raise TimeoutError(str(e) or type(e).__name__) from e
+
+      r = CURLResponse(response, is_stream=use_stream)
+      return _raise_for_retry(r) if limiter is not None else r
+
+    if limiter is not None:
+      r = await limiter.call_async(_request, retry=req.get_method() != CurlRequestType.POST.value)
+    else:
+      r = await _request()
+    return _cache_update(cache, req, entry, r)
+
+  def close(self):
+    idle, self.__idle = self.__idle, {}
+    for connections in idle.values():
+      for conn in connections:
+        conn.close()
+
+  async def __aenter__(self):
+    return self
+
+  async def __aexit__(self, exc_type, exc_val, exc_tb):
+    self.close()
+
+
+def default_session() -> AsyncCurlSession:
+  """
+  Session shared by curl_async calls made in the running event loop
+  """
+  loop = asyncio.get_running_loop()
+  session = __default_sessions.get(loop)
+  if session is None:
+    session = __default_sessions[loop] = AsyncCurlSession()
+    at_shutdown(session.close)
+  return session
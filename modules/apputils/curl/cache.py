@@ -0,0 +1,289 @@
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Github: https://github.com/hapylestat/apputils
+#
+#
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from email.message import Message
+from email.utils import parsedate_to_datetime
+from http.client import HTTPMessage
+from typing import Dict, List, Optional, Tuple
+from urllib.request import Request
+
+CACHE_FILE_SUFFIX = ".http"
+CACHEABLE_CODES = (200, 203)
+# headers of 304 response which replace the stored ones, RFC 7232 section 4.1
+# lower-cased names of the headers updated by 304 response
+REVALIDATION_HEADERS = ("cache-control", "content-location", "date", "etag", "expires", "last-modified", "vary")
+
+
+class CacheEntry(object):
+  def __init__(self, key: str, url: str, code: int, headers: List[Tuple[str, str]], stored: float, body: bytes = b""):
+    """
+    :arg headers response headers as the list of name and value pairs
+    :arg stored unix time of the response receiving or the last revalidation
+    :arg body raw response body, as it was received from the server
+    """
+    self.key = key
+    self.url = url
+    self.code = code
+    self.headers = headers
+    self.stored = stored
+    self.body = body
+
+  def header(self, name: str) -> Optional[str]:
+    name = name.lower()
+    return next((value for _name, value in self.headers if _name.lower() == name), None)
+
+  @property
+  def etag(self) -> Optional[str]:
+    return self.header("ETag")
+
+  @property
+  def last_modified(self) -> Optional[str]:
+    return self.header("Last-Modified")
+
+  @property
+  def is_fresh(self) -> bool:
+    directives = cache_control(self.header("Cache-Control"))
+    if "no-cache" in directives:
+      return False
+
+    max_age = directives.get("max-age")
+    if max_age is not None and max_age.isdigit():
+      return time.time() - self.stored < int(max_age)
+
+    expires = self.header("Expires")
+    if expires:
+      try:
+        return time.time() < parsedate_to_datetime(expires).timestamp()
+      except (TypeError, ValueError):
+        return False
+
+    return False  # no explicit freshness, entry is always revalidated
+
+
+class CachedResult(object):
+  """
+  Cached response in the form accepted by CURLResponse
+  """
+  def __init__(self, entry: CacheEntry):
+    self.__entry = entry
+    self.__headers = HTTPMessage()
+    for name, value in entry.headers:
+      self.__headers[name] = value
+
+  def getcode(self) -> int:
+    return self.__entry.code
+
+  def info(self) -> HTTPMessage:
+    return self.__headers
+
+  def read(self) -> bytes:
+    return self.__entry.body
+
+
+def cache_control(value: Optional[str]) -> Dict[str, Optional[str]]:
+  """
+  Parse Cache-Control header: "max-age=60, no-cache" -> {"max-age": "60", "no-cache": None}
+  """
+  directives = {}
+  for item in (value or "").split(","):
+    name, _, arg = item.strip().partition("=")
+    if name:
+      directives[name.lower()] = arg.strip('"') if arg else None
+  return directives
+
+
+class HTTPCache(object):
+  """
+  On-disk cache of GET responses for curl. Bodies are stored compressed, alongside with the validators, so stale
+  entries are revalidated by the conditional request and 304 response is answered from the cache. Least recently
+  used entries are removed once the total size of the cache exceeds the limit.
+
+  Usage:
+    cache = HTTPCache("/var/cache/app/http", max_size=32 * 1024 * 1024)
+    r = curl("https://stat.ripe.net/data/bgp-state/data.json?resource=AS1", cache=cache)
+  """
+  def __init__(self, path: str, max_size: int = 64 * 1024 * 1024):
+    """
+    :param path: directory to keep cached responses in
+    :param max_size: maximal total size of the cache files in bytes
+    """
+    self.__path = path
+    self.__max_size = max_size
+    self.__lock = threading.Lock()
+    self.__index: Optional[Dict[str, Tuple[int, float]]] = None  # key -> file size and last access time
+
+  @property
+  def path(self) -> str:
+    return self.__path
+
+  def __file(self, key: str) -> str:
+    return os.path.join(self.__path, key + CACHE_FILE_SUFFIX)
+
+  def __load_index(self) -> Dict[str, Tuple[int, float]]:
+    if self.__index is None:
+      self.__index = {}
+      try:
+        names = os.listdir(self.__path)
+      except FileNotFoundError:
+        names = []
+
+      for name in names:
+        if not name.endswith(CACHE_FILE_SUFFIX):
+          continue
+        try:
+          st = os.stat(os.path.join(self.__path, name))
+        except FileNotFoundError:
+          continue
+        self.__index[name[:-len(CACHE_FILE_SUFFIX)]] = (st.st_size, st.st_mtime)
+    return self.__index
+
+  @classmethod
+  def key(cls, req: Request) -> str:
+    """
+    Responses are distinguished by the url and accepted encoding, as the body is kept as it was received
+    """
+    accept_encoding = req.get_header("Accept-encoding", "")
+    return hashlib.sha256(f"{req.full_url}\n{accept_encoding}".encode()).hexdigest()
+
+  @classmethod
+  def is_cacheable_request(cls, req: Request) -> bool:
+    """
+    Only plain GET requests are cached, requests with own validators or "no-store" are passed as is
+    """
+    return req.get_method() == "GET" and req.data is None \
+      and not req.has_header("If-none-match") and not req.has_header("If-modified-since") \
+      and "no-store" not in cache_control(req.get_header("Cache-control"))
+
+  def get(self, req: Request) -> Optional[CacheEntry]:
+    key = self.key(req)
+    try:
+      with open(self.__file(key), "rb") as f:
+        meta = json.loads(f.readline())
+        body = f.read()
+    except (OSError, ValueError):
+      return None
+
+    if meta.get("url") != req.full_url:
+      return None
+
+    if meta.get("compressed"):
+      body = gzip.decompress(body)
+
+    now = time.time()
+    with self.__lock:
+      index = self.__load_index()
+      if key in index:
+        index[key] = (index[key][0], now)
+    try:
+      os.utime(self.__file(key), (now, now))
+    except OSError:
+      pass
+
+    return CacheEntry(key, meta["url"], meta["code"], [tuple(item) for item in meta["headers"]], meta["stored"], body)
+
+  def add_validators(self, req: Request, entry: CacheEntry):
+    if entry.etag:
+      req.add_unredirected_header("If-None-Match", entry.etag)
+    if entry.last_modified:
+      req.add_unredirected_header("If-Modified-Since", entry.last_modified)
+
+  def put(self, req: Request, code: int, headers: List[Tuple[str, str]], body: bytes) -> Optional[CacheEntry]:
+    """
+    Store the response, if it is allowed to
+
+    :return stored entry or None
+    """
+    if code not in CACHEABLE_CODES or "no-store" in cache_control(", ".join(v for k, v in headers
+                                                                             if k.lower() == "cache-control")):
+      return None
+
+    entry = CacheEntry(self.key(req), req.full_url, code, headers, time.time(), body)
+    if not entry.etag and not entry.last_modified and not entry.is_fresh:
+      return None  # could be neither served nor revalidated
+
+    self.__write(entry)
+    return entry
+
+  def revalidated(self, entry: CacheEntry, headers: List[Tuple[str, str]]) -> CacheEntry:
+    """
+    Update the entry by the headers of 304 response
+    """
+    updated = {name.lower() for name, _ in headers if name.lower() in REVALIDATION_HEADERS}
+    entry.headers = [(name, value) for name, value in entry.headers if name.lower() not in updated] + \
+                    [(name, value) for name, value in headers if name.lower() in updated]
+    entry.stored = time.time()
+    self.__write(entry)
+    return entry
+
+  def __write(self, entry: CacheEntry):
+    compressed = not any(name.lower() == "content-encoding" for name, _ in entry.headers)
+    meta = {
+      "url": entry.url,
+      "code": entry.code,
+      "headers": entry.headers,
+      "stored": entry.stored,
+      "compressed": compressed
+    }
+    data = json.dumps(meta).encode() + b"\n" + (gzip.compress(entry.body, mtime=0) if compressed else entry.body)
+
+    os.makedirs(self.__path, exist_ok=True)
+    file_name = self.__file(entry.key)
+    tmp_name = f"{file_name}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_name, "wb") as f:
+      f.write(data)
+    os.replace(tmp_name, file_name)
+
+    with self.__lock:
+      index = self.__load_index()
+      index[entry.key] = (len(data), time.time())
+      self.__evict(index)
+
+  def __evict(self, index: Dict[str, Tuple[int, float]]):
+    total = sum(size for size, _ in index.values())
+    if total <= self.__max_size:
+      return
+
+    for key, (size, _) in sorted(index.items(), key=lambda item: item[1][1]):
+      try:
+        os.remove(self.__file(key))
+      except FileNotFoundError:
+        pass
+      del index[key]
+      total -= size
+      if total <= self.__max_size:
+        break
+
+  def clear(self):
+    with self.__lock:
+      for key in list(self.__load_index()):
+        try:
+          os.remove(self.__file(key))
+        except FileNotFoundError:
+          pass
+      self.__index = {}
+
+
+def response_headers(headers: Message) -> List[Tuple[str, str]]:
+  return [(name, value) for name, value in headers.items()]
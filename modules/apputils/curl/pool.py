@@ -0,0 +1,177 @@
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Github: https://github.com/hapylestat/apputils
+#
+#
+
+import threading
+import time
+from http.client import BadStatusLine, HTTPConnection, HTTPResponse, HTTPSConnection, RemoteDisconnected
+from typing import Callable, Dict, List, Tuple
+from urllib.request import HTTPHandler, HTTPRedirectHandler, HTTPSHandler, Request
+
+try:
+  from urllib.request import URLError
+except ImportError:
+  from urllib.error import URLError
+
+
+class ConnectionPool(object):
+  """
+  Idle persistent HTTP connections grouped by scheme and host
+  """
+  def __init__(self, size: int = 4, idle_timeout: float = 30.0):
+    """
+    :param size: maximal number of idle connections kept per host
+    :param idle_timeout: seconds after which idle connection is closed instead of being reused
+    """
+    self.size = size
+    self.idle_timeout = idle_timeout
+    self.__lock = threading.Lock()
+    self.__idle: Dict[tuple, List[Tuple[float, HTTPConnection]]] = {}
+
+  def acquire(self, key: tuple, factory: Callable[[], HTTPConnection]) -> Tuple[HTTPConnection, bool]:
+    """
+    :return connection and whether it was reused from the pool
+    """
+    now = time.monotonic()
+    stale = []
+    conn = None
+    with self.__lock:
+      idle = self.__idle.get(key, [])
+      while idle:
+        last_used, candidate = idle.pop()
+        if now - last_used < self.idle_timeout and candidate.sock is not None:
+          conn = candidate
+          break
+        stale.append(candidate)
+
+    for candidate in stale:
+      candidate.close()
+
+    if conn is not None:
+      return conn, True
+    return factory(), False
+
+  def release(self, key: tuple, conn: HTTPConnection):
+    with self.__lock:
+      idle = self.__idle.setdefault(key, [])
+      if len(idle) < self.size and conn.sock is not None:
+        idle.append((time.monotonic(), conn))
+        return
+
+    conn.close()
+
+  def release_response(self, response: HTTPResponse):
+    """
+    Return connection of the completely read response to the pool, or close it if it could not be reused
+    """
+    conn = getattr(response, "pool_connection", None)
+    if conn is None:
+      return
+
+    response.pool_connection = None
+    if response.will_close or not response.isclosed():
+      conn.close()
+    else:
+      self.release(response.pool_key, conn)
+
+  def close(self):
+    with self.__lock:
+      idle, self.__idle = self.__idle, {}
+
+    for connections in idle.values():
+      for _, conn in connections:
+        conn.close()
+
+
+class _PooledOpenMixin(object):
+  _pool: ConnectionPool = None
+
+  def _pooled_open(self, http_class, req: Request, **http_conn_args) -> HTTPResponse:
+    if req._tunnel_host:  # connections through the proxy are not pooled
+      return self.do_open(http_class, req, **http_conn_args)
+
+    host = req.host
+    if not host:
+      raise URLError("no host given")
+
+    headers = dict(req.unredirected_hdrs)
+    headers.update({k: v for k, v in req.headers.items() if k not in headers})
+    headers["Connection"] = "keep-alive"
+    headers = {name.title(): val for name, val in headers.items()}
+
+    key = (http_class.__name__, host, req.timeout)
+    for attempt in range(2):
+      conn, reused = self._pool.acquire(key, lambda: http_class(host, timeout=req.timeout, **http_conn_args))
+      try:
+        conn.request(req.get_method(), req.selector, req.data, headers,
+                     encode_chunked=req.has_header("Transfer-encoding"))
+        r = conn.getresponse()
+      except (BadStatusLine, RemoteDisconnected, ConnectionResetError, BrokenPipeError) as err:
+        conn.close()
+        if reused and attempt == 0:  # keep-alive connection was closed by the server meanwhile, retry on a new one
+          continue
+        raise URLError(err)
+      except OSError as err:  # timeout error
+        conn.close()
+        raise URLError(err)
+      except BaseException:
+        conn.close()
+        raise
+
+      r.pool_connection = conn
+      r.pool_key = key
+      r.url = req.get_full_url()
+      r.msg = r.reason
+      return r
+
+
+class PooledHTTPHandler(_PooledOpenMixin, HTTPHandler):
+  def __init__(self, pool: ConnectionPool, debuglevel: int = 0):
+    super(PooledHTTPHandler, self).__init__(debuglevel)
+    self._pool = pool
+
+  def http_open(self, req: Request) -> HTTPResponse:
+    return self._pooled_open(HTTPConnection, req)
+
+
+class PooledHTTPSHandler(_PooledOpenMixin, HTTPSHandler):
+  def __init__(self, pool: ConnectionPool, debuglevel: int = 0, context=None):
+    super(PooledHTTPSHandler, self).__init__(debuglevel, context)
+    self._pool = pool
+    self.__context = context
+
+  def https_open(self, req: Request) -> HTTPResponse:
+    return self._pooled_open(HTTPSConnection, req, context=self.__context)
+
+
+class PooledRedirectHandler(HTTPRedirectHandler):
+  """
+  Returns connection of the redirect response to the pool before following the redirect, so the redirected request
+  could reuse it
+  """
+  def __init__(self, pool: ConnectionPool):
+    super(PooledRedirectHandler, self).__init__()
+    self._pool = pool
+
+  def http_error_302(self, req: Request, fp: HTTPResponse, code: int, msg: str, headers):
+    if "location" in headers or "uri" in headers:
+      fp.read()
+      self._pool.release_response(fp)
+    return super(PooledRedirectHandler, self).http_error_302(req, fp, code, msg, headers)
+
+  http_error_301 = http_error_303 = http_error_307 = http_error_308 = http_error_302
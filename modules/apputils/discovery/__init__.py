@@ -19,6 +19,7 @@
 
 import os
 import sys
+import time
 from typing import List, Iterable, Tuple
 
 from .arguments import CommandLineOptions
@@ -31,7 +32,12 @@ class CommandsDiscovery(object):
                discovery_location_path: str,
                module_class_path: str,
                file_pattern: str = "",
-               module_main_fname: str = "__init__"):
+               module_main_fname: str = "__init__",
+               use_manifest: bool = False):
+    """
+    :arg use_manifest read commands meta information from the manifest file, so only executed command is imported.
+                      The manifest is re-generated once any command file changes
+    """
 
     self._discovery_location_path = discovery_location_path
     self._module_main_fname = module_main_fname
@@ -45,14 +51,26 @@ class CommandsDiscovery(object):
 
     self._module_class_path = module_class_path
     self._modules = CommandModules(entry_point=module_main_fname)
+    self._use_manifest = use_manifest
+    self._collect_time: float = 0.0
+    self._profiler: str or None = None
+    self._profiler_out: str = ""
+    self._import_time: bool = False
+    self._default_command: str = ""
 
   @property
   def search_dir(self) -> str:
     return self._search_dir
 
+  @property
+  def manifest_path(self) -> str:
+    from .manifest import MANIFEST_FILE
+    return os.path.join(self._search_dir, MANIFEST_FILE)
+
   @classmethod
   def __collect_modules(cls, path: str, pattern: str = "") -> Iterable[Tuple[str, str, bool, str]]:
-    exclude_list = ("pyc", "__init__.py", "__pycache__")
+    from .manifest import MANIFEST_FILE
+    exclude_list = ("pyc", "__init__.py", "__pycache__", MANIFEST_FILE, ".tmp")
     for name in os.listdir(path):
       full_name = os.path.join(path, name)
       is_dir = os.path.isdir(full_name)
@@ -69,6 +87,11 @@ class CommandsDiscovery(object):
     """
     :rtype CommandsDiscovery
     """
+    started = time.perf_counter()
+    if self._use_manifest and self.__collect_from_manifest():
+      self._collect_time += time.perf_counter() - started
+      return self
+
     for command, name, is_dir, full_name in self.__collect_modules(self._search_dir, self._file_pattern):
       if command in self._modules:
         continue
@@ -83,8 +106,35 @@ class CommandsDiscovery(object):
             sub_commands.append(_command)
       self._modules.add(self._module_class_path, command, sub_commands)
 
+    if self._use_manifest:
+      try:
+        self.write_manifest()
+      except (OSError, TypeError, ValueError):  # read-only location or not serializable command options
+        pass
+
+    self._collect_time += time.perf_counter() - started
     return self
 
+  def __collect_from_manifest(self) -> bool:
+    from .manifest import load_manifest, source_files
+
+    nodes = load_manifest(self.manifest_path, self._module_class_path, source_files(self._search_dir))
+    if nodes is None:
+      return False
+
+    for node in nodes:
+      self._modules.add_from_manifest(node)
+    return True
+
+  def write_manifest(self, path: str = ""):
+    """
+    Store meta information of the collected commands, could be used at build time to pre-generate the manifest
+    """
+    from .manifest import source_files, write_manifest
+
+    commands = [command for command in self._modules if command.import_name != "__internal__"]
+    write_manifest(path or self.manifest_path, self._module_class_path, source_files(self._search_dir), commands)
+
   def __inject_help_command(self):
     from .help import generate_help
     meta = CommandMetaInfo("help", "this command")
@@ -93,10 +143,82 @@ class CommandsDiscovery(object):
       .add_default_argument("subcommand_command", str, "Command name of the subcommand", default="@")
 
     def _print_help(subcommand: str, subcommand_command: str):
+      subcommand, subcommand_command = [arg if arg != "@" else "" for arg in (subcommand, subcommand_command)]
       sys.stdout.write(generate_help(self._modules, self._options, subcommand, subcommand_command))
 
     self._modules.inject(CommandModule(meta, "discovery", "__internal__", _print_help))
 
+  def __inject_batch_command(self, kwargs: dict = None, default_command: str = ""):
+    meta = CommandMetaInfo("batch", "Run newline-delimited command lines in one process, output of the command is "
+                                    "redirected with '> PATH', '>> PATH' or '>&FD' at the end of the line")
+    meta.arg_builder \
+      .add_default_argument("file", str, "file with the command lines, '-' to read from stdin", default="-")
+
+    def _run_batch(file: str):
+      if file == "-":
+        failed = self.__run_batch(sys.stdin, kwargs, default_command)
+      else:
+        with open(file, "r") as f:
+          failed = self.__run_batch(f, kwargs, default_command)
+
+      if failed:
+        sys.stderr.write(f"[batch] {failed} command(s) failed\n")
+        sys.exit(1)
+
+    self._modules.inject(CommandModule(meta, "discovery", "__internal__", _run_batch))
+
+  def __execute_line(self, argv: List[str], kwargs: dict = None, default_command: str = ""):
+    def _prepare(_argv: List[str]) -> List[CommandModule]:
+      self._options = CommandLineOptions(*_argv)
+      self._profiler, self._profiler_out = None, ""
+      self.__pop_framework_options()
+      return self._get_command(injected_args=kwargs, fail_on_unknown=True)
+
+    try:
+      cmd_list = _prepare(argv)
+    except NoCommandException:
+      if not default_command or argv[0] == default_command:
+        raise
+      cmd_list = _prepare([default_command] + argv)
+
+    if any(command.meta_info.name == "batch" for command in cmd_list):
+      raise CommandArgumentException("batch command could not be nested")
+
+    self.__execute(cmd_list, kwargs)
+
+  def __run_batch(self, stream, kwargs: dict = None, default_command: str = "") -> int:
+    """
+    :return number of failed command lines
+    """
+    from .batch import open_output, parse_line, read_lines
+    from .profiling import ProfilerException
+
+    failed = 0
+    for line_no, line in read_lines(stream):
+      try:
+        batch_line = parse_line(line_no, line)
+        if batch_line is None:
+          continue
+
+        with open_output(batch_line) as output:
+          _stdout, sys.stdout = sys.stdout, output
+          try:
+            self.__execute_line(batch_line.argv, kwargs, default_command)
+          finally:
+            sys.stdout = _stdout
+      except SystemExit as e:
+        if e.code:
+          failed += 1
+          sys.stderr.write(f"[batch:{line_no}] command exited with code {e.code}\n")
+      except (NoCommandException, CommandArgumentException, ProfilerException, ValueError, OSError) as e:
+        failed += 1
+        sys.stderr.write(f"[batch:{line_no}] {str(e).strip()}\n")
+      except Exception as e:
+        failed += 1
+        sys.stderr.write(f"[batch:{line_no}] {e.__class__.__name__}: {e}\n")
+
+    return failed
+
   @property
   def command_name(self) -> str or None:
     return self._options.args[0] if self._options.args else None
@@ -174,14 +296,73 @@ class CommandsDiscovery(object):
 
     return cmd.name, args[1]
 
+  def __pop_framework_options(self):
+    """
+    Application-wide switches, handled by the discovery itself and not passed to the commands:
+      --profile[=cprofile|sample]  profile command execution
+      --profile-out=FILE           write pstats (cprofile) or collapsed stacks (sample) instead of summary to stderr
+      --import-time                report import cost of the commands and their dependencies to stderr
+    """
+    kwargs = self._options.kwargs
+    if "profile" in kwargs:
+      self._profiler = kwargs.pop("profile")
+    if "profile-out" in kwargs:
+      self._profiler_out = kwargs.pop("profile-out")
+      if self._profiler is None:
+        self._profiler = ""
+    if "import-time" in kwargs:
+      kwargs.pop("import-time")
+      self._import_time = True
+
+  def __report_import_time(self):
+    from .profiling import import_time_report
+
+    sys.stderr.write(f"Commands discovery (in-process): {self._collect_time * 1000:.1f} ms\n")
+    command_modules = [command.classpath for command in self._modules if command.import_name != "__internal__"]
+    sys.stderr.write(import_time_report(self._module_class_path, command_modules))
+
+  @classmethod
+  async def __execute_chain_async(cls, cmd_list: List[CommandModule], kwargs: dict = None):
+    for command in cmd_list:
+      if command.is_async:
+        await command.execute_async(injected_args=kwargs)
+      else:
+        command.execute(injected_args=kwargs)
+
+  def __execute_chain(self, cmd_list: List[CommandModule], kwargs: dict = None):
+    if any(command.is_async for command in cmd_list):  # coroutine entry points are run on the managed loop
+      from .eventloop import run
+      run(self.__execute_chain_async(cmd_list, kwargs))
+      return
+
+    for command in cmd_list:
+      command.execute(injected_args=kwargs)
+
+  def __execute(self, cmd_list: List[CommandModule], kwargs: dict = None):
+    if self._profiler is None:
+      self.__execute_chain(cmd_list, kwargs)
+      return
+
+    from .profiling import CommandProfiler
+    with CommandProfiler(self._profiler, self._profiler_out):
+      self.__execute_chain(cmd_list, kwargs)
+
   def start_application(self, kwargs: dict = None, default_command: str = ""):
     from .help import generate_help
+    from .profiling import ProfilerException
 
+    self.__pop_framework_options()
     self.__inject_help_command()
+    self.__inject_batch_command(kwargs, default_command or self._default_command)
+    if default_command:
+      self._default_command = default_command
     try:
+      if self._import_time:
+        self.__report_import_time()
+        self._import_time = False
+
       cmd_list = self._get_command(injected_args=kwargs, fail_on_unknown=True)
-      for command in cmd_list:
-        command.execute(injected_args=kwargs)
+      self.__execute(cmd_list, kwargs)
     except NotImplementedCommandException:
       sys.stdout.write(generate_help(self._modules, self._options, *self.__get_modules_from_args()))
     except NoCommandException as e:
@@ -194,5 +375,5 @@ class CommandsDiscovery(object):
         sys.stdout.write(generate_help(self._modules, self._options))
       else:
         sys.stdout.write("No command provided, use 'help' to check the list of available commands")
-    except CommandArgumentException as e:
+    except (CommandArgumentException, ProfilerException) as e:
       sys.stdout.write(f"Application arguments exception: {str(e)}\n")
@@ -0,0 +1,97 @@
+#  Licensed to the Apache Software Foundation (ASF) under one or more
+#  contributor license agreements.  See the NOTICE file distributed with
+#  this work for additional information regarding copyright ownership.
+#  The ASF licenses this file to You under the Apache License, Version 2.0
+#  (the "License"); you may not use this file except in compliance with
+#  the License.  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+#  Github: https://github.com/hapylestat/apputils
+#
+#
+
+import os
+import shlex
+import sys
+from contextlib import contextmanager
+from typing import Iterable, List, Optional, TextIO, Tuple
+
+
+class BatchLine(object):
+  def __init__(self, line_no: int, argv: List[str], output: Optional[str] = None, append: bool = False):
+    """
+    :arg line_no number of the line in the batch, starting from 1
+    :arg argv command line arguments
+    :arg output path or "&N" for file descriptor N, stdout of the batch if not set
+    :arg append append to the output file instead of truncating it
+    """
+    self.line_no = line_no
+    self.argv = argv
+    self.output = output
+    self.append = append
+
+
+def parse_line(line_no: int, line: str) -> Optional[BatchLine]:
+  """
+  Parse command line with optional shell-like output redirection at the end:
+    ipv4 --nets=vk > /tmp/vk.txt
+    ipv6 >>/tmp/all.txt
+    nets >&3
+
+  :return None for the empty and comment lines
+  """
+  tokens = shlex.split(line, comments=True)
+  if not tokens:
+    return None
+
+  output, append = None, False
+  for index, token in enumerate(tokens):
+    if not token.startswith(">"):
+      continue
+
+    append = token.startswith(">>")
+    target = token[2:] if append else token[1:]
+    rest = tokens[index + 1:]
+    if not target and len(rest) == 1:
+      target, rest = rest[0], []
+
+    if not target or rest:
+      raise ValueError("output redirection should be the last item of the line: > PATH, >> PATH or >&FD")
+
+    if target.startswith("&") and not target[1:].isdigit():
+      raise ValueError(f"invalid file descriptor '{target}'")
+
+    output, tokens = target, tokens[:index]
+    break
+
+  if not tokens:
+    raise ValueError("no command passed")
+
+  return BatchLine(line_no, tokens, output, append)
+
+
+def read_lines(stream: TextIO) -> Iterable[Tuple[int, str]]:
+  for line_no, line in enumerate(stream, 1):
+    yield line_no, line.rstrip("\n")
+
+
+@contextmanager
+def open_output(batch_line: BatchLine):
+  if batch_line.output is None:
+    yield sys.stdout
+  elif batch_line.output.startswith("&"):
+    f = os.fdopen(int(batch_line.output[1:]), "w", closefd=False)
+    try:
+      yield f
+    finally:
+      f.flush()
+  else:
+    with open(batch_line.output, "a" if batch_line.append else "w") as f:
+      yield f
@@ -17,6 +17,7 @@
 #
 #
 
+import inspect
 from collections import OrderedDict
 from typing import Dict, Callable, List, get_origin, Optional
 
@@ -293,15 +294,18 @@ class CommandMetaInfo(object):
 
 
 class CommandModule(object):
-  def __init__(self, meta_info: CommandMetaInfo, classpath: str, import_name: str, entry_point: Callable, parent=None):
+  def __init__(self, meta_info: CommandMetaInfo, classpath: str, import_name: str, entry_point: Callable or None,
+               parent=None, entry_point_loader: Callable[[], Callable] = None):
     """
     :type parent CommandModule
+    :arg entry_point_loader used to import the command on first use, if entry_point is not passed
     """
     self.__name = meta_info.name
     self.__classpath = classpath
     self.__import_name = import_name
     self.__meta_info = meta_info
-    self.__entry_point: Callable = entry_point
+    self.__entry_point: Callable or None = entry_point
+    self.__entry_point_loader = entry_point_loader
     self.__args = None
     self.__sub_commands: Dict[str, CommandModule] = {}
     self.__parent = parent
@@ -334,7 +338,7 @@ class CommandModule(object):
       if len(f_args) - len(set(f_args) & injected_args) != len(set(args.keys()) & set(f_args)):
         raise CommandArgumentException("Function \"{}\" from module {} doesn't implement all arguments in the"
                                        " signature or implements unknown definition".format(
-                                        self.__entry_point.__name__, self.__classpath
+                                        self.entry_point.__name__, self.__classpath
                                        ))
     else:
       args = {
@@ -393,9 +397,19 @@ class CommandModule(object):
   def meta_info(self) -> CommandMetaInfo:
     return self.__meta_info
 
+  @property
+  def entry_point(self) -> Callable:
+    if self.__entry_point is None:
+      self.__entry_point = self.__entry_point_loader()
+    return self.__entry_point
+
+  @property
+  def is_async(self) -> bool:
+    return inspect.iscoroutinefunction(self.entry_point)
+
   @property
   def entry_point_args(self) -> tuple:
-    return self.__entry_point.__code__.co_varnames[:self.__entry_point.__code__.co_argcount]
+    return self.entry_point.__code__.co_varnames[:self.entry_point.__code__.co_argcount]
 
   def filter_injected_arguments(self, injected_arguments: dict = None) -> dict or None:
     if not injected_arguments:
@@ -415,10 +429,10 @@ class CommandModule(object):
     return all_args
 
   def execute(self,  injected_args: dict = None):
-    self.__entry_point(**self.__get_args(self.__args, injected_args))
+    self.entry_point(**self.__get_args(self.__args, injected_args))
 
   async def execute_async(self, injected_args: dict = None):
-    await self.__entry_point(**self.__get_args(self.__args, injected_args))
+    await self.entry_point(**self.__get_args(self.__args, injected_args))
 
   def __str__(self):
     return f"Module: {self.__import_name}, Meta: {self.meta_info.name}, Sub Commands: {len(self.__sub_commands)}"
@@ -529,6 +543,31 @@ Conflicting command definitions detected:
 
     self.__modules[command_module.meta_info.name] = command_module
 
+  def __load_entry_point(self, classpath: str) -> Callable:
+    m = __import__(classpath, fromlist=classpath.rpartition(".")[0])
+    return m.__dict__[self.__entry_point]
+
+  def add_from_manifest(self, node: dict, parent: CommandModule = None) -> CommandModule:
+    """
+    Add command described by the manifest node, command module is imported only once it is executed
+    """
+    from .manifest import meta_from_dict
+
+    classpath = node["classpath"]
+    command_module = CommandModule(
+      classpath=classpath,
+      import_name=node["import_name"],
+      meta_info=meta_from_dict(node),
+      entry_point=None,
+      parent=parent,
+      entry_point_loader=lambda: self.__load_entry_point(classpath)
+    )
+    command_module.add_subcommand([self.add_from_manifest(sub, command_module) for sub in node["subcommands"]])
+
+    if parent is None:
+      self.__modules[command_module.meta_info.name] = command_module
+    return command_module
+
   def inject(self, module: CommandModule):
     if not module:
       return
@@ -0,0 +1,120 @@
+#  Licensed to the Apache Software Foundation (ASF) under one or more
+#  contributor license agreements.  See the NOTICE file distributed with
+#  this work for additional information regarding copyright ownership.
+#  The ASF licenses this file to You under the Apache License, Version 2.0
+#  (the "License"); you may not use this file except in compliance with
+#  the License.  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+#  Github: https://github.com/hapylestat/apputils
+#
+#
+
+import asyncio
+import signal
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+__executor: Optional[ThreadPoolExecutor] = None
+__shutdown_callbacks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, List[Callable[[], None]]]" = \
+  weakref.WeakKeyDictionary()
+
+
+def new_event_loop() -> asyncio.AbstractEventLoop:
+  """
+  uvloop event loop if it is installed, default asyncio loop otherwise
+  """
+  try:
+    import uvloop
+    return uvloop.new_event_loop()
+  except ImportError:
+    return asyncio.new_event_loop()
+
+
+def shared_executor(max_workers: int = 16) -> ThreadPoolExecutor:
+  """
+  Executor shared by the whole application for blocking calls, also set as the default executor of the managed loop
+  """
+  global __executor
+  if __executor is None:
+    __executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="apputils")
+  return __executor
+
+
+async def run_blocking(f: Callable[..., T], *args) -> T:
+  """
+  Run blocking callable in the shared executor
+  """
+  return await asyncio.get_running_loop().run_in_executor(shared_executor(), f, *args)
+
+
+def at_shutdown(callback: Callable[[], None]):
+  """
+  Call the callback before the running loop is closed by "run", e.g. to close the connections kept by the loop
+  """
+  __shutdown_callbacks.setdefault(asyncio.get_running_loop(), []).append(callback)
+
+
+def __cancel_pending(loop: asyncio.AbstractEventLoop):
+  pending = [task for task in asyncio.all_tasks(loop) if not task.done()]
+  for task in pending:
+    task.cancel()
+
+  if pending:
+    loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+
+
+def run(main: Awaitable[T]) -> T:
+  """
+  Run coroutine on the managed event loop: SIGINT/SIGTERM cancel the main task (KeyboardInterrupt is raised
+  the same way as for synchronous commands), left-over tasks are cancelled and async generators and
+  the executor are shut down before the loop is closed
+  """
+  loop = new_event_loop()
+  asyncio.set_event_loop(loop)
+  loop.set_default_executor(shared_executor())
+  task = loop.create_task(main)
+  interrupted = []
+
+  def _on_signal(signum: int):
+    interrupted.append(signum)
+    task.cancel()
+
+  handled_signals = []
+  for signum in (signal.SIGINT, signal.SIGTERM):
+    try:
+      loop.add_signal_handler(signum, _on_signal, signum)
+      handled_signals.append(signum)
+    except (NotImplementedError, RuntimeError, ValueError):  # not supported by the platform or not main thread
+      pass
+
+  try:
+    return loop.run_until_complete(task)
+  except asyncio.CancelledError:
+    if interrupted:
+      raise KeyboardInterrupt()
+    raise
+  finally:
+    for signum in handled_signals:
+      loop.remove_signal_handler(signum)
+    try:
+      __cancel_pending(loop)
+      for callback in __shutdown_callbacks.pop(loop, []):
+        callback()
+      loop.run_until_complete(loop.shutdown_asyncgens())
+      loop.run_until_complete(loop.shutdown_default_executor())
+    finally:
+      global __executor
+      __executor = None
+      asyncio.set_event_loop(None)
+      loop.close()
@@ -106,4 +106,12 @@ def generate_help(modules: CommandModules, options: CommandLineOptions, subcomma
       for subsub in sub.subcommands:
         help_str += generate_command_help(" " * len(filename) + " " * len(sub.name), subsub, show_subcommands=False)
 
+  if not subcommand:
+    help_str += f"""
+Application options (accepted by every command):
+{START_SPACING}--profile[=cprofile|sample] - profile command execution, summary is printed to stderr
+{START_SPACING}--profile-out=FILE          - write pstats (cprofile) or collapsed stacks (sample) to the file
+{START_SPACING}--import-time               - report import cost of the commands and their dependencies
+"""
+
   return help_str
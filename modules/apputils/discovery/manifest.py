@@ -0,0 +1,115 @@
+#  Licensed to the Apache Software Foundation (ASF) under one or more
+#  contributor license agreements.  See the NOTICE file distributed with
+#  this work for additional information regarding copyright ownership.
+#  The ASF licenses this file to You under the Apache License, Version 2.0
+#  (the "License"); you may not use this file except in compliance with
+#  the License.  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+#  Github: https://github.com/hapylestat/apputils
+#
+#
+
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional
+
+from .commands import CommandArgumentItem, CommandMetaInfo, CommandModule
+
+MANIFEST_VERSION = 2
+MANIFEST_FILE = "commands-manifest.json"
+
+__TYPES = {t.__name__: t for t in (str, int, float, list, bool)}
+
+
+def source_files(search_dir: str) -> Dict[str, str]:
+  """
+  Content hash of every python file in the commands directory, used as the manifest key.
+  Modification time is not used, as it is rewritten by the package installers
+  """
+  files = {}
+  for root, dirs, names in os.walk(search_dir):
+    dirs[:] = [name for name in dirs if name != "__pycache__"]
+    for name in names:
+      if not name.endswith(".py"):
+        continue
+      full_name = os.path.join(root, name)
+      with open(full_name, "rb") as f:
+        files[os.path.relpath(full_name, search_dir).replace(os.sep, "/")] = hashlib.sha256(f.read()).hexdigest()
+  return files
+
+
+def __argument_to_dict(item: CommandArgumentItem) -> dict:
+  return {
+    "name": item.name,
+    "type": item.value_type.__name__ if item.value_type else None,
+    "help": item.item_help,
+    "default": item.default,
+    "alias": item.alias
+  }
+
+
+def command_to_dict(command: CommandModule) -> dict:
+  meta = command.meta_info
+  return {
+    "name": meta.name,
+    "help": meta.help,
+    "classpath": command.classpath,
+    "import_name": command.import_name,
+    "default_sub_command": meta.default_sub_command,
+    "exec_with_child": meta.exec_with_child,
+    "options": meta.options,
+    "default_arguments": [__argument_to_dict(item) for item in meta.default_arguments.values()],
+    "arguments": [__argument_to_dict(item) for item in meta.arg_builder.arguments_by_alias.values()],
+    "subcommands": [command_to_dict(sub) for sub in command.subcommands]
+  }
+
+
+def meta_from_dict(node: dict) -> CommandMetaInfo:
+  meta = CommandMetaInfo(node["name"], node["help"], node["default_sub_command"], node["exec_with_child"],
+                         **node["options"])
+  for arg in node["default_arguments"]:
+    meta.arg_builder.add_default_argument(arg["name"], __TYPES[arg["type"]], arg["help"], arg["default"])
+  for arg in node["arguments"]:
+    meta.arg_builder.add_argument(arg["name"], __TYPES[arg["type"]] if arg["type"] else None, arg["help"],
+                                  arg["default"], arg["alias"])
+  return meta
+
+
+def load_manifest(path: str, module_class_path: str, files: Dict[str, str]) -> Optional[List[dict]]:
+  """
+  :return command nodes, or None if the manifest is missing or outdated
+  """
+  try:
+    with open(path, "r") as f:
+      manifest = json.load(f)
+  except (OSError, ValueError):
+    return None
+
+  if manifest.get("version") != MANIFEST_VERSION or manifest.get("module_class_path") != module_class_path \
+    or manifest.get("files") != files:
+    return None
+
+  return manifest["commands"]
+
+
+def write_manifest(path: str, module_class_path: str, files: Dict[str, str], commands: List[CommandModule]):
+  data = json.dumps({
+    "version": MANIFEST_VERSION,
+    "module_class_path": module_class_path,
+    "files": files,
+    "commands": [command_to_dict(command) for command in commands]
+  }, indent=1)
+
+  tmp_path = f"{path}.{os.getpid()}.tmp"
+  with open(tmp_path, "w") as f:
+    f.write(data)
+  os.replace(tmp_path, path)
@@ -0,0 +1,166 @@
+#  Licensed to the Apache Software Foundation (ASF) under one or more
+#  contributor license agreements.  See the NOTICE file distributed with
+#  this work for additional information regarding copyright ownership.
+#  The ASF licenses this file to You under the Apache License, Version 2.0
+#  (the "License"); you may not use this file except in compliance with
+#  the License.  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+#  Github: https://github.com/hapylestat/apputils
+#
+#
+
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, List, Tuple
+
+
+class ProfilerException(Exception):
+  pass
+
+
+class CommandProfiler(object):
+  """
+  Profiles command execution either with cProfile (deterministic, pstats output) or with sampling profiler
+  (low overhead, collapsed stacks output compatible with flamegraph.pl and speedscope)
+  """
+  MODES = ("cprofile", "sample")
+
+  def __init__(self, mode: str = "", output: str = "", interval: float = 0.005):
+    """
+    :arg mode "cprofile" or "sample", "cprofile" if empty
+    :arg output file to write pstats or collapsed stacks to, summary is printed to stderr if empty
+    :arg interval seconds between samples of sampling profiler
+    """
+    mode = mode or "cprofile"
+    if mode not in self.MODES:
+      raise ProfilerException(f"Unknown profiler '{mode}', supported: {', '.join(self.MODES)}")
+
+    self.__mode = mode
+    self.__output = output
+    self.__interval = interval
+    self.__profile = None
+    self.__stacks: Dict[str, int] = {}
+    self.__thread: threading.Thread or None = None
+    self.__stop = threading.Event()
+
+  @classmethod
+  def __frame_label(cls, frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+  def __sample(self, thread_id: int):
+    while not self.__stop.wait(self.__interval):
+      frame = sys._current_frames().get(thread_id)
+      stack = []
+      while frame is not None:
+        stack.append(self.__frame_label(frame))
+        frame = frame.f_back
+
+      if stack:
+        key = ";".join(reversed(stack))
+        self.__stacks[key] = self.__stacks.get(key, 0) + 1
+
+  def start(self):
+    if self.__mode == "cprofile":
+      import cProfile
+      self.__profile = cProfile.Profile()
+      self.__profile.enable()
+    else:
+      self.__thread = threading.Thread(target=self.__sample, args=(threading.get_ident(),), daemon=True)
+      self.__thread.start()
+
+  def stop(self):
+    if self.__mode == "cprofile":
+      self.__profile.disable()
+    else:
+      self.__stop.set()
+      self.__thread.join()
+
+  def __enter__(self):
+    self.start()
+    return self
+
+  def __exit__(self, exc_type, exc_val, exc_tb):
+    self.stop()
+    self.report()
+    return False
+
+  def report(self, limit: int = 25):
+    if self.__mode == "cprofile":
+      import pstats
+      if self.__output:
+        self.__profile.dump_stats(self.__output)
+      else:
+        pstats.Stats(self.__profile, stream=sys.stderr).sort_stats("cumulative").print_stats(limit)
+      return
+
+    stacks = sorted(self.__stacks.items(), key=lambda item: item[1], reverse=True)
+    if self.__output:
+      with open(self.__output, "w") as f:
+        f.writelines(f"{stack} {count}\n" for stack, count in stacks)
+      return
+
+    total = sum(self.__stacks.values()) or 1
+    sys.stderr.write(f"Samples: {total}, interval: {self.__interval * 1000:.1f} ms\n")
+    for stack, count in stacks[:limit]:
+      sys.stderr.write(f"{count / total:>7.1%}  {stack.rpartition(';')[2]}  <- {stack}\n")
+
+
+__IMPORT_TIME_RE = re.compile(r"^import time:\s+(?P<self>\d+)\s+\|\s+(?P<cumulative>\d+)\s+\|(?P<indent>\s*)(?P<name>\S+)$")
+
+
+def import_times(module_name: str, *extra_modules: str) -> List[Tuple[str, int, int]]:
+  """
+  Import the module, followed by the extra modules, in a fresh interpreter with "-X importtime"
+
+  :return module name, self and cumulative import time in microseconds, in import order
+  """
+  imports = "; ".join(f"import {name}" for name in (module_name,) + extra_modules)
+  code = f"import sys; sys.path[:0] = {[path for path in sys.path if path]!r}; {imports}"
+  process = subprocess.run([sys.executable, "-X", "importtime", "-c", code], stdout=subprocess.DEVNULL,
+                           stderr=subprocess.PIPE, universal_newlines=True)
+
+  result = []
+  for line in process.stderr.splitlines():
+    m = __IMPORT_TIME_RE.match(line)
+    if m:
+      result.append((m.group("name"), int(m.group("self")), int(m.group("cumulative"))))
+  return result
+
+
+def import_time_report(module_name: str, command_modules: List[str], limit: int = 10) -> str:
+  """
+  :arg module_name package holding the commands, imported by the application on startup
+  :arg command_modules full import names of the commands, imported explicitly as lazy discovery does not import them
+  :arg limit number of the slowest third-party top-level packages to show
+  """
+  times = import_times(module_name, *command_modules)
+  by_name = {name: cumulative for name, _, cumulative in times}
+  total = sum(by_name.get(name, 0) for name in {module_name, *command_modules})
+  lines = [f"Import time of '{module_name}' in a fresh interpreter (cumulative, a dependency is accounted to its first importer):"]
+  lines.append(f"  {module_name:<40} {by_name.get(module_name, 0) / 1000:>9.1f} ms")
+  lines.append(f"  {'total':<40} {total / 1000:>9.1f} ms")
+  lines.append("Commands:")
+  for name in sorted(command_modules, key=lambda _name: by_name.get(_name, 0), reverse=True):
+    lines.append(f"  {name:<40} {by_name.get(name, 0) / 1000:>9.1f} ms")
+
+  top_level = module_name.partition(".")[0]
+  dependencies = [(name, cumulative) for name, _, cumulative in times
+                  if "." not in name and name != top_level and name not in sys.builtin_module_names]
+  lines.append("Slowest top-level packages:")
+  for name, cumulative in sorted(dependencies, key=lambda item: item[1], reverse=True)[:limit]:
+    lines.append(f"  {name:<40} {cumulative / 1000:>9.1f} ms")
+
+  return "\n".join(lines) + "\n"
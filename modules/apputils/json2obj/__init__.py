@@ -17,8 +17,151 @@
 #
 #
 import json
-from types import FunctionType
-from typing import get_type_hints, get_args, ClassVar, Dict
+from types import FunctionType, MemberDescriptorType
+from typing import get_type_hints, get_args, get_origin, Any, Callable, ClassVar, Dict, IO, Iterator, List, Set, Tuple
+
+from .stream import CHUNK_SIZE, JSONStreamReader, iter_items
+
+_MISSING = object()
+_EXCLUDE_TYPES = (FunctionType, property, classmethod, staticmethod, MemberDescriptorType)
+_TRANSFORMS: Dict[Any, Callable[[Any, List[str], str], Any]] = {}
+
+
+def _compile_transform(schema) -> Callable[[Any, List[str], str], Any]:
+  """
+  Build the converter of field values by the field schema. Converter accepts the value, list to append validation
+  errors to and name of the deserialized class. Converters are cached per schema.
+  """
+  try:
+    return _TRANSFORMS[schema]
+  except KeyError:
+    pass
+
+  is_generic = '__origin__' in schema.__dict__
+  _type = schema.__dict__['__origin__'] if is_generic else schema
+  schema_args = list(get_args(schema)) if is_generic else [] if _type is list else [schema]
+  property_type = schema_args[0] if schema_args else None
+  empty_is_zero = property_type in (int, float, complex)
+
+  if _type is list:
+    def build(value, errors, owner):
+      return [property_type(i) for i in value] if property_type else value
+  elif _type is dict and len(schema_args) == 2:
+    item_transform = _compile_transform(schema_args[1])
+
+    def build(value, errors, owner):
+      return {k: item_transform(v, errors, owner) for k, v in value.items()}
+  elif _type is dict:
+    def build(value, errors, owner):
+      return {k: _compile_transform(type(v))(v, errors, owner) for k, v in value.items()}
+  else:
+    def build(value, errors, owner):
+      return _type(value) if _type and value is not None else value
+
+  def transform(value, errors: List[str], owner: str):
+    if empty_is_zero and isinstance(value, str) and value == "":
+      value = 0  # this is really weird fix for bad written API
+
+    if property_type and value is not None and not isinstance(value, _type) \
+      and not (issubclass(property_type, SerializableObject) and isinstance(value, dict)):
+
+      errors.append(
+        "Conflicting type in schema and data for object '{}', expecting '{}' but got '{}' (value: {})".format(
+          owner,
+          property_type.__name__,
+          type(value).__name__,
+          value
+        ))
+      return None
+
+    return build(value, errors, owner)
+
+  _TRANSFORMS[schema] = transform
+  return transform
+
+
+class _DeserializationPlan(object):
+  """
+  Class schema resolved once per SerializableObject subclass: annotations, aliases and defaults of the fields
+  """
+  def __init__(self, clazz: ClassVar):
+    properties = {k: v for k, v in clazz.__dict__.items() if not k.startswith("__") and not isinstance(v, _EXCLUDE_TYPES)}
+    annotations = get_type_hints(clazz)
+    aliases = clazz.__aliases__
+    if clazz.__compact__ is not None:
+      properties.update(clazz.__compact__)
+
+    # field name, json key, default value and schema
+    self.fields: List[Tuple[str, str, Any, Any]] = [
+      (name, aliases.get(name, name), properties.get(name, _MISSING), schema)
+      for name, schema in annotations.items() if not name.startswith("__")
+    ]
+    self.annotations: Set[str] = set(annotations.keys())
+    self.aliases: Set[str] = set(aliases.values())
+    self.missing_annotations: Set[str] = set(properties.keys()) - self.annotations
+    # list fields, which conversion could be deferred for the lazy de-serialization
+    self.lists: Set[str] = {name for name, schema in annotations.items()
+                            if schema is list or get_origin(schema) is list}
+
+  @classmethod
+  def of(cls, clazz: ClassVar):
+    plan = clazz.__dict__.get("__plan__")
+    if plan is None:
+      plan = cls(clazz)
+      setattr(clazz, "__plan__", plan)
+    return plan
+
+
+def compact(clazz):
+  """
+  Class decorator, which turns SerializableObject subclass into the compact one: annotated fields are kept in
+  __slots__ instead of the instance __dict__, so instances take less memory.
+
+  @compact
+  class PrefixView(SerializableObject):
+    prefix: str = None
+    source: str = None
+
+  Fields which are not annotated could not be set on the instance of the compact class, as well as fields
+  produced by __mapping__ (unless they are annotated too). __error__ of the compact object is an empty tuple
+  until de-serialization produces errors.
+  """
+  namespace = dict(clazz.__dict__)
+  namespace.pop("__dict__", None)
+  namespace.pop("__weakref__", None)
+  namespace.pop("__plan__", None)
+
+  fields = [name for name in namespace.get("__annotations__", {}) if not name.startswith("__")]
+  defaults = dict(clazz.__compact__ or {})
+  for name in fields:  # in the declaration order, which is kept by serialize
+    defaults[name] = namespace.pop(name, defaults.get(name))
+
+  inherited_slots = {slot for base in clazz.__mro__[1:] for slot in base.__dict__.get("__slots__", ())}
+  namespace["__slots__"] = tuple(name for name in fields + ["__error__", "__lazy__"] if name not in inherited_slots)
+  namespace["__compact__"] = defaults
+  namespace["__getattr__"] = _deferred_getattr
+  return type(clazz)(clazz.__name__, clazz.__bases__, namespace)
+
+
+def _deferred_getattr(self, name: str):
+  """
+  __getattr__ of the compact classes, converts the deferred fields of the lazy object on their first access
+  """
+  try:
+    deferred = object.__getattribute__(self, "__lazy__")
+  except AttributeError:
+    deferred = None
+
+  if not deferred or name not in deferred:
+    raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+  value, schema = deferred.pop(name)
+  errors = []
+  value = (_TRANSFORMS.get(schema) or _compile_transform(schema))(value, errors, type(self).__name__)
+  if errors:
+    self.__error__ = errors
+  setattr(self, name, value)
+  return value
 
 
 class SerializableObject(object):
@@ -98,13 +241,31 @@ class SerializableObject(object):
   """
   __aliases__: Dict = {}
 
+  """
+  Field defaults of the compact class, see the compact decorator
+  """
+  __compact__: Dict = None
+
+  """
+  Errors of the last de-serialization, compact objects allocate the list only if there were any
+  """
+  __error__ = ()
+
+  __slots__ = ()
+
   def __init__(self, serialized_obj: str or dict or object or None = None, **kwargs):
-    self.__error__ = []
+    compact_fields = self.__compact__
+    self.__error__ = [] if compact_fields is None else ()
 
     if isinstance(serialized_obj, type(self)):
       import copy
-      self.__dict__ = copy.deepcopy(serialized_obj.__dict__)
-      self.__annotations__ = copy.deepcopy(serialized_obj.__annotations__)
+      if compact_fields is None:
+        self.__dict__ = copy.deepcopy(serialized_obj.__dict__)
+        self.__annotations__ = copy.deepcopy(serialized_obj.__annotations__)
+      else:
+        for name, default in compact_fields.items():
+          setattr(self, name, copy.deepcopy(getattr(serialized_obj, name, default)))
+        self.__error__ = copy.deepcopy(serialized_obj.__error__)
       return
 
     if isinstance(serialized_obj, str):
@@ -120,82 +281,77 @@ class SerializableObject(object):
         serialized_obj = kwargs
 
     if serialized_obj is None:
+      if compact_fields is not None:  # there are no class level defaults to fall back to
+        for name, default in compact_fields.items():
+          setattr(self, name, default)
       return
 
     self.__deserialize(serialized_obj)
 
-  def __handle_errors(self, clazz: ClassVar, d: dict, missing_definitions, missing_annotations):
+  def __handle_errors(self, clazz: ClassVar, d: dict, missing_definitions, missing_annotations, errors: List[str]):
     for miss_def in missing_definitions:
       v = d[miss_def]
-      self.__error__.append(f"{clazz.__name__} class doesn't contain property '{miss_def}: {type(v).__name__}' (value sample:{v})")
+      errors.append(f"{clazz.__name__} class doesn't contain property '{miss_def}: {type(v).__name__}' (value sample:{v})")
 
     for miss_ann in missing_annotations:
-      self.__error__.append(f"{clazz.__name__} class doesn't contain type annotation in the definition '{miss_ann}'")
+      errors.append(f"{clazz.__name__} class doesn't contain type annotation in the definition '{miss_ann}'")
 
-    if not self.__error__:
+    if not errors:
       return
 
+    self.__error__ = errors
     end_line = "\n- "
     raise ValueError(f"""
 A number of errors happen:
 --------------------------
-- {end_line.join(self.__error__)}
+- {end_line.join(errors)}
 """)
 
-  def __deserialize_transform(self, property_value, schema):
-    is_generic = '__origin__' in schema.__dict__
-    _type = schema.__dict__['__origin__'] if is_generic else schema
-    schema_args = list(get_args(schema)) if is_generic else [] if _type is list else [schema]
-    schema_len = len(schema_args)
-    property_type = schema_args[0] if schema_args else None
-
-    if property_type in (int, float, complex) and isinstance(property_value, str) and property_value == "":
-      property_value = 0  # this is really weird fix for bad written API
-
-    if property_type and property_value is not None and not isinstance(property_value, _type) \
-      and not (issubclass(property_type, SerializableObject) and isinstance(property_value, dict)):
-
-      self.__error__.append(
-        "Conflicting type in schema and data for object '{}', expecting '{}' but got '{}' (value: {})".format(
-          self.__class__.__name__,
-          property_type.__name__,
-          type(property_value).__name__,
-          property_value
-        ))
-      return None
-
-    if _type is list:
-      return [property_type(i) for i in property_value] if property_type else property_value
-    elif _type is dict:
-      return {k: self.__deserialize_transform(v, schema_args[1] if schema_len == 2 else type(v)) for k, v in property_value.items()}
-    else:
-      return _type(property_value) if _type and property_value is not None else property_value
-
-  def __deserialize(self, d: dict):
-    self.__error__ = []
+  @classmethod
+  def lazy(cls, serialized_obj: dict):
+    """
+    De-serialize the object, deferring conversion of the list fields till their first access.
+    Only compact classes could defer the conversion, others are de-serialized as usual.
+    """
+    if cls.__compact__ is None:
+      return cls(serialized_obj=serialized_obj)
+
+    obj = cls.__new__(cls)
+    obj.__error__ = ()
+    obj.__deserialize(serialized_obj, lazy=True)
+    return obj
+
+  @classmethod
+  def stream(cls, fp: IO, path: str = "items", lazy: bool = False, chunk_size: int = CHUNK_SIZE) -> Iterator:
+    """
+    Shortcut for stream_items(fp, path, cls, lazy, chunk_size)
+    """
+    return stream_items(fp, path, cls, lazy, chunk_size)
+
+  def __deserialize(self, d: dict, lazy: bool = False):
     clazz = self.__class__
-    exclude_types = (FunctionType, property, classmethod, staticmethod)
-    properties = {k: v for k, v in clazz.__dict__.items() if not k.startswith("__") and not isinstance(v, exclude_types)}
-    annotations = get_type_hints(clazz)
-
-    for property_name, schema in annotations.items():
-      if property_name.startswith("__"):
-        continue
-
-      try:
-        # the way to map properties like "a-b" to python fields
-        resolved_prop = self.__aliases__[property_name]
-      except KeyError:
-        resolved_prop = property_name
+    plan = _DeserializationPlan.of(clazz)
+    errors, owner = [], clazz.__name__
+    deferred = None
 
+    for property_name, resolved_prop, default, schema in plan.fields:
       if resolved_prop not in d:  # Property didn't come with data, setting default value
-        self.__setattr__(property_name, properties[property_name])
+        if default is _MISSING:
+          raise KeyError(property_name)
+        setattr(self, property_name, default)
         continue
 
       property_value = d[resolved_prop]
-      self.__setattr__(property_name, self.__deserialize_transform(property_value, schema))
+      if lazy and property_name in plan.lists and isinstance(property_value, list):
+        if deferred is None:
+          deferred = self.__lazy__ = {}
+        deferred[property_name] = (property_value, schema)
+        continue
 
-    missing_definitions = set(d.keys()) - set(annotations.keys()) - set(self.__aliases__.values())
+      transform = _TRANSFORMS.get(schema) or _compile_transform(schema)
+      setattr(self, property_name, transform(property_value, errors, owner))
+
+    missing_definitions = set(d.keys()) - plan.annotations - plan.aliases
     if self.__mapping__:
       for definition, pattern in self.__mapping__.items():
         ret = {}
@@ -206,9 +362,11 @@ A number of errors happen:
           self.__setattr__(definition, ret)
           missing_definitions = set(missing_definitions) - set(ret.keys())
 
+    if errors:
+      self.__error__ = errors
+
     if self.__strict__:
-      missing_annotations = set(properties.keys()) - set(annotations.keys())
-      self.__handle_errors(clazz, d, missing_definitions, missing_annotations)
+      self.__handle_errors(clazz, d, missing_definitions, plan.missing_annotations, errors)
 
   def __serialize_transform(self, item):
     _type = type(item)
@@ -222,13 +380,18 @@ A number of errors happen:
 
   def serialize(self) -> dict:
     # first of all we need to move defaults from class
-    all_properties = dict(self.__class__.__dict__)
-    all_properties.update(dict(self.__dict__))
+    if self.__compact__ is None:
+      all_properties = dict(self.__class__.__dict__)
+      all_properties.update(dict(self.__dict__))
+    else:  # fields go in the declaration order, not in the order of the slot descriptors
+      all_properties = {name: getattr(self, name, default) for name, default in self.__compact__.items()}
+      all_properties.update({k: v for k, v in self.__class__.__dict__.items() if k not in all_properties})
     _filter_properties = list(self.__aliases__.keys()) + list(self.__mapping__.keys())
 
     properties: Dict = {k: v for k, v in all_properties.items()
                         if not k.startswith("__")                                     # filter hidden properties
                         and not isinstance(v, (FunctionType, property, classmethod))  # ignore functions
+                        and not isinstance(v, MemberDescriptorType)                   # slots of compact class
                         and k not in _filter_properties                               # exclude "special cases"
                         }
 
@@ -245,3 +408,32 @@ A number of errors happen:
   def to_json(self) -> str:
     # ToDo: inject class encode via object_hook/object_pairs_hook with provided schema
     return json.dumps(self.serialize())
+
+
+def stream_items(fp: IO, path: str = "items", model=None, lazy: bool = False,
+                 chunk_size: int = CHUNK_SIZE) -> Iterator:
+  """
+  De-serialize the large JSON array item by item, without loading the whole document:
+
+    with open("networks.json", "rb") as fp:
+      for item in stream_items(fp, path="items", model=NetworkItem):
+        ...
+
+  If the path points to the object, its properties are returned as (name, item) pairs.
+
+  :param fp: text or binary (UTF-8) file object
+  :param path: dot separated property names of the array, empty for the top level array
+  :param model: SerializableObject subclass to de-serialize items to, raw values are returned if not set
+  :param lazy: defer conversion of the items list fields till their first access, see SerializableObject.lazy
+  :param chunk_size: number of bytes or characters read at once
+  :raises ValueError: on malformed document or invalid item
+  """
+  for index, item in enumerate(iter_items(fp, path, chunk_size)):
+    name, value = item if isinstance(item, tuple) else (None, item)
+    if model is not None:
+      if not isinstance(value, dict):
+        position = index if name is None else repr(name)
+        raise ValueError(f"{path}[{position}]: object is expected to build {model.__name__}")
+      value = model.lazy(value) if lazy else model(serialized_obj=value)
+
+    yield value if name is None else (name, value)
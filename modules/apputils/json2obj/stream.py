@@ -0,0 +1,179 @@
+#  Licensed to the Apache Software Foundation (ASF) under one or more
+#  contributor license agreements.  See the NOTICE file distributed with
+#  this work for additional information regarding copyright ownership.
+#  The ASF licenses this file to You under the Apache License, Version 2.0
+#  (the "License"); you may not use this file except in compliance with
+#  the License.  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+#  Github: https://github.com/hapylestat/apputils
+#
+#
+
+import codecs
+import json
+import re
+from typing import IO, Any, Iterator, Tuple
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_NUMBER_TAIL = re.compile(r"[0-9.eE+-]*")
+_DECODER = json.JSONDecoder()
+
+CHUNK_SIZE = 64 * 1024
+
+
+class JSONStreamReader(object):
+  """
+  Reads JSON document from the file object chunk by chunk, so values of the large array (or object) could be decoded
+  one at a time. Only the currently decoded value and the unread rest of the chunk are kept in memory.
+
+  Usage:
+    with open("networks.json", "rb") as fp:
+      for item in JSONStreamReader(fp).items("items"):
+        ...
+  """
+  def __init__(self, fp: IO, chunk_size: int = CHUNK_SIZE):
+    """
+    :param fp: text or binary (UTF-8) file object
+    :param chunk_size: number of bytes or characters read at once
+    """
+    self.__fp = fp
+    self.__chunk_size = chunk_size
+    self.__decoder = None
+    self.__buffer = ""
+    self.__pos = 0
+    self.__offset = 0  # position of the buffer start in the document
+    self.__eof = False
+
+  def __fill(self, size: int = 0) -> bool:
+    """
+    Drop consumed part of the buffer and read the next chunk
+
+    :return False if the end of file is reached
+    """
+    if self.__eof:
+      return False
+
+    data = self.__fp.read(max(size, self.__chunk_size))
+    if isinstance(data, bytes):
+      if self.__decoder is None:
+        self.__decoder = codecs.getincrementaldecoder("utf-8")()
+      text = self.__decoder.decode(data, final=not data)
+    else:
+      text = data
+
+    self.__eof = not data
+    self.__offset += self.__pos
+    self.__buffer = self.__buffer[self.__pos:] + text
+    self.__pos = 0
+    return not self.__eof
+
+  def __error(self, message: str) -> ValueError:
+    return ValueError(f"{message} at char {self.__offset + self.__pos}")
+
+  def __peek(self) -> str:
+    """
+    Skip whitespaces and return the next character, or empty string at the end of file
+    """
+    while True:
+      self.__pos = _WHITESPACE.match(self.__buffer, self.__pos).end()
+      if self.__pos < len(self.__buffer):
+        return self.__buffer[self.__pos]
+      if not self.__fill():
+        return ""
+
+  def __expect(self, char: str):
+    if self.__peek() != char:
+      raise self.__error(f"'{char}' is expected")
+    self.__pos += 1
+
+  def __value(self) -> Any:
+    self.__peek()
+    while True:
+      try:
+        value, end = _DECODER.raw_decode(self.__buffer, self.__pos)
+      except json.JSONDecodeError as e:
+        if self.__fill(len(self.__buffer)):  # value is not complete yet, read at least as much as buffered already
+          continue
+        self.__pos = e.pos
+        raise self.__error(e.msg)
+
+      # number could continue in the next chunk, like "1." or "1e" which are decoded as 1
+      if isinstance(value, (int, float)) and not isinstance(value, bool) \
+        and _NUMBER_TAIL.match(self.__buffer, end).end() == len(self.__buffer) and self.__fill():
+        continue
+
+      self.__pos = end
+      return value
+
+  def __key(self) -> str:
+    key = self.__value()
+    if not isinstance(key, str):
+      raise self.__error("property name is expected")
+    self.__expect(":")
+    return key
+
+  def __next_member(self, closing: str) -> bool:
+    """
+    :return True if there is one more member of the array or object
+    """
+    char = self.__peek()
+    if char == ",":
+      self.__pos += 1
+      return True
+    if char == closing:
+      self.__pos += 1
+      return False
+    raise self.__error(f"',' or '{closing}' is expected")
+
+  def __seek(self, path: str):
+    """
+    Move to the value of the given path, like "data.items". Values of the preceding properties are skipped.
+    """
+    for name in path.split(".") if path else ():
+      self.__expect("{")
+      found = self.__peek() != "}"
+      while found:
+        if self.__key() == name:
+          break
+        self.__value()
+        found = self.__next_member("}")
+
+      if not found:
+        raise self.__error(f"property '{name}' of the path '{path}' is not found")
+
+  def items(self, path: str = "") -> Iterator[Any]:
+    """
+    Decode array at the given path value by value. If the path points to the object, its properties are
+    returned as (name, value) pairs.
+    """
+    self.__seek(path)
+    char = self.__peek()
+    if char not in ("[", "{"):
+      raise self.__error(f"array or object is expected at the path '{path}'")
+
+    closing = "]" if char == "[" else "}"
+    self.__pos += 1
+    if self.__peek() == closing:
+      self.__pos += 1
+      return
+
+    while True:
+      if closing == "]":
+        yield self.__value()
+      else:
+        yield self.__key(), self.__value()
+
+      if not self.__next_member(closing):
+        return
+
+
+def iter_items(fp: IO, path: str = "", chunk_size: int = CHUNK_SIZE) -> Iterator[Any or Tuple[str, Any]]:
+  return JSONStreamReader(fp, chunk_size).items(path)
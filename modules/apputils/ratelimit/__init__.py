@@ -0,0 +1,266 @@
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Github: https://github.com/hapylestat/apputils
+#
+#
+
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Optional, Tuple, Type, TypeVar
+
+T = TypeVar("T")
+
+
+class RetryableError(Exception):
+  """
+  Raised by the limited call to request the retry, e.g. on HTTP 429 or 503 answer
+  """
+  def __init__(self, message: str, result: Any = None, retry_after: Optional[float] = None):
+    """
+    :param result: result of the last attempt, returned to the caller once retries are exhausted
+    :param retry_after: minimal delay before the next attempt requested by the remote side
+    """
+    super(RetryableError, self).__init__(message)
+    self.result = result
+    self.retry_after = retry_after
+
+
+class TokenBucket(object):
+  """
+  Allows "rate" calls per second on average with bursts up to "burst" calls. Tokens are reserved in advance,
+  so the same bucket could be shared by threads and event loops.
+  """
+  def __init__(self, rate: float, burst: int = None, clock: Callable[[], float] = time.monotonic):
+    """
+    :param rate: tokens added per second, bucket is unlimited if not positive
+    :param burst: bucket capacity, equal to the rate (at least 1) if not set
+    :param clock: source of the monotonic time in seconds
+    """
+    self.rate = rate
+    self.burst = burst if burst is not None else max(1, int(rate))
+    self.__clock = clock
+    self.__tokens = float(self.burst)
+    self.__updated = clock()
+    self.__lock = threading.Lock()
+
+  def reserve(self) -> float:
+    """
+    Take the token
+
+    :return seconds to wait before the token could be used
+    """
+    if self.rate <= 0:
+      return 0.0
+
+    with self.__lock:
+      now = self.__clock()
+      self.__tokens = min(self.burst, self.__tokens + (now - self.__updated) * self.rate)
+      self.__updated = now
+      self.__tokens -= 1
+      return -self.__tokens / self.rate if self.__tokens < 0 else 0.0
+
+  def acquire(self):
+    delay = self.reserve()
+    if delay:
+      time.sleep(delay)
+
+  async def acquire_async(self):
+    delay = self.reserve()
+    if delay:
+      await asyncio.sleep(delay)
+
+
+class Backoff(object):
+  """
+  Exponential backoff with full jitter: delay of the attempt N is uniformly distributed in [0, min(cap, base * 2^N)]
+  """
+  def __init__(self, retries: int = 3, base: float = 0.5, cap: float = 30.0,
+               uniform: Callable[[float, float], float] = random.uniform):
+    """
+    :param retries: number of retries after the first failed attempt
+    :param base: upper bound of the first delay in seconds
+    :param cap: maximal delay in seconds
+    :param uniform: source of the jitter, random number in the [a, b] range
+    """
+    self.retries = retries
+    self.base = base
+    self.cap = cap
+    self.__uniform = uniform
+
+  def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+    """
+    :param attempt: number of the failed attempt, starting from 0
+    :param retry_after: delay requested by the remote side, taken if it is longer than the jittered one
+    """
+    delay = self.__uniform(0, min(self.cap, self.base * 2 ** attempt))
+    if retry_after is not None:
+      delay = max(delay, min(self.cap, retry_after))
+    return delay
+
+
+class AIMDController(object):
+  """
+  Concurrency limit adjusted by additive increase / multiplicative decrease: every successful call with the latency
+  under the target raises the limit by "increase / limit" (about +increase per round of calls), failed or slow call
+  multiplies it by "decrease", at most once per "latency_target" seconds.
+
+  Slots are taken only by the async calls, the sync ones just report their results.
+  """
+  def __init__(self, initial: int = 4, minimum: int = 1, maximum: int = 32, latency_target: float = 2.0,
+               increase: float = 1.0, decrease: float = 0.5, clock: Callable[[], float] = time.monotonic):
+    self.minimum = minimum
+    self.maximum = maximum
+    self.latency_target = latency_target
+    self.increase = increase
+    self.decrease = decrease
+    self.limit = float(max(minimum, min(initial, maximum)))
+
+    self.__in_flight = 0
+    self.__waiters: Deque[asyncio.Future] = deque()
+    self.__loop: Optional[asyncio.AbstractEventLoop] = None
+    self.__clock = clock
+    self.__last_decrease = float("-inf")
+
+  @property
+  def in_flight(self) -> int:
+    return self.__in_flight
+
+  def record(self, latency: float, success: bool):
+    now = self.__clock()
+    if success and latency <= self.latency_target:
+      self.limit = min(self.maximum, self.limit + self.increase / self.limit)
+      self.__wake()
+    elif now - self.__last_decrease >= self.latency_target:
+      self.limit = max(self.minimum, self.limit * self.decrease)
+      self.__last_decrease = now
+
+  def __wake(self):
+    free = int(self.limit) - self.__in_flight
+    while free > 0 and self.__waiters:
+      waiter = self.__waiters.popleft()
+      if not waiter.done():
+        waiter.set_result(None)
+        free -= 1
+
+  async def acquire(self):
+    loop = asyncio.get_running_loop()
+    if loop is not self.__loop:  # slots of the previous loop are gone with it
+      self.__loop, self.__in_flight, self.__waiters = loop, 0, deque()
+
+    while self.__in_flight >= int(self.limit):
+      waiter = loop.create_future()
+      self.__waiters.append(waiter)
+      try:
+        await waiter
+      except asyncio.CancelledError:
+        if waiter.done() and not waiter.cancelled():  # pass the wake-up to the next waiter
+          self.__wake()
+        raise
+
+    self.__in_flight += 1
+
+  def release(self):
+    self.__in_flight -= 1
+    self.__wake()
+
+
+class UpstreamLimiter(object):
+  """
+  Politeness policy of the single upstream source: token bucket, retries with jittered exponential backoff,
+  adaptive concurrency and the timeout to be applied by the callers to every connection.
+
+  Usage:
+    ripe = UpstreamLimiter("ripe", rate=10, timeout=30)
+    result = ripe.call(fetch, url)
+    result = await ripe.call_async(fetch_async, url)
+  """
+  def __init__(self, name: str, rate: float = 0, burst: int = None, timeout: float = None, retries: int = 3,
+               backoff_base: float = 0.5, backoff_cap: float = 30.0, concurrency: int = 8,
+               latency_target: float = 2.0,
+               retry_on: Tuple[Type[BaseException], ...] = (OSError, EOFError, RetryableError),
+               clock: Callable[[], float] = time.monotonic):
+    """
+    :param name: name of the source
+    :param rate: calls per second, unlimited if not positive
+    :param burst: maximal number of calls made at once after the idle period
+    :param timeout: seconds, connection timeout for the callers
+    :param retries: number of retries of the failed call
+    :param backoff_base: upper bound of the first retry delay in seconds
+    :param backoff_cap: maximal retry delay in seconds
+    :param concurrency: upper bound of the adaptive concurrency of async calls
+    :param latency_target: calls slower than that are treated as a sign of the overloaded source
+    :param retry_on: exceptions which are retried
+    :param clock: source of the monotonic time of the token bucket and concurrency controller
+    """
+    self.name = name
+    self.timeout = timeout
+    self.bucket = TokenBucket(rate, burst, clock)
+    self.backoff = Backoff(retries, backoff_base, backoff_cap)
+    self.controller = AIMDController(initial=min(4, concurrency), maximum=concurrency, latency_target=latency_target,
+                                     clock=clock)
+    self.retry_on = retry_on
+
+  def call(self, f: Callable[..., T], *args, retry: bool = True) -> T:
+    """
+    :param retry: set to False for the calls which are not safe to repeat
+    """
+    retries = self.backoff.retries if retry else 0
+    for attempt in range(retries + 1):
+      self.bucket.acquire()
+      started = time.perf_counter()
+      try:
+        result = f(*args)
+      except self.retry_on as e:
+        self.controller.record(time.perf_counter() - started, False)
+        if attempt == retries:
+          if isinstance(e, RetryableError) and e.result is not None:
+            return e.result
+          raise
+        time.sleep(self.backoff.delay(attempt, getattr(e, "retry_after", None)))
+        continue
+
+      self.controller.record(time.perf_counter() - started, True)
+      return result
+
+  async def call_async(self, f: Callable[..., Awaitable[T]], *args, retry: bool = True) -> T:
+    """
+    :param retry: set to False for the calls which are not safe to repeat
+    """
+    retries = self.backoff.retries if retry else 0
+    for attempt in range(retries + 1):
+      await self.controller.acquire()
+      try:
+        await self.bucket.acquire_async()
+        started = time.perf_counter()
+        try:
+          result = await f(*args)
+        except self.retry_on as e:
+          self.controller.record(time.perf_counter() - started, False)
+          if attempt == retries:
+            if isinstance(e, RetryableError) and e.result is not None:
+              return e.result
+            raise
+          delay = self.backoff.delay(attempt, getattr(e, "retry_after", None))
+        else:
+          self.controller.record(time.perf_counter() - started, True)
+          return result
+      finally:
+        self.controller.release()
+
+      await asyncio.sleep(delay)
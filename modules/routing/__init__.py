@@ -1,8 +1,16 @@
 
+import asyncio
 import itertools
+import os
+import sys
+import time
+from typing import Dict, List, NamedTuple, Optional
 
 from netaddr import IPNetwork
-from lookup import QueryMethod, WhoisQuery, fetch_ripe_info, nslookup
+from instrumentation import recorder
+from lookup import QueryMethod, WhoisQuery, fetch_ripe_info_by_asn, fetch_ripe_info_by_asn_async, nslookup, \
+  nslookup_async
+from modules.routing.plan import ItemKind, NetworkPlan, load_plan
 
 
 class DisplayOptions(object):
@@ -10,6 +18,23 @@ class DisplayOptions(object):
   IPV6 = "ipv6"
   NETS = "nets"
 
+
+def load_networks(root_path):
+  """
+  :type root_path str
+  :rtype NetworkPlan
+  """
+  networks_file = os.path.join(root_path, "conf", "networks.json")
+  with recorder.span("config", networks_file) as span:
+    try:
+      plan = load_plan(networks_file, os.path.join(root_path, "cache", "networks.plan"))
+    except FileNotFoundError:
+      raise FileNotFoundError(f"Network definition profile not found: {networks_file}")
+    span.prefixes = len(plan.items)
+
+  return plan
+
+
 def is_number(s):
   try:
     float(s)
@@ -49,60 +74,381 @@ def filter_ipv6(addr6_list):
   return [item for item in addr6_list if ":" in item]
 
 
-def generate_exclude_lists(nets, include_optional=True, make_query=True, method=QueryMethod.radb_whois):
+class PrefixRecord(NamedTuple):
+  prefix: str
+  network: int  # id interned in ResolvedRecords.networks
+  source: int   # id interned in ResolvedRecords.sources
+
+
+class Interner(object):
+  """
+  Maps repeating strings to compact integer ids and back
   """
-  :type nets Networks
+  def __init__(self):
+    self.__ids: Dict[str, int] = {}
+    self.__names: List[str] = []
+
+  def intern(self, name: str) -> int:
+    try:
+      return self.__ids[name]
+    except KeyError:
+      self.__ids[name] = len(self.__names)
+      self.__names.append(name)
+      return self.__ids[name]
+
+  def id(self, name: str) -> Optional[int]:
+    return self.__ids.get(name)
+
+  def name(self, _id: int) -> str:
+    return self.__names[_id]
+
+  @property
+  def names(self) -> List[str]:
+    return list(self.__names)
+
+
+class ResolvedRecords(object):
+  """
+  Resolved prefixes with attribution to the network and source (ASN, hostname or literal) which produced them
+  """
+  def __init__(self):
+    self.networks: Interner = Interner()
+    self.sources: Interner = Interner()
+    self.records: List[PrefixRecord] = []
+    self.stale: Dict[str, float] = {}  # networks taken from the last known good result -> its age in seconds
+    self.unresolved: List[str] = []     # networks neither resolved in time nor known from the previous runs
+    self.__source_kinds: Dict[int, str] = {}
+
+  def add(self, network: str, sources: Dict[str, List[str]], kinds: Dict[str, str] = None):
+    """
+    :param network: name of the network
+    :param sources: prefixes grouped by the source produced them
+    :param kinds: ItemKind of the sources
+    """
+    network_id = self.networks.intern(network)
+    for source, prefixes in sources.items():
+      source_id = self.sources.intern(source)
+      if kinds and source in kinds:
+        self.__source_kinds[source_id] = kinds[source]
+      self.records.extend(PrefixRecord(prefix, network_id, source_id) for prefix in prefixes)
+
+  def source_kind(self, source_id: int) -> Optional[str]:
+    return self.__source_kinds.get(source_id)
+
+  def filter(self, family: str = None, exclude_kinds: tuple = ()) -> List[PrefixRecord]:
+    records = self.records
+    if exclude_kinds:
+      records = [record for record in records if self.__source_kinds.get(record.source) not in exclude_kinds]
+
+    if family == DisplayOptions.IPV4:
+      return [record for record in records if "." in record.prefix]
+    elif family == DisplayOptions.IPV6:
+      return [record for record in records if ":" in record.prefix]
+
+    return list(records)
+
+  def prefixes(self, family: str = None, exclude_kinds: tuple = ()) -> List[str]:
+    return [record.prefix for record in self.filter(family, exclude_kinds)]
+
+  def by_network(self, family: str = None, exclude_kinds: tuple = ()) -> Dict[int, List[PrefixRecord]]:
+    groups: Dict[int, List[PrefixRecord]] = {network_id: [] for network_id in range(len(self.networks.names))}
+    for record in self.filter(family, exclude_kinds):
+      groups[record.network].append(record)
+
+    return groups
+
+
+class ResolutionCache(object):
+  """
+  Process-wide cache of resolved networks keyed by the digest of their definition, so networks requested
+  by several invocations within one process (like batch mode) are resolved only once
+  """
+  def __init__(self, ttl: int = 300):
+    self.ttl = ttl
+    self.__items: Dict[tuple, tuple] = {}
+
+  def get(self, net, method, make_query) -> Dict[str, List[str]] or None:
+    """
+    :type net modules.routing.plan.PlanNetwork
+    """
+    item = self.__items.get((net.digest, method, make_query))
+    if item is None or time.monotonic() - item[0] > self.ttl:
+      return None
+    return dict(item[1])
+
+  def put(self, net, method, make_query, sources: Dict[str, List[str]]):
+    """
+    :type net modules.routing.plan.PlanNetwork
+    """
+    if self.ttl > 0 and any(sources.values()):
+      self.__items[(net.digest, method, make_query)] = (time.monotonic(), dict(sources))
+
+  def clear(self):
+    self.__items = {}
+
+
+resolution_cache = ResolutionCache()
+
+
+def is_literal_network(net):
+  """
+  :type net modules.routing.plan.PlanNetwork
+  :return True if the network consists of addresses and prefixes only
+  """
+  return all(item.kind in (ItemKind.IPV4, ItemKind.IPV6) for item in net.items)
+
+
+def literal_sources(net):
+  """
+  :type net modules.routing.plan.PlanNetwork
+  :rtype dict[str, list[str]]
+  """
+  return {item.source: [item.value] for item in net.items}
+
+
+def resolve_network(net, whois, make_query=True, method=QueryMethod.radb_whois):
+  """
+  :type net modules.routing.plan.PlanNetwork
+  :type whois WhoisQuery
+  :type make_query bool
+  :type method QueryMethod
+  :return prefixes grouped by the network item (source) produced them
+  :rtype dict[str, list[str]]
+  """
+  as_sources = {}
+  sources = {}
+
+  for item in net.items:
+    if item.kind == ItemKind.ASN:
+      as_sources[item.value] = item.source
+    elif item.kind == ItemKind.AS_SET:
+      sources[item.source] = whois.subnets_by_asns(whois.members_by_as_set(item.value))
+    elif item.kind in (ItemKind.IPV4, ItemKind.IPV6):
+      sources[item.source] = [item.value]
+    else:
+      sources[item.source] = ["{}/32".format(ip) for ip in nslookup(item.value)]
+
+  if method == QueryMethod.ripe:
+    as_prefixes = (fetch_ripe_info_by_asn(list(as_sources.keys())) or {}) if make_query else {}
+  else:
+    as_prefixes = {asn: whois.subnets_by_asn(asn) for asn in as_sources.keys()}
+
+  sources.update({source: as_prefixes.get(asn, []) for asn, source in as_sources.items()})
+  return sources
+
+
+async def resolve_network_async(net, whois, make_query=True, method=QueryMethod.radb_whois):
+  """
+  Same as resolve_network, but all the items of the network are resolved concurrently
+
+  :type net modules.routing.plan.PlanNetwork
+  :type whois WhoisQuery
+  :type make_query bool
+  :type method QueryMethod
+  :rtype dict[str, list[str]]
+  """
+  as_sources = {}
+  lookups = {}
+
+  async def _as_set(value):
+    return await whois.subnets_by_asns_async(await whois.members_by_as_set_async(value))
+
+  async def _hostname(value):
+    return ["{}/32".format(ip) for ip in await nslookup_async(value)]
+
+  async def _literal(value):
+    return [value]
+
+  for item in net.items:
+    if item.kind == ItemKind.ASN:
+      as_sources[item.value] = item.source
+    elif item.kind == ItemKind.AS_SET:
+      lookups[item.source] = _as_set(item.value)
+    elif item.kind in (ItemKind.IPV4, ItemKind.IPV6):
+      lookups[item.source] = _literal(item.value)
+    else:
+      lookups[item.source] = _hostname(item.value)
+
+  async def _asns():
+    if method == QueryMethod.ripe:
+      return (await fetch_ripe_info_by_asn_async(list(as_sources.keys())) or {}) if make_query else {}
+
+    as_list = list(as_sources.keys())
+    return dict(zip(as_list, await asyncio.gather(*(whois.subnets_by_asn_async(asn) for asn in as_list))))
+
+  as_prefixes, *results = await asyncio.gather(_asns(), *lookups.values())
+  sources = dict(zip(lookups.keys(), results))
+  sources.update({source: as_prefixes.get(asn, []) for asn, source in as_sources.items()})
+  return sources
+
+
+def generate_records(nets, include_optional=True, make_query=True, method=QueryMethod.radb_whois, state=None):
+  """
+  :type nets NetworkPlan
   :type include_optional bool
   :type make_query bool
   :type method QueryMethod
+  :type state modules.routing.state.StateStore
+  :rtype ResolvedRecords
   """
   whois = WhoisQuery()
-
-  as_list = []
-  nets_list = []
-  net_names = []
+  resolved = ResolvedRecords()
 
   for net in nets.items:
     if not include_optional and net.optional:
       continue
 
-    for item in net.items:
-      if item.lower().startswith("as"):
-        as_list.append(item)
-      elif ":" in item:
-        nets_list.append(item)
-      elif is_number(item.partition(".")[0]):
-        if "/" not in item:
-          nets_list.append("{}/32".format(item))
-        else:
-          nets_list.append(item)
+    sources = state.lookup(net) if state else None
+    if sources is None:
+      sources = resolution_cache.get(net, method, make_query)
+      if sources is None:
+        sources = resolve_network(net, whois, make_query, method)
+        resolution_cache.put(net, method, make_query, sources)
+      if state:
+        state.store(net, sources)
+
+    resolved.add(net.name, sources, {item.source: item.kind for item in net.items})
+
+  return resolved
+
+
+async def generate_records_async(nets, include_optional=True, make_query=True, method=QueryMethod.radb_whois,
+                                 state=None, concurrency=8, deadline=None, fallback=None):
+  """
+  Same as generate_records, but networks are resolved concurrently.
+
+  Networks not resolved by the deadline (or failed, if the deadline is set) are cancelled and taken from
+  the last known good result of the fallback store, see ResolvedRecords.stale and ResolvedRecords.unresolved
+
+  :type nets NetworkPlan
+  :type include_optional bool
+  :type make_query bool
+  :type method QueryMethod
+  :type state modules.routing.state.StateStore
+  :type concurrency int
+  :param deadline: time.monotonic() value by which the resolution should be finished
+  :type deadline float
+  :param fallback: store of the last known good results, fresh results are saved to it if state is not set
+  :type fallback modules.routing.state.StateStore
+  :rtype ResolvedRecords
+  """
+  whois = WhoisQuery(concurrency=concurrency)
+  resolved = ResolvedRecords()
+  store = state or fallback
+  nets = [net for net in nets.items if include_optional or not net.optional]
+  stored = [state.lookup(net) if state else None for net in nets]
+  cached = [sources if sources is not None else resolution_cache.get(net, method, make_query)
+            for net, sources in zip(nets, stored)]
+  # networks made of addresses only need no lookup, so they are never late for the deadline
+  cached = [sources if sources is not None or not is_literal_network(net) else literal_sources(net)
+            for net, sources in zip(nets, cached)]
+
+  tasks = {i: asyncio.ensure_future(resolve_network_async(net, whois, make_query, method))
+           for i, (net, sources) in enumerate(zip(nets, cached)) if sources is None}
+  if tasks:
+    timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+    _, not_done = await asyncio.wait(tasks.values(), timeout=timeout)
+    for task in not_done:
+      task.cancel()
+    await asyncio.gather(*not_done, return_exceptions=True)
+
+  for i, (net, stored_sources, sources) in enumerate(zip(nets, stored, cached)):
+    if sources is None:
+      task = tasks[i]
+      if deadline is None or (not task.cancelled() and task.exception() is None):
+        sources = task.result()
+        resolution_cache.put(net, method, make_query, sources)
       else:
-        nets_list.extend(("{}/32".format(item) for item in nslookup(item)))
+        last_known = fallback.last_known(net) if fallback else None
+        if last_known is None:
+          resolved.unresolved.append(net.name)
+          sources = {}
+        else:
+          sources, resolved_at = last_known
+          resolved.stale[net.name] = time.time() - resolved_at
+        resolved.add(net.name, sources, {item.source: item.kind for item in net.items})
+        continue
 
-    net_names.append(net.name)
+    if stored_sources is None and store:
+      store.store(net, sources)
 
-  if method == QueryMethod.ripe:
-    nets_list.extend(fetch_ripe_info(as_list) if make_query else [])
-  elif method == QueryMethod.radb_whois:
-    nets_list.extend(whois.subnets_by_asns(as_list))
+    resolved.add(net.name, sources, {item.source: item.kind for item in net.items})
+
+  return resolved
+
+
+def generate_exclude_lists(nets, include_optional=True, make_query=True, method=QueryMethod.radb_whois, state=None):
+  """
+  :type nets NetworkPlan
+  :type include_optional bool
+  :type make_query bool
+  :type method QueryMethod
+  :type state modules.routing.state.StateStore
+  """
+  resolved = generate_records(nets, include_optional, make_query, method, state)
+  nets_list = resolved.prefixes()
+
+  return resolved.networks.names, filter_ipv4(nets_list), filter_ipv6(nets_list)
 
-  return net_names, filter_ipv4(nets_list), filter_ipv6(nets_list)
+
+def format_network(formatter, net_str, count, network="", source=""):
+  net_parsed = IPNetwork(net_str)
+  return formatter.format(
+    net=net_parsed.network,
+    cidr=net_parsed.prefixlen,
+    mask=net_parsed.netmask,
+    count=count,
+    network=network,
+    source=source
+  )
 
 
 def networks_printer(networks, formatter, sys=None):
   if formatter:
     counter = itertools.count(1)
     for net_str in networks:
-      net_parsed = IPNetwork(net_str)
       try:
-        print(formatter.format(
-          net=net_parsed.network,
-          cidr=net_parsed.prefixlen,
-          mask=net_parsed.netmask,
-          count=next(counter)
-        ))
+        print(format_network(formatter, net_str, next(counter)))
       except KeyError as e:
         print(f"Wrong formatter key '{e}'. 'net', 'cidr', 'mask', 'count' are supported")
         sys.exit(-1)
   else:
-    print("\n".join(networks))
\ No newline at end of file
+    print("\n".join(networks))
+
+
+def records_printer(resolved, family, formatter, by_network=False, exclude_kinds=()):
+  """
+  :type resolved ResolvedRecords
+  :type family str
+  :type formatter str
+  :type by_network bool
+  :type exclude_kinds tuple
+  """
+  with recorder.span("filter", family) as span:
+    if by_network:
+      groups = list(resolved.by_network(family, exclude_kinds).items())
+    else:
+      groups = [(None, resolved.filter(family, exclude_kinds))]
+    span.prefixes = sum(len(records) for _, records in groups)
+
+  with recorder.span("output", family) as span:
+    span.prefixes = sum(len(records) for _, records in groups)
+    counter = itertools.count(1)
+    for network_id, records in groups:
+      if network_id is not None:
+        name = resolved.networks.name(network_id)
+        print(f"# {name} (stale)" if name in resolved.stale or name in resolved.unresolved else f"# {name}")
+
+      if not formatter:
+        if records:
+          print("\n".join(record.prefix for record in records))
+        continue
+
+      for record in records:
+        try:
+          print(format_network(formatter, record.prefix, next(counter),
+                               network=resolved.networks.name(record.network),
+                               source=resolved.sources.name(record.source)))
+        except KeyError as e:
+          print(f"Wrong formatter key '{e}'. 'net', 'cidr', 'mask', 'count', 'network', 'source' are supported")
+          sys.exit(-1)
@@ -0,0 +1,122 @@
+import subprocess
+import sys
+from typing import List, Tuple
+
+
+class DataPlaneBackend(object):
+  """
+  Publishes prefix changes to the kernel sets used by the routing rules
+  """
+  def __init__(self, set_name: str, set6_name: str = "", dry_run: bool = False):
+    """
+    :param set_name: name of the set for IPv4 prefixes
+    :param set6_name: name of the set for IPv6 prefixes, IPv6 prefixes are skipped if not set
+    :param dry_run: print commands to stdout instead of executing them
+    """
+    self._set_name = set_name
+    self._set6_name = set6_name
+    self._dry_run = dry_run
+
+  def _set_for(self, prefix: str) -> str:
+    return self._set6_name if ":" in prefix else self._set_name
+
+  def _script(self, added: List[str], removed: List[str]) -> str:
+    raise NotImplementedError()
+
+  def _timed_script(self, entries: List[Tuple[str, int]]) -> str:
+    raise NotImplementedError()
+
+  def _command(self) -> List[str]:
+    raise NotImplementedError()
+
+  def apply(self, added: List[str], removed: List[str]):
+    self._run(self._script(
+      [prefix for prefix in added if self._set_for(prefix)],
+      [prefix for prefix in removed if self._set_for(prefix)]
+    ))
+
+  def apply_timed(self, entries: List[Tuple[str, int]]):
+    """
+    Add or refresh entries which would be expired by the set after given amount of seconds.
+    Set should be created with timeout support.
+
+    :param entries: list of prefix and timeout pairs
+    """
+    self._run(self._timed_script([(prefix, timeout) for prefix, timeout in entries if self._set_for(prefix)]))
+
+  def _run(self, script: str):
+    if not script:
+      return
+
+    if self._dry_run:
+      sys.stdout.write(script)
+      sys.stdout.flush()
+      return
+
+    result = subprocess.run(self._command(), input=script.encode(), stderr=subprocess.PIPE)
+    if result.returncode != 0:
+      raise IOError(f"{' '.join(self._command())} failed: {result.stderr.decode().strip()}")
+
+
+class IPSetBackend(DataPlaneBackend):
+  def _script(self, added: List[str], removed: List[str]) -> str:
+    lines = [f"del {self._set_for(prefix)} {prefix}" for prefix in removed]
+    lines.extend(f"add {self._set_for(prefix)} {prefix}" for prefix in added)
+    return "".join(f"{line}\n" for line in lines)
+
+  def _timed_script(self, entries: List[Tuple[str, int]]) -> str:
+    # with "-!" ipset updates timeout of the already existing entry
+    return "".join(f"add {self._set_for(prefix)} {prefix} timeout {timeout}\n" for prefix, timeout in entries)
+
+  def _command(self) -> List[str]:
+    return ["ipset", "restore", "-!"]
+
+
+class NFTBackend(DataPlaneBackend):
+  def __init__(self, table: str, set_name: str, set6_name: str = "", dry_run: bool = False, family: str = "inet"):
+    super(NFTBackend, self).__init__(set_name, set6_name, dry_run)
+    self._table = table
+    self._family = family
+
+  def _elements(self, action: str, prefixes: List[str]) -> List[str]:
+    by_set = {}
+    for prefix in prefixes:
+      by_set.setdefault(self._set_for(prefix), []).append(prefix)
+
+    return [
+      f"{action} element {self._family} {self._table} {set_name} {{ {', '.join(items)} }}"
+      for set_name, items in by_set.items()
+    ]
+
+  def _script(self, added: List[str], removed: List[str]) -> str:
+    lines = self._elements("delete", removed) + self._elements("add", added)
+    return "".join(f"{line}\n" for line in lines)
+
+  def _timed_script(self, entries: List[Tuple[str, int]]) -> str:
+    # re-adding existing element does not refresh its timeout in nft, so element is replaced
+    prefixes = [prefix for prefix, _ in entries]
+    lines = self._elements("add", prefixes) + self._elements("delete", prefixes)
+    lines += self._elements("add", [f"{prefix} timeout {timeout}s" for prefix, timeout in entries])
+    return "".join(f"{line}\n" for line in lines)
+
+  def _command(self) -> List[str]:
+    return ["nft", "-f", "-"]
+
+
+class DataPlaneType(object):
+  IPSET = "ipset"
+  NFT = "nft"
+
+
+def create_backend(backend: str, set_name: str, set6_name: str = "", table: str = "", dry_run: bool = False):
+  """
+  :rtype DataPlaneBackend
+  """
+  if backend == DataPlaneType.IPSET:
+    return IPSetBackend(set_name, set6_name, dry_run)
+  elif backend == DataPlaneType.NFT:
+    if not table:
+      raise ValueError("nft backend requires table name")
+    return NFTBackend(table, set_name, set6_name, dry_run)
+
+  raise ValueError(f"Unknown data plane backend '{backend}', use one of: {DataPlaneType.IPSET}, {DataPlaneType.NFT}")
@@ -0,0 +1,83 @@
+import heapq
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+from lookup import nslookup_ttl
+from modules.routing.dataplane import DataPlaneBackend
+from modules.routing.plan import ItemKind, NetworkPlan
+
+
+def plan_hostnames(plan: NetworkPlan, include_optional: bool = True) -> List[str]:
+  hostnames = {
+    item.value: None
+    for net in plan.items if include_optional or not net.optional
+    for item in net.items if item.kind == ItemKind.HOSTNAME
+  }
+  return list(hostnames)
+
+
+class HostnameRefresher(object):
+  """
+  Keeps addresses of hostnames in the set with timeout support, each address is added with timeout equal
+  to the record TTL plus slack and is refreshed once the record TTL is over
+  """
+  def __init__(self, backend: DataPlaneBackend, slack: int = 60, min_interval: int = 30, server: str = None):
+    self.__backend = backend
+    self.__slack = slack
+    self.__min_interval = min_interval
+    self.__server = server
+
+  def refresh(self, hostnames: List[str]) -> Dict[str, int]:
+    """
+    Resolve and publish the hostnames
+
+    :return seconds after which each hostname should be refreshed
+    """
+    entries: List[Tuple[str, int]] = []
+    next_refresh: Dict[str, int] = {}
+
+    for hostname in hostnames:
+      try:
+        records = nslookup_ttl(hostname, self.__server)
+      except (OSError, ValueError) as e:
+        sys.stderr.write(f"[ERR] Unable to resolve {hostname}, retrying in {self.__min_interval}s: {e}\n")
+        next_refresh[hostname] = self.__min_interval
+        continue
+
+      entries.extend((f"{address}/32", ttl + self.__slack) for address, ttl in records)
+      ttl = min((ttl for _, ttl in records), default=self.__min_interval)
+      next_refresh[hostname] = max(ttl, self.__min_interval)
+
+    self.__backend.apply_timed(entries)
+    return next_refresh
+
+  def __refresh_or_retry(self, hostnames: List[str]) -> Dict[str, int]:
+    """
+    Same as refresh, but failed data plane update is retried after min_interval instead of being raised
+    """
+    try:
+      return self.refresh(hostnames)
+    except (IOError, subprocess.SubprocessError) as e:
+      sys.stderr.write(f"[ERR] Unable to publish addresses, retrying in {self.__min_interval}s: {e}\n")
+      return {hostname: self.__min_interval for hostname in hostnames}
+
+  def run(self, hostnames: List[str]):
+    """
+    Refresh the hostnames forever, only hostnames with expired records are re-resolved on each iteration.
+    Failed hostnames are retried after min_interval
+    """
+    now = time.time()
+    queue = [(now + delay, hostname) for hostname, delay in self.__refresh_or_retry(hostnames).items()]
+    heapq.heapify(queue)
+
+    while queue:
+      time.sleep(max(queue[0][0] - time.time(), 0))
+      now = time.time()
+      expired = []
+      while queue and queue[0][0] <= now:
+        expired.append(heapq.heappop(queue)[1])
+
+      for hostname, delay in self.__refresh_or_retry(expired).items():
+        heapq.heappush(queue, (now + delay, hostname))
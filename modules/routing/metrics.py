@@ -0,0 +1,194 @@
+import os
+import re
+import time
+from typing import Dict, List, Tuple
+
+from instrumentation import Span
+from modules.routing import DisplayOptions, ResolvedRecords
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LOOKUP_CATEGORIES = ("whois", "ripe", "dns")
+
+__LAST_SUCCESS_RE = re.compile(r'^rt_last_success_timestamp_seconds\{profile="(?P<profile>(?:[^"\\]|\\.)*)"\} (?P<value>\S+)$')
+__SAMPLE_RE = re.compile(r'^(?P<series>(?P<name>[a-zA-Z_:][a-zA-Z0-9_:]*)\{(?P<labels>.*)\}) (?P<value>\S+)$')
+__HISTOGRAM_SUFFIXES = ("_bucket", "_sum", "_count")
+
+
+def _escape(value: str) -> str:
+  return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: Dict[str, str]) -> str:
+  return ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels.items())
+
+
+def read_last_success(path: str, profile: str) -> float:
+  """
+  Last success timestamp of the profile from the previously written textfile, 0 if unknown
+  """
+  try:
+    with open(path, "r") as f:
+      for line in f:
+        m = __LAST_SUCCESS_RE.match(line.strip())
+        if m and m.group("profile") == _escape(profile):
+          return float(m.group("value"))
+  except (OSError, ValueError):
+    pass
+  return 0.0
+
+
+def read_histograms(path: str, profile: str) -> Dict[str, float]:
+  """
+  Histogram samples of the profile from the previously written textfile, keyed by the series (name with labels)
+  """
+  profile_label = f'profile="{_escape(profile)}"'
+  result = {}
+  try:
+    with open(path, "r") as f:
+      for line in f:
+        m = __SAMPLE_RE.match(line.strip())
+        if not m or not m.group("name").endswith(__HISTOGRAM_SUFFIXES):
+          continue
+        labels = m.group("labels")
+        if labels == profile_label or labels.startswith(f"{profile_label},"):
+          value = m.group("value")
+          result[m.group("series")] = int(value) if value.isdigit() else float(value)
+  except (OSError, ValueError):
+    return {}
+  return result
+
+
+class TextfileExporter(object):
+  """
+  Writes metrics of the refresh runs to the file picked up by node_exporter textfile collector, the file is
+  replaced atomically, so the collector never reads partially written metrics.
+  Histograms are cumulative: values of each run are added to the ones written by the previous runs
+  """
+  def __init__(self, path: str, profile: str):
+    self.__path = path
+    self.__profile = profile
+    self.__last_success = read_last_success(path, profile)
+    self.__histograms = read_histograms(path, profile)
+    self.__lines: List[str] = []
+    self.__declared: Dict[str, None] = {}
+
+  def __declare(self, name: str, metric_type: str, help_str: str):
+    if name not in self.__declared:
+      self.__declared[name] = None
+      self.__lines.append(f"# HELP {name} {help_str}")
+      self.__lines.append(f"# TYPE {name} {metric_type}")
+
+  def __series(self, name: str, labels: Dict[str, str]) -> str:
+    return f"{name}{{{_labels(dict(profile=self.__profile, **labels))}}}"
+
+  def __sample(self, name: str, value: float, labels: Dict[str, str]):
+    self.__lines.append(f"{self.__series(name, labels)} {value}")
+
+  def __accumulate(self, name: str, value: float, labels: Dict[str, str]):
+    series = self.__series(name, labels)
+    self.__histograms[series] = self.__histograms.get(series, 0) + value
+    self.__lines.append(f"{series} {self.__histograms[series]}")
+
+  def __add(self, name: str, metric_type: str, help_str: str, value: float, **labels):
+    self.__declare(name, metric_type, help_str)
+    self.__sample(name, value, labels)
+
+  def __add_histogram(self, name: str, help_str: str, values: List[float], **labels):
+    self.__declare(name, "histogram", help_str)
+    for bound in LATENCY_BUCKETS:
+      self.__accumulate(f"{name}_bucket", len([v for v in values if v <= bound]), dict(labels, le=str(bound)))
+    self.__accumulate(f"{name}_bucket", len(values), dict(labels, le="+Inf"))
+    self.__accumulate(f"{name}_sum", sum(values), labels)
+    self.__accumulate(f"{name}_count", len(values), labels)
+
+  def __add_records(self, resolved: ResolvedRecords):
+    families = {family: resolved.prefixes(family) for family in (DisplayOptions.IPV4, DisplayOptions.IPV6)}
+    for family, prefixes in families.items():
+      self.__add("rt_prefixes", "gauge", "Resolved prefixes including duplicates across sources", len(prefixes),
+                 family=family)
+    for family, prefixes in families.items():
+      self.__add("rt_entries", "gauge", "Unique prefixes published to the data plane", len(set(prefixes)),
+                 family=family)
+
+    by_source: Dict[int, int] = {source_id: 0 for source_id in range(len(resolved.sources.names))}
+    for record in resolved.records:
+      by_source[record.source] += 1
+
+    for source_id, count in by_source.items():
+      self.__add("rt_source_prefixes", "gauge", "Prefixes produced by each network item", count,
+                 source=resolved.sources.name(source_id), kind=resolved.source_kind(source_id) or "")
+
+    self.__add("rt_stale_networks", "gauge", "Networks not resolved by the deadline and taken from the previous runs",
+               len(resolved.stale))
+    self.__add("rt_unresolved_networks", "gauge", "Networks not resolved by the deadline and missing in the state",
+               len(resolved.unresolved))
+
+  def __add_lookups(self, spans: List[Span]):
+    by_category: Dict[str, List[Span]] = {category: [] for category in LOOKUP_CATEGORIES}
+    for span in spans:
+      if span.category in by_category:
+        by_category[span.category].append(span)
+
+    for category, category_spans in by_category.items():
+      self.__add_histogram("rt_lookup_duration_seconds", "Latency of upstream lookups",
+                           [span.duration for span in category_spans], source=category)
+    for category, category_spans in by_category.items():
+      self.__add("rt_lookup_errors", "gauge", "Failed upstream lookups during the run",
+                 len([span for span in category_spans if span.error]), source=category)
+    for category, category_spans in by_category.items():
+      self.__add("rt_lookup_bytes", "gauge", "Bytes received from upstream during the run",
+                 sum(span.bytes for span in category_spans), source=category)
+
+  def __add_servers(self, servers: Dict[str, dict]):
+    for server, s in servers.items():
+      for key, quantile in (("p50", "0.5"), ("p99", "0.99")):
+        if s[key] is not None:
+          self.__add("rt_whois_server_latency_seconds", "gauge", "Recent latency percentiles of the whois servers",
+                     s[key], server=server, quantile=quantile)
+    for server, s in servers.items():
+      self.__add("rt_whois_server_queries", "gauge", "Queries sent to the whois server", s["queries"], server=server)
+    for server, s in servers.items():
+      self.__add("rt_whois_server_errors", "gauge", "Failed queries to the whois server", s["errors"], server=server)
+    for server, s in servers.items():
+      self.__add("rt_whois_server_hedges", "gauge", "Hedged duplicate queries sent to the whois server",
+                 s["hedges"], server=server)
+
+  def export(self, started: float, success: bool, spans: List[Span] = (), resolved: ResolvedRecords = None,
+             cache: Tuple[int, int] = (0, 0), servers: Dict[str, dict] = None):
+    """
+    :param started: timestamp of the run start
+    :param success: whether the run succeeded, last success timestamp is kept from the previous runs otherwise
+    :param spans: instrumentation spans recorded during the run
+    :param resolved: resolved records, prefix metrics are skipped if not available
+    :param cache: networks reused from cache and total networks looked up in cache
+    :param servers: whois servers summary, as WhoisMirrors.summary returns
+    """
+    now = time.time()
+    if success:
+      self.__last_success = now
+
+    self.__lines, self.__declared = [], {}
+    self.__add("rt_run_success", "gauge", "Whether the last run succeeded", int(success))
+    self.__add("rt_run_duration_seconds", "gauge", "Duration of the last run", now - started)
+    self.__add("rt_last_run_timestamp_seconds", "gauge", "Finish time of the last run", now)
+    self.__add("rt_last_success_timestamp_seconds", "gauge", "Finish time of the last successful run",
+               self.__last_success)
+
+    hits, lookups = cache
+    self.__add("rt_cache_hits", "gauge", "Networks reused from cache during the run", hits)
+    self.__add("rt_cache_lookups", "gauge", "Networks looked up in cache during the run", lookups)
+    self.__add("rt_cache_hit_ratio", "gauge", "Share of networks reused from cache", hits / lookups if lookups else 0.0)
+
+    if resolved is not None:
+      self.__add_records(resolved)
+    self.__add_lookups(list(spans))
+    if servers:
+      self.__add_servers(servers)
+
+    directory = os.path.dirname(os.path.abspath(self.__path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{self.__path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+      f.write("\n".join(self.__lines) + "\n")
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, self.__path)
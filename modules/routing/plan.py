@@ -0,0 +1,227 @@
+import hashlib
+import ipaddress
+import json
+import os
+import pickle
+import re
+from typing import Dict, List, NamedTuple, Tuple
+
+PLAN_VERSION = 1
+
+__ASN_RE = re.compile(r"as\d+", re.IGNORECASE)
+__AS_SET_RE = re.compile(r"(as\d+:)*as-[a-z0-9_-]+(:as-[a-z0-9_-]+)*", re.IGNORECASE)
+__HOSTNAME_RE = re.compile(r"(?=.{1,253}$)([a-z0-9_]([a-z0-9_-]{0,61}[a-z0-9_])?\.)*[a-z0-9_-]{1,63}\.?", re.IGNORECASE)
+__NETWORK_KEYS = {"name", "items", "optional"}
+
+
+class ItemKind(object):
+  ASN = "asn"
+  AS_SET = "as-set"
+  IPV4 = "ipv4"
+  IPV6 = "ipv6"
+  HOSTNAME = "hostname"
+
+
+class PlanItem(NamedTuple):
+  kind: str
+  value: str   # normalized value: upper-cased AS, network in CIDR notation or lower-cased hostname
+  source: str  # item as it was written in the networks definition
+
+
+class PlanNetwork(NamedTuple):
+  name: str
+  optional: bool
+  items: Tuple[PlanItem, ...]
+  digest: str  # content hash of the network definition
+
+
+class NetworkPlan(NamedTuple):
+  items: Tuple[PlanNetwork, ...]
+
+  def select(self, names: List[str]):
+    """
+    :rtype NetworkPlan
+    """
+    if not names:
+      return self
+
+    return NetworkPlan(tuple(net for net in self.items if net.name in names))
+
+  def without_kinds(self, kinds: tuple):
+    """
+    Plan with items of given ItemKind excluded. Digests of the networks which lost some items are derived from
+    the original ones and the excluded kinds, so results cached by digest are not shared with the full networks
+
+    :rtype NetworkPlan
+    """
+    if not kinds:
+      return self
+
+    def _without(net: PlanNetwork) -> PlanNetwork:
+      items = tuple(item for item in net.items if item.kind not in kinds)
+      if len(items) == len(net.items):
+        return net
+      digest = hashlib.sha256(f"{net.digest}:-{','.join(sorted(kinds))}".encode()).hexdigest()
+      return net._replace(items=items, digest=digest)
+
+    return NetworkPlan(tuple(_without(net) for net in self.items))
+
+  def diff(self, other) -> Tuple[List[str], List[str], List[str]]:
+    """
+    :type other NetworkPlan
+    :return names of networks added, removed and changed in the other plan comparing to this one
+    """
+    digests = {net.name: net.digest for net in self.items}
+    other_digests = {net.name: net.digest for net in other.items}
+
+    added = [name for name in other_digests if name not in digests]
+    removed = [name for name in digests if name not in other_digests]
+    changed = [name for name, digest in other_digests.items() if name in digests and digests[name] != digest]
+    return added, removed, changed
+
+
+class PlanCompileError(ValueError):
+  pass
+
+
+def classify_item(item: str) -> PlanItem:
+  """
+  Classify networks definition item and normalize its value
+
+  :raises ValueError: if item could not be recognized
+  """
+  if __ASN_RE.fullmatch(item):
+    return PlanItem(ItemKind.ASN, item.upper(), item)
+
+  if __AS_SET_RE.fullmatch(item):
+    return PlanItem(ItemKind.AS_SET, item.upper(), item)
+
+  if ":" in item or item.partition("/")[0].replace(".", "").isdigit():
+    network = ipaddress.ip_network(item, strict=False)
+    kind = ItemKind.IPV6 if network.version == 6 else ItemKind.IPV4
+    return PlanItem(kind, str(network), item)
+
+  if __HOSTNAME_RE.fullmatch(item):
+    return PlanItem(ItemKind.HOSTNAME, item.lower().rstrip("."), item)
+
+  raise ValueError("not an ASN, AS-SET, IP network or hostname")
+
+
+def __line_of(text: str, needle: str, start: int = 0) -> Tuple[int, int]:
+  """
+  Locate needle in the text, returns line number (or 0 if not found) and position to continue search from
+  """
+  pos = text.find(needle, start)
+  if pos == -1:
+    return 0, start
+
+  return text.count("\n", 0, pos) + 1, pos
+
+
+def __network_digest(name: str, optional: bool, items: Tuple[PlanItem, ...]) -> str:
+  definition = json.dumps([name, optional, [list(item) for item in items]])
+  return hashlib.sha256(definition.encode()).hexdigest()
+
+
+def compile_plan(text: str, file_name: str = "networks.json") -> NetworkPlan:
+  """
+  Compile networks definition into validated, pre-classified plan
+
+  :raises PlanCompileError: with line context of the first invalid entry
+  """
+  try:
+    document = json.loads(text)
+  except json.JSONDecodeError as e:
+    raise PlanCompileError(f"{file_name}:{e.lineno}: {e.msg}")
+
+  if not isinstance(document, dict) or not isinstance(document.get("items"), list):
+    raise PlanCompileError(f"{file_name}: top level object with 'items' list is expected")
+
+  networks: List[PlanNetwork] = []
+  names: Dict[str, int] = {}
+  cursor = 0
+
+  for index, network in enumerate(document["items"]):
+    name = network.get("name") if isinstance(network, dict) else None
+    line, cursor = __line_of(text, json.dumps(name), cursor) if isinstance(name, str) else (0, cursor)
+    context = f"{file_name}:{line}" if line else f"{file_name}: items[{index}]"
+
+    if not isinstance(name, str) or not name:
+      raise PlanCompileError(f"{context}: network definition requires non-empty 'name'")
+
+    if name in names:
+      raise PlanCompileError(f"{context}: network '{name}' is already defined at line {names[name]}")
+    names[name] = line
+
+    unknown_keys = set(network.keys()) - __NETWORK_KEYS
+    if unknown_keys:
+      raise PlanCompileError(f"{context}: network '{name}' contains unknown properties: {', '.join(unknown_keys)}")
+
+    optional = network.get("optional", False)
+    if not isinstance(optional, bool):
+      raise PlanCompileError(f"{context}: network '{name}' property 'optional' should be boolean")
+
+    raw_items = network.get("items", [])
+    if not isinstance(raw_items, list):
+      raise PlanCompileError(f"{context}: network '{name}' property 'items' should be a list")
+
+    items: List[PlanItem] = []
+    item_cursor = cursor
+    for raw_item in raw_items:
+      item_line, item_cursor = __line_of(text, json.dumps(raw_item), item_cursor)
+      item_context = f"{file_name}:{item_line}" if item_line else context
+
+      if not isinstance(raw_item, str):
+        raise PlanCompileError(f"{item_context}: network '{name}' item {json.dumps(raw_item)} should be a string")
+
+      try:
+        items.append(classify_item(raw_item.strip()))
+      except ValueError as e:
+        raise PlanCompileError(f"{item_context}: network '{name}' item '{raw_item}' is invalid: {e}")
+
+    networks.append(PlanNetwork(name, optional, tuple(items), __network_digest(name, optional, tuple(items))))
+
+  return NetworkPlan(tuple(networks))
+
+
+def load_plan(networks_file: str, cache_file: str) -> NetworkPlan:
+  """
+  Load compiled plan from the cache, if it is still valid for the networks file, otherwise compile and cache it.
+  Cache validity is checked by the file mtime and size first, falling back to the content hash.
+  """
+  stat = os.stat(networks_file)
+  cached = None
+
+  try:
+    with open(cache_file, "rb") as fp:
+      cached = pickle.load(fp)
+    if cached["version"] != PLAN_VERSION:
+      cached = None
+  except (FileNotFoundError, EOFError, KeyError, TypeError, pickle.UnpicklingError, AttributeError, ImportError):
+    cached = None
+
+  if cached and (cached["mtime"], cached["size"]) == (stat.st_mtime_ns, stat.st_size):
+    return cached["plan"]
+
+  with open(networks_file, "rb") as fp:
+    content = fp.read()
+  digest = hashlib.sha256(content).hexdigest()
+
+  if cached and cached["digest"] == digest:
+    plan = cached["plan"]
+  else:
+    plan = compile_plan(content.decode(), os.path.basename(networks_file))
+
+  os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+  tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+  with open(tmp_file, "wb") as fp:
+    pickle.dump({
+      "version": PLAN_VERSION,
+      "mtime": stat.st_mtime_ns,
+      "size": stat.st_size,
+      "digest": digest,
+      "plan": plan
+    }, fp, protocol=pickle.HIGHEST_PROTOCOL)
+  os.replace(tmp_file, cache_file)
+
+  return plan
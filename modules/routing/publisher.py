@@ -0,0 +1,177 @@
+import gzip
+import hashlib
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Tuple
+from urllib.parse import parse_qs, urlencode, urlparse
+
+from modules.apputils.curl import HTTPCache, curl
+from modules.routing.plan import NetworkPlan
+
+
+class PublishedList(object):
+  """
+  Pre-rendered list representation, both raw and gzip-compressed, with strong ETags for each of them
+  """
+  def __init__(self, items: List[str]):
+    self.body: bytes = "\n".join(items).encode()
+    self.gzip_body: bytes = gzip.compress(self.body, mtime=0)
+
+    digest = hashlib.sha256(self.body).hexdigest()
+    self.etag: str = f'"{digest}"'
+    self.gzip_etag: str = f'"{digest}-gzip"'
+
+
+class ListPublisher(object):
+  FAMILIES = ("ipv4", "ipv6", "nets")
+
+  def __init__(self, loader: Callable[[], NetworkPlan], resolver: Callable, refresh: int = 3600):
+    """
+    :param loader: callable returning actual network definitions
+    :param resolver: generate_exclude_lists compatible callable
+    :param refresh: seconds after which resolved lists are considered outdated
+    """
+    self.__loader = loader
+    self.__resolver = resolver
+    self.__refresh = refresh
+    self.__lock = threading.Lock()
+    self.__key_locks: Dict[Tuple[Tuple[str, ...], bool], threading.Lock] = {}
+    self.__lists: Dict[Tuple[Tuple[str, ...], bool], Tuple[float, Dict[str, PublishedList]]] = {}
+
+  def __resolve(self, nets: Tuple[str, ...], include_optional: bool) -> Dict[str, PublishedList]:
+    filtered_nets = self.__loader().select(list(nets))
+    _, prefixes_ipv4, prefixes_ipv6 = self.__resolver(filtered_nets, include_optional=include_optional)
+
+    return {
+      "ipv4": PublishedList(prefixes_ipv4),
+      "ipv6": PublishedList(prefixes_ipv6),
+      "nets": PublishedList([net.name for net in filtered_nets.items])
+    }
+
+  def __store(self, key: Tuple[Tuple[str, ...], bool]) -> Dict[str, PublishedList]:
+    lists = self.__resolve(*key)
+    with self.__lock:
+      self.__lists[key] = (time.time(), lists)
+    return lists
+
+  def __refresh_in_background(self, key: Tuple[Tuple[str, ...], bool], key_lock: threading.Lock):
+    try:
+      self.__store(key)
+    except Exception as e:
+      sys.stderr.write(f"[ERR] Unable to refresh lists for {', '.join(key[0]) or 'all networks'}, "
+                       f"keep serving previous ones: {e}\n")
+    finally:
+      key_lock.release()
+
+  def get(self, family: str, nets: List[str], include_optional: bool = True) -> PublishedList:
+    """
+    Return published list for the requested family, resolving it only if no fresh copy available.
+    Concurrent requests for the same key are waiting for the single resolution instead of triggering own one,
+    while outdated lists are served as is until the refresh running in background replaces them.
+    """
+    key = (tuple(sorted(nets)), include_optional)
+    with self.__lock:
+      created, lists = self.__lists.get(key, (0, None))
+      key_lock = self.__key_locks.setdefault(key, threading.Lock())
+
+    if lists is not None:
+      if time.time() - created > self.__refresh and key_lock.acquire(blocking=False):
+        threading.Thread(target=self.__refresh_in_background, args=(key, key_lock), daemon=True).start()
+      return lists[family]
+
+    with key_lock:
+      with self.__lock:
+        _, lists = self.__lists.get(key, (0, None))
+      if lists is None:  # not resolved by the concurrent request we were waiting for
+        lists = self.__store(key)
+
+    return lists[family]
+
+
+class PublisherRequestHandler(BaseHTTPRequestHandler):
+  publisher: ListPublisher = None
+
+  @classmethod
+  def __is_true(cls, value: str) -> bool:
+    return value.lower() not in ("0", "false", "no")
+
+  def __etag_matches(self, etag: str) -> bool:
+    if_none_match = self.headers.get("If-None-Match")
+    if not if_none_match:
+      return False
+
+    return any(tag.strip() in (etag, "*") for tag in if_none_match.split(","))
+
+  def do_GET(self):
+    url = urlparse(self.path)
+    family = url.path.strip("/")
+    query = parse_qs(url.query)
+
+    if family not in ListPublisher.FAMILIES:
+      self.send_error(404, f"Unknown list '{family}', use one of: {', '.join(ListPublisher.FAMILIES)}")
+      return
+
+    nets = [net for item in query.get("nets", []) for net in item.split(",") if net]
+    include_optional = self.__is_true(query.get("optional", ["true"])[0])
+
+    try:
+      published = self.publisher.get(family, nets, include_optional)
+    except Exception as e:  # lists were never resolved, outdated ones are served while refresh fails
+      self.send_error(503, f"Unable to resolve networks: {e}")
+      return
+
+    use_gzip = "gzip" in self.headers.get("Accept-Encoding", "")
+    etag = published.gzip_etag if use_gzip else published.etag
+
+    if self.__etag_matches(etag):
+      self.send_response(304)
+      self.send_header("ETag", etag)
+      self.send_header("Vary", "Accept-Encoding")
+      self.end_headers()
+      return
+
+    body = published.gzip_body if use_gzip else published.body
+    self.send_response(200)
+    self.send_header("Content-Type", "text/plain; charset=utf-8")
+    self.send_header("Content-Length", str(len(body)))
+    self.send_header("ETag", etag)
+    self.send_header("Vary", "Accept-Encoding")
+    if use_gzip:
+      self.send_header("Content-Encoding", "gzip")
+    self.end_headers()
+    self.wfile.write(body)
+
+  def log_message(self, format, *args):
+    sys.stderr.write(f"[{self.log_date_time_string()}] {self.address_string()} {format % args}\n")
+
+
+def serve(publisher: ListPublisher, host: str = "0.0.0.0", port: int = 8080):
+  handler = type("BoundPublisherRequestHandler", (PublisherRequestHandler,), {"publisher": publisher})
+  server = ThreadingHTTPServer((host, port), handler)
+  try:
+    server.serve_forever()
+  finally:
+    server.server_close()
+
+
+def fetch_published(source: str, family: str, nets: List[str], include_optional: bool, cache_dir: str) -> List[str]:
+  """
+  Fetch published list from the remote publisher, re-using local copy if it was not changed since last fetch
+
+  :param source: base url of the publisher, like http://router:8080
+  :param family: one of ListPublisher.FAMILIES
+  :param nets: list of networks to be requested
+  :param include_optional: include optional networks
+  :param cache_dir: location of the HTTP cache keeping last fetched copy with its ETag
+  """
+  url = f"{source.rstrip('/')}/{family}?{urlencode({'nets': ','.join(nets), 'optional': int(include_optional)})}"
+  r = curl(url, cache=HTTPCache(os.path.join(cache_dir, "http")))
+
+  if r.code != 200:
+    raise IOError(f"Publisher {source} responded with code {r.code}")
+
+  body = r.content
+  return body.split("\n") if body else []
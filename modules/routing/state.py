@@ -0,0 +1,81 @@
+import hashlib
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from models import ResolutionState, ResolvedNetwork
+from modules.apputils.json2obj import stream_items
+from modules.routing.plan import PlanNetwork
+
+
+def network_hash(net: PlanNetwork, method: int) -> str:
+  """
+  Content hash of the network definition, any change in the definition or query method produces new hash
+  """
+  return hashlib.sha256(f"{method}:{net.digest}".encode()).hexdigest()
+
+
+class StateStore(object):
+  """
+  Keeps resolved prefixes (grouped by source) of each network alongside with the content hash of its definition, so networks
+  with unchanged definition could be reused until they expire
+  """
+  def __init__(self, path: str, ttl: int, method: int):
+    self.__path = path
+    self.__ttl = ttl
+    self.__method = method
+    self.__recomputed: List[str] = []
+    self.__reused: List[str] = []
+
+    self.__state = ResolutionState(items={})
+    try:
+      with open(path, "rb") as fp:  # networks are de-serialized one by one, without loading the whole document
+        self.__state.items = dict(stream_items(fp, "items", ResolvedNetwork))
+    except (FileNotFoundError, ValueError):
+      self.__state.items = {}
+
+  @property
+  def recomputed(self) -> List[str]:
+    return self.__recomputed
+
+  @property
+  def reused(self) -> List[str]:
+    return self.__reused
+
+  def lookup(self, net: PlanNetwork) -> Optional[Dict[str, List[str]]]:
+    item = self.__state.items.get(net.name)
+    if item is None or item.hash != network_hash(net, self.__method) or time.time() - item.resolved > self.__ttl:
+      return None
+
+    self.__reused.append(net.name)
+    return {source: list(prefixes) for source, prefixes in item.sources.items()}
+
+  def last_known(self, net: PlanNetwork) -> Optional[Tuple[Dict[str, List[str]], float]]:
+    """
+    Last known good result of the unchanged network definition, regardless of its age
+
+    :return prefixes grouped by source and the time they were resolved at
+    """
+    item = self.__state.items.get(net.name)
+    if item is None or item.hash != network_hash(net, self.__method):
+      return None
+
+    return {source: list(prefixes) for source, prefixes in item.sources.items()}, item.resolved
+
+  def store(self, net: PlanNetwork, sources: Dict[str, List[str]]):
+    self.__recomputed.append(net.name)
+    if not any(sources.values()):  # most likely lookup failure, do not let it stick until expiration
+      return
+
+    self.__state.items[net.name] = ResolvedNetwork(
+      hash=network_hash(net, self.__method),
+      resolved=time.time(),
+      sources={source: list(prefixes) for source, prefixes in sources.items()}
+    )
+
+  def save(self):
+    os.makedirs(os.path.dirname(self.__path), exist_ok=True)
+    tmp_path = f"{self.__path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as fp:
+      fp.write(self.__state.to_json())
+    os.replace(tmp_path, self.__path)
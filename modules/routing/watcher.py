@@ -0,0 +1,188 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+from typing import Dict, Iterator, List, Tuple
+
+from lookup import QueryMethod, WhoisQuery
+from modules.routing import ResolvedRecords, resolve_network
+from modules.routing.dataplane import DataPlaneBackend
+from modules.routing.plan import NetworkPlan
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+
+_INOTIFY_EVENT = struct.Struct("iIII")
+
+
+class FileWatcher(object):
+  """
+  Waits for changes of the single file, using inotify on its directory where available and mtime polling otherwise.
+  Burst of events (editors writing file in several steps) is folded into one change by the debounce interval.
+  """
+  def __init__(self, path: str, debounce: float = 0.5, poll_interval: float = 1.0):
+    self.__path = os.path.abspath(path)
+    self.__name = os.path.basename(self.__path).encode()
+    self.__debounce = debounce
+    self.__poll_interval = poll_interval
+    self.__fd = self.__init_inotify()
+    self.__last_stat = self.__stat()
+
+  @property
+  def uses_inotify(self) -> bool:
+    return self.__fd is not None
+
+  def __init_inotify(self) -> int or None:
+    try:
+      libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+      fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+      if fd < 0:
+        return None
+
+      mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+      if libc.inotify_add_watch(fd, os.path.dirname(self.__path).encode(), mask) < 0:
+        os.close(fd)
+        return None
+
+      return fd
+    except (OSError, AttributeError, TypeError):
+      return None
+
+  def __stat(self) -> Tuple[int, int] or None:
+    try:
+      stat = os.stat(self.__path)
+      return stat.st_mtime_ns, stat.st_size
+    except FileNotFoundError:
+      return None
+
+  def __read_events(self, timeout: float or None) -> bool:
+    """
+    :return True if any event related to the watched file was received within timeout
+    """
+    ready, _, _ = select.select([self.__fd], [], [], timeout)
+    if not ready:
+      return False
+
+    try:
+      data = os.read(self.__fd, 64 * 1024)
+    except BlockingIOError:
+      return False
+
+    offset, matched = 0, False
+    while offset < len(data):
+      _, _, _, name_len = _INOTIFY_EVENT.unpack_from(data, offset)
+      offset += _INOTIFY_EVENT.size
+      name = data[offset:offset + name_len].rstrip(b"\0")
+      offset += name_len
+      matched = matched or name == self.__name
+
+    return matched
+
+  def __changed(self) -> bool:
+    current = self.__stat()
+    if current != self.__last_stat:
+      self.__last_stat = current
+      return True
+    return False
+
+  def wait(self):
+    """
+    Block until the watched file is changed and no more changes follow within debounce interval
+    """
+    if self.uses_inotify:
+      while not self.__read_events(None):
+        pass
+      while self.__read_events(self.__debounce):
+        pass
+      self.__last_stat = self.__stat()
+      return
+
+    while not self.__changed():
+      time.sleep(self.__poll_interval)
+    while True:
+      time.sleep(self.__debounce)
+      if not self.__changed():
+        return
+
+  def close(self):
+    if self.__fd is not None:
+      os.close(self.__fd)
+      self.__fd = None
+
+
+class NetworksSync(object):
+  """
+  Keeps resolved prefixes of the applied plan and pushes to the data plane only the difference
+  between applied and newly requested plans
+  """
+  def __init__(self, backend: DataPlaneBackend, include_optional: bool = True, method=QueryMethod.radb_whois,
+               exclude_kinds: tuple = ()):
+    self.__backend = backend
+    self.__include_optional = include_optional
+    self.__exclude_kinds = exclude_kinds
+    self.__method = method
+    self.__whois = WhoisQuery()
+    self.__plan: NetworkPlan = NetworkPlan(())
+    self.__resolved: Dict[str, Dict[str, List[str]]] = {}
+
+  def __filter(self, plan: NetworkPlan) -> NetworkPlan:
+    plan = plan.without_kinds(self.__exclude_kinds)
+    if self.__include_optional:
+      return plan
+    return NetworkPlan(tuple(net for net in plan.items if not net.optional))
+
+  @property
+  def records(self) -> ResolvedRecords:
+    """
+    Prefixes of the applied plan attributed to their networks and sources
+    """
+    resolved = ResolvedRecords()
+    for net in self.__plan.items:
+      resolved.add(net.name, self.__resolved.get(net.name, {}), {item.source: item.kind for item in net.items})
+    return resolved
+
+  @classmethod
+  def __prefixes(cls, resolved: Dict[str, Dict[str, List[str]]]) -> Dict[str, None]:
+    return {prefix: None for sources in resolved.values() for prefixes in sources.values() for prefix in prefixes}
+
+  def sync(self, plan: NetworkPlan) -> Tuple[List[str], List[str], List[str]]:
+    """
+    Resolve networks added or changed since the last sync and apply prefix difference to the data plane
+
+    :return added prefixes, removed prefixes and names of re-resolved networks
+    """
+    plan = self.__filter(plan)
+    added_nets, removed_nets, changed_nets = self.__plan.diff(plan)
+    resolved = {name: sources for name, sources in self.__resolved.items() if name not in removed_nets}
+
+    for net in plan.items:
+      if net.name in added_nets or net.name in changed_nets:
+        resolved[net.name] = resolve_network(net, self.__whois, method=self.__method)
+
+    before, after = self.__prefixes(self.__resolved), self.__prefixes(resolved)
+    added = [prefix for prefix in after if prefix not in before]
+    removed = [prefix for prefix in before if prefix not in after]
+    self.__backend.apply(added, removed)
+
+    # state is updated only once data plane accepted the changes, so failed apply would be retried on the next sync
+    self.__plan, self.__resolved = plan, resolved
+    return added, removed, added_nets + changed_nets
+
+  def sync_phased(self, plan: NetworkPlan) -> Iterator[Tuple[List[str], List[str], List[str]]]:
+    """
+    Same as sync, but in two data plane updates: networks which are not optional are resolved and applied first,
+    while optional ones keep their previously applied prefixes (new ones are left out) until the second update
+
+    :return added prefixes, removed prefixes and names of re-resolved networks of each update
+    """
+    plan = self.__filter(plan)
+    applied = {net.name: net for net in self.__plan.items}
+    required = NetworkPlan(tuple(applied[net.name] if net.optional else net
+                                 for net in plan.items if not net.optional or net.name in applied))
+    yield self.sync(required)
+    yield self.sync(plan)
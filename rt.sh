@@ -14,13 +14,42 @@ MYTABLE=${MYTABLE:-}
 MYFWMARK=${MYFWMARK:-}
 DEV=${DEV:-}
 IPROUTE=${IPROUTE:-}
+DNS_TIMEOUT=${DNS_TIMEOUT:-}  # if set, hostname addresses are kept in ${APP}-dns set with per-record timeout
+DNS_SET="${APP}-dns"
+PHASED=${PHASED:-}  # if set, watch applies networks which are not optional before the optional ones
+DEADLINE=${DEADLINE:-}  # if set, seconds to resolve networks in, late ones are taken from the previous runs
+PROM_DIR=${PROM_DIR:-}  # if set, metrics of each run are written to ${PROM_DIR}/rt-${APP}.prom for node_exporter
+
+if [ -z ${DNS_TIMEOUT} ]; then
+  DNS_ARGS=""
+else
+  DNS_ARGS="--skip-dns"
+fi
+
+if [ -z ${PROM_DIR} ]; then
+  METRICS_ARGS=""
+else
+  METRICS_ARGS="--metrics-file=${PROM_DIR}/rt-${APP}.prom --metrics-profile=${APP}"
+fi
+
+if [ -z ${DEADLINE} ]; then
+  DEADLINE_ARGS=""
+else
+  DEADLINE_ARGS="--deadline=${DEADLINE}"
+fi
+
+if [ -z ${PHASED} ]; then
+  WATCH_ARGS=""
+else
+  WATCH_ARGS="--phased"
+fi
 
 create_ipset_restore() {
   local rules=$1
   if [ -z ${rules} ]; then 
-    local ROUTES=`python ${MYDIR}/main.py ipv4`
+    local ROUTES=`python ${MYDIR}/main.py ipv4 ${DNS_ARGS} ${DEADLINE_ARGS} ${METRICS_ARGS}`
   else 
-    local ROUTES=`python ${MYDIR}/main.py ipv4 --nets="${rules}"`
+    local ROUTES=`python ${MYDIR}/main.py ipv4 ${DNS_ARGS} ${DEADLINE_ARGS} ${METRICS_ARGS} --nets="${rules}"`
   fi
 
   for r in ${ROUTES}; do
@@ -29,6 +58,24 @@ create_ipset_restore() {
 }
 
 
+do_dns_set(){
+ local rules=$1
+ if [ -z ${DNS_TIMEOUT} ]; then
+   return
+ fi
+
+ ipset create ${DNS_SET} hash:ip timeout ${DNS_TIMEOUT} 1>/dev/null 2>&1
+ if [ -z ${rules} ]; then
+   python ${MYDIR}/main.py dns --set=${DNS_SET}
+ else
+   python ${MYDIR}/main.py dns --set=${DNS_SET} --nets="${rules}"
+ fi
+
+ iptables -t mangle -A PREROUTING -m set --match-set ${DNS_SET} dst -j MARK --set-mark ${MYFWMARK}
+ iptables -t mangle -A OUTPUT -m set --match-set ${DNS_SET} dst -j MARK --set-mark ${MYFWMARK}
+}
+
+
 do_custom_route(){
  local rules=$1
 
@@ -44,6 +91,7 @@ do_custom_route(){
 
  echo "Getting sub-nets list for ${rules} and publishing them to the storage..."
  echo -e $(create_ipset_restore ${rules}) | ipset restore -!
+ do_dns_set ${rules}
 
  iptables -t mangle -A PREROUTING -m set --match-set ${APP} dst -j MARK --set-mark ${MYFWMARK}
  iptables -t mangle -A OUTPUT -m set --match-set ${APP} dst -j MARK --set-mark ${MYFWMARK}
@@ -74,6 +122,7 @@ do_route(){
  else
   echo "Using cached routes (run rt.sh reset to update cache) ..".
  fi
+ do_dns_set
   
  iptables -t mangle -A PREROUTING -m set --match-set ${APP} dst -j MARK --set-mark ${MYFWMARK}
  iptables -t mangle -A OUTPUT -m set --match-set ${APP} dst -j MARK --set-mark ${MYFWMARK}
@@ -99,6 +148,8 @@ do_unroute(){
 
  iptables -t mangle -D PREROUTING -m set --match-set ${APP} dst -j MARK --set-mark ${MYFWMARK} 1>/dev/null 2>&1
  iptables -t mangle -D OUTPUT -m set --match-set ${APP} dst -j MARK --set-mark ${MYFWMARK} 1>/dev/null 2>&1
+ iptables -t mangle -D PREROUTING -m set --match-set ${DNS_SET} dst -j MARK --set-mark ${MYFWMARK} 1>/dev/null 2>&1
+ iptables -t mangle -D OUTPUT -m set --match-set ${DNS_SET} dst -j MARK --set-mark ${MYFWMARK} 1>/dev/null 2>&1
 
  ip rule del fwmark ${MYFWMARK} table ${MYTABLE} 1>/dev/null 2>&1
  ip route del prio 100 via ${IPROUTE} table ${MYTABLE} 1>/dev/null 2>&1
@@ -108,6 +159,7 @@ do_unroute(){
 do_reset_cache(){
  echo "Removing cached routes.."
  ipset destroy ${APP} 1>/dev/null 2>&1
+ ipset destroy ${DNS_SET} 1>/dev/null 2>&1
 }
 
 
@@ -131,7 +183,19 @@ case $1 in
    do_unroute
    do_reset_cache
   ;;
+  watch)
+   ipset create ${APP} hash:net 1>/dev/null 2>&1
+   python ${MYDIR}/main.py watch --set=${APP} ${WATCH_ARGS} ${DNS_ARGS} ${METRICS_ARGS}
+  ;;
+  dns)
+   if [ -z ${DNS_TIMEOUT} ]; then
+     echo "DNS_TIMEOUT is not set in the profile"
+     exit 1
+   fi
+   ipset create ${DNS_SET} hash:ip timeout ${DNS_TIMEOUT} 1>/dev/null 2>&1
+   python ${MYDIR}/main.py dns --set=${DNS_SET} --loop
+  ;;
   *)
-  echo "rt.sh start|update|stop|reset  <profile name> [rule name]"
+  echo "rt.sh start|update|stop|reset|watch|dns  <profile name> [rule name]"
   ;;
 esac
\ No newline at end of file
@@ -23,7 +23,7 @@ from typing import List
 
 # needed due to claims of importing distutils before setuptools
 import setuptools
-from apputils_setup import AppUtilsCommand
+from apputils_setup import AppUtilsCommand, AppUtilsManifestCommand
 from distutils.command.install import install
 from setuptools import find_packages, setup
 from wheel.bdist_wheel import bdist_wheel
@@ -181,10 +181,12 @@ setup(
     where="src",
     exclude=["contrib", "docs", "tests*", "tasks"],
   ),
+  package_data={"": ["commands-manifest.json"]},  # pre-generated by 'apputils_manifest' command
   cmdclass={
     "install": MyInstall,
     "bdist_wheel": MyWheel,
-    "apputils": AppUtilsCommand
+    "apputils": AppUtilsCommand,
+    "apputils_manifest": AppUtilsManifestCommand
   },
   install_requires=load_requirements(),
   entry_points={
@@ -0,0 +1,110 @@
+import asyncio
+import socket
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from modules.apputils.curl import AsyncCurlSession
+
+
+class _Handler(BaseHTTPRequestHandler):
+  protocol_version = "HTTP/1.1"
+  connections = set()
+
+  def __reply(self, code: int, body: bytes = b"", headers: dict = None):
+    self.send_response(code)
+    for name, value in (headers or {}).items():
+      self.send_header(name, value)
+    self.send_header("Content-Length", str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def do_GET(self):
+    self.connections.add(self.client_address)
+    if self.path == "/chunked":
+      self.send_response(200)
+      self.send_header("Transfer-Encoding", "chunked")
+      self.end_headers()
+      for chunk in (b"first,", b"second,", b"x" * 5000):
+        self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+      self.wfile.write(b"0\r\n\r\n")
+    elif self.path == "/redirect":
+      self.__reply(302, headers={"Location": "/target"})
+    elif self.path == "/target":
+      self.__reply(200, b"target")
+    else:
+      self.__reply(200, b"hello")
+
+  def log_message(self, format, *args):
+    pass
+
+
+class AsyncCurlSessionTest(unittest.TestCase):
+  @classmethod
+  def setUpClass(cls):
+    cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    cls.server.daemon_threads = True
+    cls.url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+    threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+  @classmethod
+  def tearDownClass(cls):
+    cls.server.shutdown()
+    cls.server.server_close()
+
+  def setUp(self):
+    _Handler.connections.clear()
+
+  def test_connection_reuse(self):
+    async def run():
+      async with AsyncCurlSession() as session:
+        return [await session.curl(f"{self.url}/") for _ in range(3)]
+
+    for r in asyncio.run(run()):
+      self.assertEqual(200, r.code)
+      self.assertEqual("hello", r.content)
+    self.assertEqual(1, len(_Handler.connections))
+
+  def test_chunked(self):
+    async def run():
+      async with AsyncCurlSession() as session:
+        r = await session.curl(f"{self.url}/chunked")
+        stream = await session.curl(f"{self.url}/chunked", use_stream=True)
+        return r, await stream.raw.aread(), await session.curl(f"{self.url}/")
+
+    r, streamed, after = asyncio.run(run())
+    expected = "first,second," + "x" * 5000
+    self.assertEqual(expected, r.content)
+    self.assertEqual(expected.encode(), streamed)
+    self.assertEqual("hello", after.content)  # connection is usable after the chunked body
+    self.assertEqual(1, len(_Handler.connections))
+
+  def test_redirects(self):
+    async def run():
+      async with AsyncCurlSession() as session:
+        return await session.curl(f"{self.url}/redirect"), \
+          await session.curl(f"{self.url}/redirect", follow_redirect=False)
+
+    followed, not_followed = asyncio.run(run())
+    self.assertEqual(200, followed.code)
+    self.assertEqual("target", followed.content)
+    self.assertEqual(302, not_followed.code)
+    self.assertEqual("/target", not_followed.headers["Location"])
+    self.assertEqual(1, len(_Handler.connections))
+
+  def test_refused_connection_keeps_cause(self):
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+      s.bind(("127.0.0.1", 0))
+      port = s.getsockname()[1]
+
+    async def run():
+      async with AsyncCurlSession() as session:
+        await session.curl(f"http://127.0.0.1:{port}/")
+
+    with self.assertRaises(TimeoutError) as e:
+      asyncio.run(run())
+    self.assertIsInstance(e.exception.__cause__, ConnectionRefusedError)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,109 @@
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from modules.apputils.curl import CurlSession, curl
+
+
+class _Handler(BaseHTTPRequestHandler):
+  protocol_version = "HTTP/1.1"
+  connections = set()
+
+  def __reply(self, code: int, body: bytes = b"", headers: dict = None):
+    self.send_response(code)
+    for name, value in (headers or {}).items():
+      self.send_header(name, value)
+    self.send_header("Content-Length", str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def do_GET(self):
+    self.connections.add(self.client_address)
+    if self.path == "/set-cookie":
+      self.__reply(200, b"ok", {"Set-Cookie": "session=42; Path=/"})
+    elif self.path == "/cookie":
+      self.__reply(200, self.headers.get("Cookie", "").encode())
+    elif self.path == "/redirect":
+      self.__reply(302, headers={"Location": "/target"})
+    elif self.path == "/target":
+      self.__reply(200, b"target")
+    else:
+      self.__reply(200, b"hello")
+
+  def log_message(self, format, *args):
+    pass
+
+
+class CurlSessionTest(unittest.TestCase):
+  @classmethod
+  def setUpClass(cls):
+    cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    cls.server.daemon_threads = True
+    cls.url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+    threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+  @classmethod
+  def tearDownClass(cls):
+    cls.server.shutdown()
+    cls.server.server_close()
+
+  def setUp(self):
+    _Handler.connections.clear()
+
+  def test_connection_reuse(self):
+    with CurlSession() as session:
+      for _ in range(3):
+        r = session.curl(f"{self.url}/")
+        self.assertEqual(200, r.code)
+        self.assertEqual("hello", r.content)
+
+    self.assertEqual(1, len(_Handler.connections))
+
+  def test_idle_expiry(self):
+    with CurlSession(idle_timeout=0.1) as session:
+      session.curl(f"{self.url}/")
+      time.sleep(0.2)
+      session.curl(f"{self.url}/")
+
+    self.assertEqual(2, len(_Handler.connections))
+
+  def test_stream_connection_not_reused(self):
+    with CurlSession() as session:
+      r = session.curl(f"{self.url}/", use_stream=True)
+      self.assertEqual(b"hello", b"".join(r.iter_bytes()))
+      session.curl(f"{self.url}/")
+
+    self.assertEqual(2, len(_Handler.connections))
+
+  def test_cookies(self):
+    with CurlSession() as session:
+      session.curl(f"{self.url}/set-cookie")
+      self.assertEqual("session=42", session.curl(f"{self.url}/cookie").content)
+
+    with CurlSession() as session:
+      self.assertEqual("", session.curl(f"{self.url}/cookie").content)
+
+  def test_redirects(self):
+    with CurlSession() as session:
+      r = session.curl(f"{self.url}/redirect")
+      self.assertEqual(200, r.code)
+      self.assertEqual("target", r.content)
+
+      r = session.curl(f"{self.url}/redirect", follow_redirect=False)
+      self.assertEqual(302, r.code)
+      self.assertEqual("/target", r.headers["Location"])
+
+    self.assertEqual(1, len(_Handler.connections))
+
+  def test_curl(self):
+    r = curl(f"{self.url}/redirect")
+    self.assertEqual(200, r.code)
+    self.assertEqual("target", r.content)
+
+    self.assertEqual(302, curl(f"{self.url}/redirect", follow_redirect=False).code)
+    self.assertEqual("", curl(f"{self.url}/cookie").content)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,111 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from modules.apputils.curl import HTTPCache, curl
+from modules.apputils.curl.cache import CacheEntry
+
+
+class _Handler(BaseHTTPRequestHandler):
+  protocol_version = "HTTP/1.1"
+  etag = '"v1"'
+  requests = []
+
+  def __reply(self, code: int, body: bytes = b"", headers: dict = None):
+    self.send_response(code)
+    for name, value in (headers or {}).items():
+      self.send_header(name, value)
+    self.send_header("Content-Length", str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def do_GET(self):
+    self.requests.append((self.path, self.headers.get("If-None-Match")))
+    if self.path == "/fresh":
+      self.__reply(200, b"fresh", {"Cache-Control": "max-age=60"})
+    elif self.path == "/no-store":
+      self.__reply(200, b"no-store", {"Cache-Control": "no-store", "ETag": '"v1"'})
+    elif self.headers.get("If-None-Match") == self.etag:
+      # content is the same, but the server moved to the new validator
+      _Handler.etag = f'"v{int(self.etag.strip(chr(34))[1:]) + 1}"'
+      self.__reply(304, headers={"ETag": self.etag})
+    else:
+      self.__reply(200, b"validated", {"ETag": self.etag})
+
+  def log_message(self, format, *args):
+    pass
+
+
+class HTTPCacheTest(unittest.TestCase):
+  @classmethod
+  def setUpClass(cls):
+    cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    cls.server.daemon_threads = True
+    cls.url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+    threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+  @classmethod
+  def tearDownClass(cls):
+    cls.server.shutdown()
+    cls.server.server_close()
+
+  def setUp(self):
+    _Handler.requests.clear()
+    _Handler.etag = '"v1"'
+    self.path = tempfile.mkdtemp()
+    self.cache = HTTPCache(self.path)
+
+  def tearDown(self):
+    shutil.rmtree(self.path, ignore_errors=True)
+
+  def test_store(self):
+    r = curl(f"{self.url}/validated", cache=self.cache)
+    self.assertEqual("validated", r.content)
+    self.assertEqual(1, len(os.listdir(self.path)))
+
+    curl(f"{self.url}/no-store", cache=self.cache)
+    self.assertEqual(1, len(os.listdir(self.path)))
+
+  def test_fresh_entry_served_from_cache(self):
+    for _ in range(3):
+      r = curl(f"{self.url}/fresh", cache=self.cache)
+      self.assertEqual(200, r.code)
+      self.assertEqual("fresh", r.content)
+
+    self.assertEqual(1, len(_Handler.requests))
+
+  def test_revalidation(self):
+    curl(f"{self.url}/validated", cache=self.cache)
+    r = curl(f"{self.url}/validated", cache=self.cache)
+    self.assertEqual(200, r.code)
+    self.assertEqual("validated", r.content)
+    self.assertEqual('"v2"', r.headers["ETag"])
+
+    curl(f"{self.url}/validated", cache=self.cache)
+    self.assertEqual([None, '"v1"', '"v2"'], [if_none_match for _, if_none_match in _Handler.requests])
+
+  def test_revalidated_replaces_etag(self):
+    entry = CacheEntry("key", "http://host/", 200, [("ETag", '"v1"'), ("Content-Type", "text/plain")], 0.0, b"body")
+    entry = self.cache.revalidated(entry, [("ETag", '"v2"'), ("Server", "test")])
+
+    self.assertEqual('"v2"', entry.etag)
+    self.assertEqual("text/plain", entry.header("Content-Type"))
+    self.assertIsNone(entry.header("Server"))
+    self.assertGreater(entry.stored, 0.0)
+
+  def test_expiry(self):
+    headers = [("Cache-Control", "max-age=60")]
+    self.assertTrue(CacheEntry("key", "http://host/", 200, headers, time.time()).is_fresh)
+    self.assertFalse(CacheEntry("key", "http://host/", 200, headers, time.time() - 120).is_fresh)
+
+    expires = [("Expires", "Thu, 01 Jan 1970 00:00:00 GMT")]
+    self.assertFalse(CacheEntry("key", "http://host/", 200, expires, time.time()).is_fresh)
+    self.assertFalse(CacheEntry("key", "http://host/", 200, [("ETag", '"v1"')], time.time()).is_fresh)
+
+
+if __name__ == "__main__":
+  unittest.main()
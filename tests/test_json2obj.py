@@ -0,0 +1,102 @@
+import json
+import sys
+import tracemalloc
+import unittest
+from typing import Dict, List
+
+from modules.apputils.json2obj import SerializableObject, compact
+from models import NetworkItem, ResolvedNetwork
+
+
+class _PlainItem(SerializableObject):
+  name: str = None
+  items: List[str] = []
+  optional: bool = False
+
+
+@compact
+class _CompactItem(SerializableObject):
+  name: str = None
+  items: List[str] = []
+  optional: bool = False
+
+
+@compact
+class _CompactSources(SerializableObject):
+  sources: Dict[str, List[str]] = {}
+  count: int = 0
+
+
+def _allocated(factory, count: int = 1000) -> float:
+  factory()
+  tracemalloc.start()
+  try:
+    before, _ = tracemalloc.get_traced_memory()
+    objects = [factory() for _ in range(count)]
+    after, _ = tracemalloc.get_traced_memory()
+  finally:
+    tracemalloc.stop()
+  return (after - before - sys.getsizeof(objects)) / count
+
+
+class CompactTest(unittest.TestCase):
+  DATA = {"name": "net", "items": ["AS64512", "192.0.2.0/24"], "optional": True}
+
+  def test_serialize_round_trip(self):
+    for model in (_PlainItem, _CompactItem, NetworkItem):
+      obj = model(serialized_obj=json.dumps(self.DATA))
+      self.assertEqual(json.dumps(self.DATA), obj.to_json(), model.__name__)
+      self.assertEqual(self.DATA, model(serialized_obj=obj.serialize()).serialize(), model.__name__)
+
+  def test_declaration_order(self):
+    self.assertEqual(["name", "items", "optional"], list(NetworkItem(serialized_obj={"name": "net"}).serialize()))
+    self.assertEqual(["hash", "resolved", "sources"], list(ResolvedNetwork(serialized_obj={"hash": "1"}).serialize()))
+    self.assertEqual(_PlainItem().to_json(), _CompactItem().to_json())
+
+  def test_defaults_and_copy(self):
+    obj = _CompactItem(name="net")
+    self.assertEqual([], obj.items)
+    self.assertFalse(obj.optional)
+
+    copy = _CompactItem(serialized_obj=obj)
+    copy.items.append("AS1")
+    self.assertEqual([], obj.items)
+
+  def test_nested_round_trip(self):
+    data = {"sources": {"AS1": ["192.0.2.0/24"]}, "count": 1}
+    self.assertEqual(data, _CompactSources(serialized_obj=data).serialize())
+
+  def test_no_dict(self):
+    obj = _CompactItem(serialized_obj=self.DATA)
+    self.assertFalse(hasattr(obj, "__dict__"))
+    with self.assertRaises(AttributeError):
+      obj.unknown = 1
+
+  def test_memory(self):
+    plain = _allocated(lambda: _PlainItem(serialized_obj=self.DATA))
+    compact_size = _allocated(lambda: _CompactItem(serialized_obj=self.DATA))
+    self.assertLess(compact_size, plain)
+
+  def test_error_list(self):
+    self.assertEqual([], _PlainItem(serialized_obj=self.DATA).__error__)
+    self.assertEqual((), _CompactItem(serialized_obj=self.DATA).__error__)
+
+    with self.assertRaises(ValueError):
+      _CompactItem(serialized_obj={"name": "net", "unknown": 1})
+
+  def test_lazy(self):
+    obj = _CompactItem.lazy(self.DATA)
+    self.assertEqual(["AS64512", "192.0.2.0/24"], obj.items)
+    self.assertEqual(self.DATA, obj.serialize())
+
+  def test_getattr_only_on_compact(self):
+    self.assertNotIn("__getattr__", SerializableObject.__dict__)
+    self.assertIn("__getattr__", _CompactItem.__dict__)
+    with self.assertRaises(AttributeError):
+      _PlainItem().nmae
+    with self.assertRaises(AttributeError):
+      _CompactItem().nmae
+
+
+if __name__ == "__main__":
+  unittest.main()
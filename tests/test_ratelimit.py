@@ -0,0 +1,112 @@
+import unittest
+
+from modules.apputils.ratelimit import AIMDController, Backoff, RetryableError, TokenBucket, UpstreamLimiter
+
+
+class _Clock(object):
+  def __init__(self, now: float = 100.0):
+    self.now = now
+
+  def __call__(self) -> float:
+    return self.now
+
+
+class TokenBucketTest(unittest.TestCase):
+  def test_burst_and_refill(self):
+    clock = _Clock()
+    bucket = TokenBucket(rate=2, burst=2, clock=clock)
+
+    self.assertEqual(0.0, bucket.reserve())
+    self.assertEqual(0.0, bucket.reserve())
+    self.assertAlmostEqual(0.5, bucket.reserve())  # bucket is empty, one token is added every 0.5s
+    self.assertAlmostEqual(1.0, bucket.reserve())
+
+    clock.now += 1.0  # pays off the reserved tokens only
+    self.assertAlmostEqual(0.5, bucket.reserve())
+
+    clock.now += 10.0  # refill is capped by the burst
+    self.assertEqual(0.0, bucket.reserve())
+    self.assertEqual(0.0, bucket.reserve())
+    self.assertAlmostEqual(0.5, bucket.reserve())
+
+  def test_unlimited(self):
+    bucket = TokenBucket(rate=0, clock=_Clock())
+    self.assertEqual([0.0] * 10, [bucket.reserve() for _ in range(10)])
+
+
+class BackoffTest(unittest.TestCase):
+  def test_growth_up_to_cap(self):
+    backoff = Backoff(retries=8, base=0.5, cap=4.0, uniform=lambda a, b: b)
+    self.assertEqual([0.5, 1.0, 2.0, 4.0, 4.0, 4.0], [backoff.delay(attempt) for attempt in range(6)])
+
+  def test_jitter_range(self):
+    backoff = Backoff(base=0.5, cap=4.0, uniform=lambda a, b: a)
+    self.assertEqual(0.0, backoff.delay(3))
+
+  def test_retry_after(self):
+    backoff = Backoff(base=0.5, cap=4.0, uniform=lambda a, b: b)
+    self.assertEqual(3.0, backoff.delay(0, retry_after=3.0))
+    self.assertEqual(4.0, backoff.delay(0, retry_after=60.0))  # capped as well
+    self.assertEqual(2.0, backoff.delay(2, retry_after=1.0))
+
+
+class AIMDControllerTest(unittest.TestCase):
+  def test_increase_on_success(self):
+    controller = AIMDController(initial=4, maximum=8, latency_target=2.0, clock=_Clock())
+    controller.record(0.1, True)
+    self.assertAlmostEqual(4.25, controller.limit)
+
+    for _ in range(100):
+      controller.record(0.1, True)
+    self.assertEqual(8, controller.limit)
+
+  def test_decrease_on_failure(self):
+    clock = _Clock()
+    controller = AIMDController(initial=8, minimum=1, latency_target=2.0, clock=clock)
+
+    controller.record(0.1, False)
+    self.assertEqual(4, controller.limit)
+    controller.record(0.1, False)  # at most once per latency target
+    self.assertEqual(4, controller.limit)
+
+    clock.now += 2.0
+    controller.record(5.0, True)  # slow call counts as failure
+    self.assertEqual(2, controller.limit)
+
+    for _ in range(5):
+      clock.now += 2.0
+      controller.record(0.1, False)
+    self.assertEqual(1, controller.limit)
+
+
+class UpstreamLimiterTest(unittest.TestCase):
+  def setUp(self):
+    self.clock = _Clock()
+    self.limiter = UpstreamLimiter("test", retries=2, concurrency=8, clock=self.clock)
+    self.limiter.backoff = Backoff(retries=2, uniform=lambda a, b: 0.0)
+
+  def test_retryable_error_decreases_limit(self):
+    attempts = []
+
+    def call():
+      attempts.append(None)
+      raise RetryableError("HTTP 503", result="last")
+
+    self.assertEqual("last", self.limiter.call(call))
+    self.assertEqual(3, len(attempts))
+    self.assertEqual(2, self.limiter.controller.limit)
+
+  def test_success_increases_limit(self):
+    self.assertEqual("ok", self.limiter.call(lambda: "ok"))
+    self.assertAlmostEqual(4.25, self.limiter.controller.limit)
+
+  def test_not_retried(self):
+    def call():
+      raise OSError("refused")
+
+    with self.assertRaises(OSError):
+      self.limiter.call(call, retry=False)
+
+
+if __name__ == "__main__":
+  unittest.main()
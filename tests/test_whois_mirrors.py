@@ -0,0 +1,106 @@
+import asyncio
+import socket
+import time
+import unittest
+
+from benchmarks.standins import SyntheticData, WhoisStandIn
+from lookup import WhoisMirrors, WhoisQuery
+from modules.apputils.ratelimit import TokenBucket, UpstreamLimiter
+
+
+class _CountingBucket(TokenBucket):
+  def __init__(self):
+    super(_CountingBucket, self).__init__(0)
+    self.reserved = 0
+
+  def reserve(self) -> float:
+    self.reserved += 1
+    return super(_CountingBucket, self).reserve()
+
+
+def _address(stand_in: WhoisStandIn):
+  host, _, port = stand_in.address.rpartition(":")
+  return host, int(port)
+
+
+def _closed_address():
+  with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+    s.bind(("127.0.0.1", 0))
+    return s.getsockname()
+
+
+class WhoisMirrorsTest(unittest.TestCase):
+  QUERY = "!gAS64512"
+
+  @classmethod
+  def setUpClass(cls):
+    cls.data = SyntheticData(prefixes=2, prefixes6=0)
+    cls.fast = WhoisStandIn(cls.data).start()
+    cls.slow = WhoisStandIn(cls.data, latency=1.0).start()
+
+  @classmethod
+  def tearDownClass(cls):
+    cls.fast.stop()
+    cls.slow.stop()
+
+  def setUp(self):
+    self.bucket = _CountingBucket()
+    self.limiter = UpstreamLimiter("whois", timeout=5.0, retries=0)
+    self.limiter.bucket = self.bucket
+
+  def test_empty_mirror_list(self):
+    with self.assertRaises(ValueError):
+      WhoisMirrors([])
+
+  def test_ewma_selection(self):
+    mirrors = WhoisMirrors([("a", 43), ("b", 43), ("c", 43)])
+    a, b, c = mirrors.servers
+    self.assertEqual([a, b, c], mirrors.ranked())  # not probed servers keep the configured order
+
+    for _ in range(5):
+      a.record(0.5, True)
+      b.record(0.05, True)
+      c.record(0.05, True)
+    c.record(0.05, False)
+    c.record(0.05, False)
+
+    self.assertEqual([b, c, a], mirrors.ranked())
+    self.assertAlmostEqual(0.05, b.latency)
+    self.assertEqual(2, c.errors)
+
+  def test_failover_is_charged(self):
+    mirrors = WhoisMirrors([_closed_address(), _address(self.fast)])
+    response = WhoisQuery(limiter=self.limiter, mirrors=mirrors).query(self.QUERY)
+
+    self.assertIn(self.data.ipv4(64512)[0], response)
+    self.assertEqual(2, self.bucket.reserved)
+    self.assertEqual([1, 0], [server.errors for server in mirrors.servers])
+
+  def test_hedged_query(self):
+    mirrors = WhoisMirrors([_address(self.slow), _address(self.fast)], hedge_default=0.05)
+    whois = WhoisQuery(limiter=self.limiter, mirrors=mirrors)
+
+    async def query():
+      started = time.perf_counter()
+      response = await whois.query_async(self.QUERY)
+      elapsed = time.perf_counter() - started
+      return response, elapsed, [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+
+    response, elapsed, pending = asyncio.run(query())
+    self.assertIn(self.data.ipv4(64512)[0], response)
+    self.assertLess(elapsed, 0.9)
+    self.assertEqual([], pending)  # losing query is cancelled and awaited
+    self.assertEqual([0, 1], [server.hedges for server in mirrors.servers])
+    self.assertEqual(2, self.bucket.reserved)
+
+  def test_no_hedge_for_fast_answer(self):
+    mirrors = WhoisMirrors([_address(self.fast), _address(self.slow)], hedge_default=0.5)
+    whois = WhoisQuery(limiter=self.limiter, mirrors=mirrors)
+
+    self.assertIn(self.data.ipv4(64512)[0], asyncio.run(whois.query_async(self.QUERY)))
+    self.assertEqual([0, 0], [server.hedges for server in mirrors.servers])
+    self.assertEqual(1, self.bucket.reserved)
+
+
+if __name__ == "__main__":
+  unittest.main()